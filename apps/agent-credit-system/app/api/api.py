@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import auth, health, agent_users, events, consumables, purchasables
+from app.api.endpoints import auth, health, agent_users, events, consumables, purchasables, system, analytics
 from app.api import tools
 
 api_router = APIRouter()
@@ -10,6 +10,8 @@ api_router.include_router(health.router, tags=["health"])
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(agent_users.router, prefix="/agents", tags=["agents"])
 api_router.include_router(events.router, prefix="/system", tags=["events"])
+api_router.include_router(system.router, prefix="/system", tags=["system"])
 api_router.include_router(consumables.router, prefix="/consumables", tags=["consumables"])
 api_router.include_router(purchasables.router, prefix="/purchasables", tags=["purchasables"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 api_router.include_router(tools.router, prefix="/tools", tags=["tools"])
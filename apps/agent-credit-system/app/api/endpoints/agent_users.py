@@ -1,18 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Optional
 from decimal import Decimal
+from datetime import datetime
 
 from app.models.agent_user import (
     AgentUserCreate, AgentUserUpdate, AgentUserResponse,
     AgentUsersList, CreditEventCreate, CreditEventResponse,
-    CreditEventsList
+    CreditEventsList, BulkCreditRequest
 )
 from app.dependencies.auth import get_current_active_user
-from libs.core.database import get_nexi_db
+from libs.core.database import get_nexi_db, get_nexi_read_db
 from libs.core.entities.admin_user import AdminUser
 from libs.core.entities.agent_user import AgentUser
 from libs.core.entities.agent_event import AgentEvent
+from libs.core.entities.purchasable import Purchasable
+from libs.core.ledger import apply_credit_change, UserNotFoundError, bulk_adjust_credit, purchasable_adjustments
+from libs.core.totals import get_total, TotalMode, EXACT
+from libs.core.imports import import_agent_users
 
 router = APIRouter()
 
@@ -50,10 +57,29 @@ async def create_agent_user(
 
     return user
 
+@router.post("/users/import")
+async def import_agent_users_csv(
+    file: UploadFile = File(..., description="CSV with a header row: mobile, name, and optionally email and credit"),
+    dry_run: bool = Query(False, description="Validate and report without creating any user"),
+    db: Session = Depends(get_nexi_db),
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Create agent users in bulk from a CSV file, with an error per rejected row
+    """
+    try:
+        # COPY and the set-based checks block, keep them off the event loop
+        return await run_in_threadpool(import_agent_users, file.file, db, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get("/users/{mobile}", response_model=AgentUserResponse)
 async def get_agent_user(
     mobile: str,
-    db: Session = Depends(get_nexi_db),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
@@ -72,7 +98,8 @@ async def list_agent_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None, description="Search term for mobile, name, or email"),
-    db: Session = Depends(get_nexi_db),
+    total: TotalMode = Query(EXACT, description="exact (maintained counter), estimate (planner estimate) or none"),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
@@ -80,17 +107,11 @@ async def list_agent_users(
     """
     if search:
         # Search in mobile, name, or email
-        like_search = f"%{search}%"
-        query = db.query(AgentUser).filter(
-            (AgentUser.mobile.ilike(like_search)) |
-            (AgentUser.name.ilike(like_search)) |
-            (AgentUser.email.ilike(like_search))
-        ).order_by(AgentUser.credit.desc())
-        users = query.offset(skip).limit(limit).all()
-        total = query.count()
+        users = AgentUser.search_users(search, db, skip=skip, limit=limit)
+        total = get_total(select(AgentUser).where(AgentUser.search_filter(search)), db, mode=total)
     else:
         users = AgentUser.get_all_users(db, skip=skip, limit=limit)
-        total = db.query(AgentUser).count()
+        total = get_total(select(AgentUser), db, mode=total, counter=("agent_user", ""))
 
     return {"users": users, "total": total}
 
@@ -161,49 +182,87 @@ async def update_user_credit(
     """
     Update user credit with event sourcing
     """
-    user = AgentUser.find_by_mobile(mobile, db)
-    if not user:
+    # Get current user ID for tracking who made the change
+    created_by = current_user.id if current_user else None
+
+    # Update user credit and create credit event for event sourcing
+    try:
+        result = apply_credit_change(
+            amount=credit_event.amount,
+            mobile=mobile,
+            description=credit_event.description,
+            created_by=created_by,
+            db=db
+        )
+    except UserNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
 
-    # Get current credit balance
-    previous_balance = user.credit
-
-    # Calculate new balance
-    new_balance = previous_balance + credit_event.amount
+    return result["event"]
 
-    # Update user credit
-    user.credit = new_balance
-    db.commit()
-
-    # Get current user ID for tracking who made the change
-    created_by = current_user.id if current_user else None
+@router.post("/credit/bulk")
+async def bulk_update_user_credit(
+    request: BulkCreditRequest,
+    db: Session = Depends(get_nexi_db),
+    current_user: AdminUser = Depends(get_current_active_user)
+):
+    """
+    Apply credit adjustments, or a purchasable, to many users, with an error per rejected adjustment
+    """
+    if request.purchasable_id is not None:
+        if request.adjustments:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Send either adjustments or a purchasable with user_ids and mobiles, not both"
+            )
+        purchasable = Purchasable.find_by_id(request.purchasable_id, db)
+        if not purchasable:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Purchasable not found"
+            )
+        adjustments = purchasable_adjustments(
+            purchasable,
+            user_ids=request.user_ids,
+            mobiles=request.mobiles,
+            count=request.count,
+            description=request.description
+        )
+    else:
+        adjustments = [
+            {
+                "user_id": adjustment.user_id,
+                "mobile": adjustment.mobile,
+                "amount": adjustment.amount,
+                "description": adjustment.description or request.description,
+            }
+            for adjustment in request.adjustments
+        ]
 
-    # Create credit event for event sourcing
-    event = AgentEvent.create_credit_event(
-        target_id=user.id,
-        amount=credit_event.amount,
-        previous_balance=previous_balance,
-        new_balance=new_balance,
-        description=credit_event.description,
-        created_by=created_by,
-        db=db
+    # Chunked writes block, keep them off the event loop
+    return await run_in_threadpool(
+        bulk_adjust_credit, adjustments, db,
+        dry_run=request.dry_run,
+        created_by=current_user.id if current_user else None,
+        allow_overdraft=request.allow_overdraft
     )
 
-    return event
-
 @router.get("/users/{mobile}/credit/history", response_model=CreditEventsList)
 async def get_user_credit_history(
     mobile: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    db: Session = Depends(get_nexi_db),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, takes precedence over skip"),
+    total: TotalMode = Query(EXACT, description="exact (maintained counter), estimate (planner estimate) or none"),
+    since: Optional[datetime] = Query(None, description="Only events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only events before this time"),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
-    Get credit history for a specific user
+    Get credit history for a specific user, optionally within a time range
     """
     user = AgentUser.find_by_mobile(mobile, db)
     if not user:
@@ -212,15 +271,25 @@ async def get_user_credit_history(
             detail="User not found"
         )
 
-    events = AgentEvent.get_target_events(user.id, db, skip=skip, limit=limit)
-    total = AgentEvent.count_target_events(user.id, db)
+    try:
+        events = AgentEvent.get_target_events(user.id, db, skip=skip, limit=limit, cursor=cursor, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    time_range = AgentEvent.time_range(since, until)
+    total = get_total(
+        select(AgentEvent).where(AgentEvent.target_id == user.id, *time_range), db,
+        mode=total, counter=None if time_range else ("agent_event.target_id", user.id)
+    )
 
-    return {"events": events, "total": total}
+    return {"events": events, "total": total, "next_cursor": AgentEvent.next_cursor(events, limit)}
 
 @router.get("/users/id/{id}", response_model=AgentUserResponse)
 async def get_agent_user_by_id(
     id: str,
-    db: Session = Depends(get_nexi_db),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
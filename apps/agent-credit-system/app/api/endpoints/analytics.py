@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.dependencies.auth import get_current_active_user
+from libs.core.database import get_nexi_read_db
+from libs.core.analytics import events_summary, events_by_type
+
+router = APIRouter()
+
+@router.get("/events/summary")
+async def get_events_summary(
+    days: int = Query(7, ge=1, le=366, description="Days covered, today included"),
+    reference_id: Optional[str] = Query(None, description="Only the events of this agent user id"),
+    include_users: bool = Query(True, description="Rank the agent users for top_references, the slowest part on long windows"),
+    db: Session = Depends(get_nexi_read_db),
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Event counts and credit flows per type, per day, per item and per agent user, served from the daily rollups, and the newest events
+    """
+    return events_summary(db, days=days, target_id=reference_id, include_users=include_users)
+
+@router.get("/events/by-type/{event_type}")
+async def get_events_by_type(
+    event_type: str,
+    days: int = Query(30, ge=1, le=366, description="Days covered, today included"),
+    reference_id: Optional[str] = Query(None, description="Only the events of this agent user id"),
+    limit: int = Query(100, ge=1, le=1000, description="Events, items and users listed"),
+    include_users: bool = Query(False, description="Also rank the agent users, slower on long windows"),
+    db: Session = Depends(get_nexi_read_db),
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Counts and credit flows of one event type per day, per item and per user, served from the daily rollups, and its newest events
+    """
+    return events_by_type(event_type, db, days=days, target_id=reference_id, limit=limit, include_users=include_users)
@@ -9,16 +9,32 @@ from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from app.dependencies.auth import get_current_active_user
 from libs.core.database import get_nexi_db
 from libs.core.entities.admin_user import AdminUser
+from libs.core.principals import PasswordHasherBusy
 
 router = APIRouter()
 
+def password_hasher_busy_exception():
+    # Fail fast so a login burst cannot queue up work behind the hasher pool
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_nexi_db)):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
     user = AdminUser.find_by_username(form_data.username, db)
-    if not user or not user.verify_password(form_data.password):
+
+    # bcrypt runs on the password hasher pool, off the event loop
+    try:
+        verified = bool(user) and await user.verify_password_async(form_data.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_exception()
+
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -54,11 +70,17 @@ async def register_admin(user_data: UserCreate, db: Session = Depends(get_nexi_d
             detail="Email already registered"
         )
 
+    try:
+        password_hash = await AdminUser.hash_password_async(user_data.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_exception()
+
     # Create new admin user
     admin = AdminUser.create_admin(
         username=user_data.username,
         email=user_data.email,
         password=user_data.password,
+        password_hash=password_hash,
         db=db
     )
 
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Optional
 from decimal import Decimal
@@ -8,11 +9,13 @@ from app.models.consumable import (
     ConsumablesList, ApplyConsumableRequest
 )
 from app.dependencies.auth import get_current_active_user
-from libs.core.database import get_nexi_db
+from libs.core.database import get_nexi_db, get_nexi_read_db
 from libs.core.entities.admin_user import AdminUser
 from libs.core.entities.agent_user import AgentUser
 from libs.core.entities.agent_event import AgentEvent
 from libs.core.entities.consumable import Consumable
+from libs.core.totals import get_total, TotalMode, EXACT
+from libs.core.ledger import apply_credit_change, build_credit_event_data, UserNotFoundError
 
 router = APIRouter()
 
@@ -39,20 +42,21 @@ async def create_consumable(
 async def list_consumables(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    db: Session = Depends(get_nexi_db),
+    total: TotalMode = Query(EXACT, description="exact (maintained counter), estimate (planner estimate) or none"),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
     List all consumable products with pagination
     """
     consumables = Consumable.get_all_consumables(db, skip=skip, limit=limit)
-    total = db.query(Consumable).count()
+    total = get_total(select(Consumable), db, mode=total, counter=("consumable", ""))
     return {"consumables": consumables, "total": total}
 
 @router.get("/{consumable_id}", response_model=ConsumableResponse)
 async def get_consumable(
     consumable_id: str,
-    db: Session = Depends(get_nexi_db),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
@@ -109,8 +113,7 @@ async def delete_consumable(
             detail="Consumable not found"
         )
 
-    db.delete(consumable)
-    db.commit()
+    consumable.delete_consumable(db)
 
     return None
 
@@ -132,14 +135,6 @@ async def apply_consumable(
             detail="Consumable not found"
         )
 
-    # Get the user
-    user = AgentUser.find_by_id(apply_data.user_id, db)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
     # Get the count (default is 1)
     count = apply_data.count
 
@@ -148,48 +143,36 @@ async def apply_consumable(
     single_amount = Decimal('-' + str(consumable.cost))
     amount = single_amount * count
 
-    # Get current credit balance
-    previous_balance = user.credit
-
-    # Calculate new balance
-    new_balance = previous_balance + amount
-
-    # Check if the user has enough credit
-    # if new_balance < 0:
-    #     raise HTTPException(
-    #         status_code=status.HTTP_400_BAD_REQUEST,
-    #         detail="User doesn't have enough credit"
-    #     )
-
-    # Update user credit
-    user.credit = new_balance
-    db.commit()
-
     # Get current user ID for tracking who made the change
     created_by = current_user.id if current_user else None
 
     # Create a description for the credit event if none provided
     description = apply_data.description or f"Applied {count} {consumable.name}" + ("s" if count > 1 else "")
 
-    # Create credit event for event sourcing
-    event = AgentEvent.create_credit_event(
-        target_id=user.id,
-        amount=amount,
-        previous_balance=previous_balance,
-        new_balance=new_balance,
-        consumable_name=consumable.name,
-        count=count,
-        description=description,
-        created_by=created_by,
-        db=db
-    )
+    # Update user credit and create credit event for event sourcing.
+    # Admins may take a user below zero, so the overdraft check stays off here.
+    try:
+        result = apply_credit_change(
+            amount=amount,
+            user_id=apply_data.user_id,
+            event_data=build_credit_event_data(amount, consumable_name=consumable.name, count=count),
+            description=description,
+            created_by=created_by,
+            allow_overdraft=True,
+            db=db
+        )
+    except UserNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
 
     return {
         "success": True,
         "user": {
-            "id": user.id,
-            "name": user.name,
-            "credit": float(user.credit)
+            "id": result["user"]["id"],
+            "name": result["user"]["name"],
+            "credit": float(result["user"]["credit"])
         },
         "consumable": {
             "id": consumable.id,
@@ -198,9 +181,9 @@ async def apply_consumable(
             "count": count
         },
         "event": {
-            "id": event.id,
+            "id": result["event"]["id"],
             "amount": float(amount),
-            "previous_balance": float(previous_balance),
-            "new_balance": float(new_balance)
+            "previous_balance": float(result["previous_balance"]),
+            "new_balance": float(result["new_balance"])
         }
     }
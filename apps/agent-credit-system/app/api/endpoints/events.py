@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import datetime
 
-from app.models.agent_user import EventResponse, EventsList
-from app.dependencies.auth import get_current_active_user
-from libs.core.database import get_nexi_db
+from app.core.config import EVENT_STREAM_TOKEN_SECONDS
+from app.core.security import create_stream_token
+from app.models.agent_user import EventResponse, EventsList, StreamToken
+from app.dependencies.auth import get_current_active_user, get_stream_reader
+from libs.core.database import get_nexi_read_db
 from libs.core.entities.agent_event import AgentEvent
+from libs.core.totals import get_total, TotalMode, EXACT
+from app.services.event_export import stream_events, EXPORT_FORMATS
+from app.services import event_stream
 
 router = APIRouter()
 
@@ -14,25 +22,92 @@ async def list_events(
     event_type: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    db: Session = Depends(get_nexi_db),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, takes precedence over skip"),
+    total: TotalMode = Query(EXACT, description="exact (maintained counter), estimate (planner estimate) or none"),
+    since: Optional[datetime] = Query(None, description="Only events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only events before this time"),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
-    List all events with optional filtering by event_type
+    List all events with optional filtering by event_type and time range
     """
-    if event_type:
-        events = AgentEvent.get_events_by_type(event_type, db, skip=skip, limit=limit)
-        total = db.query(AgentEvent).filter(AgentEvent.event_type == event_type).count()
-    else:
-        events = AgentEvent.get_all_events(db, skip=skip, limit=limit)
-        total = db.query(AgentEvent).count()
+    # The maintained counters cover whole scopes, a time range has to be counted
+    time_range = AgentEvent.time_range(since, until)
+    try:
+        if event_type:
+            events = AgentEvent.get_events_by_type(event_type, db, skip=skip, limit=limit, cursor=cursor, since=since, until=until)
+            total = get_total(
+                select(AgentEvent).where(AgentEvent.event_type == event_type, *time_range), db,
+                mode=total, counter=None if time_range else ("agent_event.event_type", event_type)
+            )
+        else:
+            events = AgentEvent.get_all_events(db, skip=skip, limit=limit, cursor=cursor, since=since, until=until)
+            total = get_total(
+                select(AgentEvent).where(*time_range), db,
+                mode=total, counter=None if time_range else ("agent_event", "")
+            )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return {"events": events, "total": total, "next_cursor": AgentEvent.next_cursor(events, limit)}
+
+# Declared before /events/{event_id} so "export" is not taken for an event id
+@router.get("/events/export")
+async def export_events(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    event_type: Optional[str] = None,
+    target_id: Optional[str] = Query(None, description="Only events of this agent user id"),
+    since: Optional[datetime] = Query(None, description="Only events at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only events before this time"),
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Stream every matching event, oldest first, as NDJSON or CSV
+    """
+    return StreamingResponse(
+        stream_events(format, event_type=event_type, target_id=target_id, since=since, until=until),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="agent_events.{format}"'}
+    )
 
-    return {"events": events, "total": total}
+# Also declared before /events/{event_id}
+@router.get("/events/stream")
+async def stream_new_events(
+    event_type: Optional[str] = None,
+    target_id: Optional[str] = Query(None, description="Only events of this agent user id"),
+    last_event_id: Optional[str] = Query(None, description="Replay the events after this one first, Last-Event-ID takes precedence"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    _: dict = Depends(get_stream_reader)
+):
+    """
+    Push new events as Server-Sent Events as they are committed
+    """
+    return StreamingResponse(
+        event_stream.stream_events(
+            target_id=target_id, event_type=event_type, last_event_id=last_event_id_header or last_event_id
+        ),
+        media_type="text/event-stream",
+        # No buffering by nginx, the events have to reach the client as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/events/stream/token", response_model=StreamToken)
+async def create_event_stream_token(
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Issue a short-lived token that opens /events/stream, to be passed as ?stream_token=
+    """
+    return {"stream_token": create_stream_token(current_user.username), "expires_in": EVENT_STREAM_TOKEN_SECONDS}
 
 @router.get("/events/{event_id}", response_model=EventResponse)
 async def get_event(
     event_id: str,
-    db: Session = Depends(get_nexi_db),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Optional
 from decimal import Decimal
@@ -8,11 +9,13 @@ from app.models.purchasable import (
     PurchasablesList, ApplyPurchasableRequest
 )
 from app.dependencies.auth import get_current_active_user
-from libs.core.database import get_nexi_db
+from libs.core.database import get_nexi_db, get_nexi_read_db
 from libs.core.entities.admin_user import AdminUser
 from libs.core.entities.agent_user import AgentUser
 from libs.core.entities.agent_event import AgentEvent
 from libs.core.entities.purchasable import Purchasable
+from libs.core.totals import get_total, TotalMode, EXACT
+from libs.core.ledger import apply_credit_change, build_credit_event_data, UserNotFoundError
 
 router = APIRouter()
 
@@ -40,20 +43,21 @@ async def create_purchasable(
 async def list_purchasables(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    db: Session = Depends(get_nexi_db),
+    total: TotalMode = Query(EXACT, description="exact (maintained counter), estimate (planner estimate) or none"),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
     List all purchasable products with pagination
     """
     purchasables = Purchasable.get_all_purchasables(db, skip=skip, limit=limit)
-    total = db.query(Purchasable).count()
+    total = get_total(select(Purchasable), db, mode=total, counter=("purchasable", ""))
     return {"purchasables": purchasables, "total": total}
 
 @router.get("/{purchasable_id}", response_model=PurchasableResponse)
 async def get_purchasable(
     purchasable_id: str,
-    db: Session = Depends(get_nexi_db),
+    db: Session = Depends(get_nexi_read_db),
     _: dict = Depends(get_current_active_user)
 ):
     """
@@ -111,8 +115,7 @@ async def delete_purchasable(
             detail="Purchasable not found"
         )
 
-    db.delete(purchasable)
-    db.commit()
+    purchasable.delete_purchasable(db)
 
     return None
 
@@ -134,14 +137,6 @@ async def apply_purchasable(
             detail="Purchasable not found"
         )
 
-    # Get the user
-    user = AgentUser.find_by_id(apply_data.user_id, db)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
     # Get the count (default is 1)
     count = apply_data.count
 
@@ -150,41 +145,34 @@ async def apply_purchasable(
     single_amount = purchasable.credit_amount
     amount = single_amount * count
 
-    # Get current credit balance
-    previous_balance = user.credit
-
-    # Calculate new balance
-    new_balance = previous_balance + amount
-
-    # Update user credit
-    user.credit = new_balance
-    db.commit()
-
     # Get current user ID for tracking who made the change
     created_by = current_user.id if current_user else None
 
     # Create a description for the credit event if none provided
     description = apply_data.description or f"Applied {count} {purchasable.name}" + ("s" if count > 1 else "")
 
-    # Create credit event for event sourcing
-    event = AgentEvent.create_credit_event(
-        target_id=user.id,
-        amount=amount,
-        previous_balance=previous_balance,
-        new_balance=new_balance,
-        description=description,
-        purchasable_name=purchasable.name,
-        count=count,
-        created_by=created_by,
-        db=db
-    )
+    # Update user credit and create credit event for event sourcing
+    try:
+        result = apply_credit_change(
+            amount=amount,
+            user_id=apply_data.user_id,
+            event_data=build_credit_event_data(amount, purchasable_name=purchasable.name, count=count),
+            description=description,
+            created_by=created_by,
+            db=db
+        )
+    except UserNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
 
     return {
         "success": True,
         "user": {
-            "id": user.id,
-            "name": user.name,
-            "credit": float(user.credit)
+            "id": result["user"]["id"],
+            "name": result["user"]["name"],
+            "credit": float(result["user"]["credit"])
         },
         "purchasable": {
             "id": purchasable.id,
@@ -194,9 +182,9 @@ async def apply_purchasable(
             "count": count
         },
         "event": {
-            "id": event.id,
+            "id": result["event"]["id"],
             "amount": float(amount),
-            "previous_balance": float(previous_balance),
-            "new_balance": float(new_balance)
+            "previous_balance": float(result["previous_balance"]),
+            "new_balance": float(result["new_balance"])
         }
     }
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.request_metrics import slow_requests
+from app.dependencies.auth import get_current_active_user, get_metrics_reader
+from libs.core.catalog import catalog_stats
+from libs.core.principals import principal_cache, password_hasher
+from libs.core.logs import startup_report
+from libs.core.metrics import registry
+
+router = APIRouter()
+
+@router.get("/catalog/stats")
+async def get_catalog_stats(
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Hit and miss counters of the in-process catalog caches
+    """
+    return catalog_stats()
+
+@router.get("/principals/stats")
+async def get_principal_stats(
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Hit and miss counters of the authenticated admin cache
+    """
+    return principal_cache.stats()
+
+@router.get("/password_hasher/stats")
+async def get_password_hasher_stats(
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Load of the password hasher pool, including logins turned away
+    """
+    return password_hasher.stats()
+
+@router.get("/startup")
+async def get_startup_report(
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Time spent in each boot phase of this instance
+    """
+    return startup_report.as_dict()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(
+    _: dict = Depends(get_metrics_reader)
+):
+    """
+    Request latency, pool and per request database metrics in the Prometheus text format
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/slow_requests")
+async def get_slow_requests(
+    limit: int = Query(100, ge=1, le=1000),
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    The most recent slow requests of this instance, newest first, with their timing breakdown and SQL
+    """
+    return {
+        "threshold_ms": slow_requests.threshold * 1000,
+        "requests": slow_requests.entries(limit)
+    }
+
+@router.delete("/slow_requests")
+async def clear_slow_requests(
+    _: dict = Depends(get_current_active_user)
+):
+    """
+    Empty the slow request log of this instance
+    """
+    slow_requests.clear()
+    return {"success": True}
@@ -1,21 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import List, Optional, Dict, Any, Union
 from decimal import Decimal
+import orjson
 
 from app.models.purchasable import PurchasableResponse, PurchasablesList
 from app.models.consumable import ConsumableResponse, ConsumablesList
 from app.models.agent_user import AgentUserCreate, AgentUserResponse
+from app.core.responses import FastJSONResponse
 
-from libs.core.database import get_nexi_db
+from libs.core.database import get_nexi_async_db
 from libs.core.entities.agent_user import AgentUser
 from libs.core.entities.purchasable import Purchasable
 from libs.core.entities.consumable import Consumable
+from libs.core.ledger import apply_credit_change_async, build_credit_event_data, UserNotFoundError
 import app.services.refund_service as refund_service
 
 router = APIRouter()
 
+# Upper bound on items per batch call, keeps a single transaction and its row locks short
+MAX_BATCH_ITEMS = 1000
+
+def tool_response(success, data=None, message=None):
+    """
+    A StandardResponse, rendered by orjson. The content is built in the documented
+    shape here, so FastAPI does not validate it against the response model again.
+    """
+    return FastJSONResponse({"success": success, "data": data, "message": message})
+
+def catalog_response(key, page_json, total, message):
+    """
+    A successful StandardResponse listing a page of a catalog. page_json is the page as
+    already rendered by the catalog cache, only the envelope around it is built here.
+    """
+    body = b"".join([
+        b'{"success":true,"data":{', orjson.dumps(key), b":", page_json,
+        b',"total":', str(total).encode(), b'},"message":', orjson.dumps(message), b"}",
+    ])
+    return Response(content=body, media_type="application/json")
+
 # Models for the tools
 
 class PurchaseRequest(BaseModel):
@@ -44,6 +68,9 @@ class ApplyConsumableRequest(BaseModel):
     appointment_id: Optional[str] = None
     description: Optional[str] = None
 
+class ApplyConsumablesRequest(BaseModel):
+    items: List[ApplyConsumableRequest]
+
 class RefundConsumableRequest(BaseModel):
     agent_user_id: str
     appointment_id: str = None
@@ -51,47 +78,43 @@ class RefundConsumableRequest(BaseModel):
 
 @router.get("/list_purchasables", response_model=StandardResponse)
 async def list_purchasables(
-    db: Session = Depends(get_nexi_db)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
-    List all available purchasable products
+    List the available purchasable products, by name
     """
-    purchasables = Purchasable.get_all_purchasables(db)
-    total = db.query(Purchasable).count()
-    return {
-        "success": True,
-        "data": {"purchasables": [p.to_dict() for p in purchasables], "total": total},
-        "message": "Purchasables retrieved successfully"
-    }
+    # A page of the cached catalog, served from its rendered JSON, total still counts all of it
+    page_json, total = await Purchasable.get_catalog_json_async(db, skip, limit)
+    return catalog_response("purchasables", page_json, total, "Purchasables retrieved successfully")
 
 @router.get("/list_consumables", response_model=StandardResponse)
 async def list_consumables(
-    db: Session = Depends(get_nexi_db)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
-    List all available consumable products
+    List the available consumable products, by name
     """
-    consumables = Consumable.get_all_consumables(db)
-    total = db.query(Consumable).count()
-    return {
-        "success": True,
-        "data": {"consumables": [c.to_dict() for c in consumables], "total": total},
-        "message": "Consumables retrieved successfully"
-    }
+    # A page of the cached catalog, served from its rendered JSON, total still counts all of it
+    page_json, total = await Consumable.get_catalog_json_async(db, skip, limit)
+    return catalog_response("consumables", page_json, total, "Consumables retrieved successfully")
 
 @router.post('/apply_appointment_consumable', response_model=StandardResponse)
 async def apply_appointment_consumable(
     request: Request,
-    db: Session = Depends(get_nexi_db)
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
     Apply consumables to a user by mobile number
     """
     try:
-        body = await request.json()
-        data = ApplyConsumableRequest(**body)
+        # One pass from raw bytes to the validated model
+        data = ApplyConsumableRequest.model_validate_json(await request.body())
 
-        Consumable.apply_consumable(
+        await Consumable.apply_consumable_async(
             consumable_id=data.consumable_id,
             user_id=data.agent_user_id,
             count=data.count,
@@ -100,176 +123,190 @@ async def apply_appointment_consumable(
             current_user=None,
             db=db
         )
-        return {
-            "success": True,
-            "data": {},
-            "message": "User credit consumed successfully"
-        }
+        return tool_response(
+            True,
+            data={},
+            message="User credit consumed successfully"
+        )
+    except Exception as e:
+        return tool_response(False, message=str(e))
+
+@router.post('/apply_appointment_consumables', response_model=StandardResponse)
+async def apply_appointment_consumables(
+    batch: ApplyConsumablesRequest,
+    db: AsyncSession = Depends(get_nexi_async_db)
+):
+    """
+    Apply a batch of appointment consumables in one transaction, with a result per item
+    """
+    if len(batch.items) > MAX_BATCH_ITEMS:
+        return tool_response(False, message=f"Too many items, at most {MAX_BATCH_ITEMS} per request")
+
+    try:
+        results = await Consumable.apply_consumables_async(
+            items=[
+                {
+                    "consumable_id": item.consumable_id,
+                    "user_id": item.agent_user_id,
+                    "count": item.count,
+                    "appointment_id": item.appointment_id,
+                    "description": item.description
+                }
+                for item in batch.items
+            ],
+            current_user=None,
+            db=db
+        )
     except Exception as e:
-        return {
-            "success": False,
-            "message": str(e)
-        }
+        return tool_response(False, message=str(e))
+
+    applied = sum(1 for result in results if result["success"])
+    return tool_response(
+        True,
+        data={
+            "results": [
+                {
+                    "index": index,
+                    "success": result["success"],
+                    "message": result.get("message"),
+                    "event_id": result.get("event_id"),
+                    "credit": result["new_balance"] if result["success"] else None
+                }
+                for index, result in enumerate(results)
+            ],
+            "applied": applied,
+            "failed": len(results) - applied
+        },
+        message=f"Applied {applied} of {len(results)} consumables"
+    )
 
 @router.post('/refund_appointment', response_model=StandardResponse)
 async def refund_appointment_consumable(
     request: Request,
-    db: Session = Depends(get_nexi_db)
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
     Refund consumables from a user by mobile number
     """
     try:
-        body = await request.json()
-        data = RefundConsumableRequest(**body)
+        # One pass from raw bytes to the validated model
+        data = RefundConsumableRequest.model_validate_json(await request.body())
 
-        refund_service.refund_appointment(
+        await refund_service.refund_appointment_async(
             appointment_id=data.appointment_id,
             user_id=data.agent_user_id,
             db=db,
             dry_run=data.dry_run
         )
 
-        return {
-            "success": True,
-            "data": {},
-            "message": "User credit refunded successfully"
-        }
+        return tool_response(
+            True,
+            data={},
+            message="User credit refunded successfully"
+        )
     except Exception as e:
-        return {
-            "success": False,
-            "message": str(e)
-        }
+        return tool_response(False, message=str(e))
 
 @router.post("/create_purchase_request", response_model=StandardResponse)
 async def create_purchase_request(
     purchase_data: PurchaseRequest,
-    db: Session = Depends(get_nexi_db)
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
     Create a purchase request for a purchasable product
     """
     # Get the purchasable
-    purchasable = Purchasable.find_by_id(purchase_data.purchasable_id, db)
+    purchasable = await Purchasable.find_cached_async(purchase_data.purchasable_id, db)
     if not purchasable:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Purchasable not found"
         )
 
-    # Get the user
-    user = AgentUser.find_by_id(purchase_data.agent_user_id, db)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
     # Calculate the amount to add
     count = purchase_data.count
-    amount = purchasable.credit_amount * count
-
-    # Get current credit balance
-    previous_balance = user.credit
-
-    # Calculate new balance
-    new_balance = previous_balance + amount
-
-    # Update user credit
-    user.credit = new_balance
-    db.commit()
+    amount = purchasable["credit_amount"] * count
 
     # Create a description for the credit event if none provided
-    description = purchase_data.description or f"Applied {count} {purchasable.name}" + ("s" if count > 1 else "")
-
-    # Create credit event for event sourcing
-    event = AgentUser.create_credit_event(
-        target_id=user.id,
-        amount=amount,
-        previous_balance=previous_balance,
-        new_balance=new_balance,
-        description=description,
-        purchasable_name=purchasable.name,
-        count=count,
-        db=db
-    )
+    description = purchase_data.description or f"Applied {count} {purchasable['name']}" + ("s" if count > 1 else "")
 
-    return {
-        "success": True,
-        "data": {
-            "user": user.to_dict(),
-            "purchasable": purchasable.to_dict(),
+    # Update user credit and create credit event for event sourcing
+    try:
+        result = await apply_credit_change_async(
+            amount=amount,
+            user_id=purchase_data.agent_user_id,
+            event_data=build_credit_event_data(amount, purchasable_name=purchasable["name"], count=count),
+            description=description,
+            db=db
+        )
+    except UserNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    return tool_response(
+        True,
+        data={
+            "user": result["user"],
+            "purchasable": purchasable,
             "amount": amount,
-            "previous_balance": previous_balance,
-            "new_balance": new_balance
+            "previous_balance": result["previous_balance"],
+            "new_balance": result["new_balance"]
         },
-        "message": "Purchase completed successfully"
-    }
+        message="Purchase completed successfully"
+    )
 
 @router.post("/register_agent_user", response_model=StandardResponse)
 async def register_agent_user(
     request: Request,
-    db: Session = Depends(get_nexi_db)
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
     Register a new agent user with the provided name, mobile, and email
     """
-    # Get the request body
-    body: AgentUserCreate = await request.json()
+    # One pass from raw bytes to the validated model
+    try:
+        body = AgentUserCreate.model_validate_json(await request.body())
+    except ValidationError as e:
+        return tool_response(False, message=str(e))
 
     # Check if mobile already exists
-    if AgentUser.find_by_mobile(body["mobile"], db):
-        return {
-            "success": False,
-            "message": "Mobile number already registered"
-        }
+    if await AgentUser.find_by_mobile_async(body.mobile, db):
+        return tool_response(False, message="Mobile number already registered")
 
     # Check if email already exists
-    if body.get("email", None) and AgentUser.find_by_email(body["email"], db):
-        return {
-            "success": False,
-            "message": "Email already registered"
-        }
-
-    # Create user data model
-    user_data = AgentUserCreate(
-        name=body["name"],
-        mobile=body["mobile"],
-        email=body.get("email", None),
-        credit=Decimal(0)
-    )
-
-    # Create new agent user
-    user = AgentUser.create_user(
-        mobile=user_data.mobile,
-        email=user_data.email,
-        name=user_data.name,
+    if body.email and await AgentUser.find_by_email_async(body.email, db):
+        return tool_response(False, message="Email already registered")
+
+    # Create new agent user, credit always starts at zero here
+    user = await AgentUser.create_user_async(
+        mobile=body.mobile,
+        email=body.email,
+        name=body.name,
         credit=0,
         db=db
     )
 
-    return {
-        "success": True,
-        "data": {"user": user.to_dict()},
-        "message": "Agent user registered successfully"
-    }
+    return tool_response(
+        True,
+        data={"user": user.to_dict()},
+        message="Agent user registered successfully"
+    )
 
 @router.get("/get_agent_user/{mobile}", response_model=StandardResponse)
 async def get_agent_user(
     mobile: str,
-    db: Session = Depends(get_nexi_db)
+    db: AsyncSession = Depends(get_nexi_async_db)
 ):
     """
     Get agent user details by mobile number
     """
-    user = AgentUser.find_by_mobile(mobile, db)
+    user = await AgentUser.find_by_mobile_async(mobile, db)
     if not user:
-        return {
-            "success": False,
-            "message": "User not found"
-        }
-    return {
-        "success": True,
-        "data": {"user": user.to_dict()},
-        "message": "Agent user retrieved successfully"
-    }
+        return tool_response(False, message="User not found")
+    return tool_response(
+        True,
+        data={"user": user.to_dict()},
+        message="Agent user retrieved successfully"
+    )
@@ -13,4 +13,37 @@ API_PREFIX = "/api"
 CORS_ORIGINS = ["*"]  # Allows all origins in development
 CORS_CREDENTIALS = True
 CORS_METHODS = ["*"]  # Allows all methods
-CORS_HEADERS = ["*"]  # Allows all headers
\ No newline at end of file
+CORS_HEADERS = ["*"]  # Allows all headers
+# Metrics settings
+# Bearer token a Prometheus scraper can use for /api/system/metrics instead of an admin login
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Requests slower than this many milliseconds are kept, with their SQL, for /api/system/slow_requests
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+SLOW_REQUEST_BUFFER = int(os.environ.get("SLOW_REQUEST_BUFFER", 100))
+
+# Read routing settings
+# After a successful write a client reads from the primary for this many seconds, so it
+# sees its own change even when the replicas lag behind. Marked with a cookie.
+READ_PRIMARY_AFTER_WRITE_SECONDS = int(os.environ.get("READ_PRIMARY_AFTER_WRITE_SECONDS", 5))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Live event stream settings
+# Comment line sent on an idle stream so proxies keep it open, the LISTEN connection is checked as often
+EVENT_STREAM_KEEPALIVE_SECONDS = float(os.environ.get("EVENT_STREAM_KEEPALIVE_SECONDS", 15))
+# Events held for a subscriber that is not reading, past this it is reset and catches up from the table
+EVENT_STREAM_QUEUE_SIZE = int(os.environ.get("EVENT_STREAM_QUEUE_SIZE", 1000))
+# Events replayed after Last-Event-ID when a client reconnects
+EVENT_STREAM_BACKFILL_LIMIT = int(os.environ.get("EVENT_STREAM_BACKFILL_LIMIT", 1000))
+# Lifetime of the token that opens a stream, it goes in the URL so it only has to outlive the connect
+EVENT_STREAM_TOKEN_SECONDS = int(os.environ.get("EVENT_STREAM_TOKEN_SECONDS", 60))
+
+# Scheduled job settings
+# The maintenance jobs run in-process on every instance, one instance at a time. Set
+# SCHEDULED_JOBS=off when an external scheduler runs their CLIs instead, see the README.
+SCHEDULED_JOBS_ENABLED = os.environ.get("SCHEDULED_JOBS", "on") != "off"
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = float(os.environ.get("PARTITION_MAINTENANCE_INTERVAL_SECONDS", 6 * 60 * 60))
+# The analytics reports add every event newer than the last rollup on the fly, keep that tail short
+EVENT_ROLLUP_INTERVAL_SECONDS = float(os.environ.get("EVENT_ROLLUP_INTERVAL_SECONDS", 60))
+# Exact list totals sum the row_count deltas written since the last compaction
+ROW_COUNT_COMPACT_INTERVAL_SECONDS = float(os.environ.get("ROW_COUNT_COMPACT_INTERVAL_SECONDS", 5 * 60))
@@ -0,0 +1,55 @@
+import time
+from starlette.requests import cookie_parser
+
+from app.core.config import API_PREFIX, READ_PRIMARY_AFTER_WRITE_SECONDS, READ_PRIMARY_COOKIE
+from libs.core.database import begin_primary_reads, end_primary_reads
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# The tools answer 200 with success false when a write fails, and the agents calling
+# them do not keep cookies, so their writes never mark the client
+UNMARKED_PREFIXES = (f"{API_PREFIX}/tools/",)
+
+def _cookie(scope, name):
+    for key, value in scope["headers"]:
+        if key == b"cookie":
+            return cookie_parser(value.decode("latin-1")).get(name)
+    return None
+
+class ReadRoutingMiddleware:
+    """
+    Plain ASGI middleware for read-your-writes on the replicas. A successful write
+    sets a short-lived cookie holding the time until which its client reads from the
+    primary; requests that carry an unexpired one route their read sessions there.
+    Writes under UNMARKED_PREFIXES never set the cookie.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            read_primary = float(_cookie(scope, READ_PRIMARY_COOKIE) or 0) > time.time()
+        except ValueError:
+            read_primary = False
+
+        marks = scope["method"] in WRITE_METHODS and not scope["path"].startswith(UNMARKED_PREFIXES)
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and marks and message["status"] < 400:
+                until = int(time.time()) + READ_PRIMARY_AFTER_WRITE_SECONDS
+                message["headers"] = list(message.get("headers", [])) + [(
+                    b"set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={until}; Max-Age={READ_PRIMARY_AFTER_WRITE_SECONDS}; Path=/; HttpOnly; SameSite=Lax".encode("latin-1")
+                )]
+            await send(message)
+
+        token = begin_primary_reads() if read_primary else None
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            if token is not None:
+                end_primary_reads(token)
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from app.core.config import SLOW_REQUEST_MS, SLOW_REQUEST_BUFFER
+from libs.core.metrics import registry, begin_request_db_stats, end_request_db_stats
+
+# Seconds, fixed so an observation is a bisect, dense around the latencies /tools is held to
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1, 2.5, 5, 10)
+# Statements per request, a handler running many sequential finders shows up in the top buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+DB_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Responses that last as long as their client keeps reading: the live event stream and
+# the NDJSON and CSV exports (app/services/event_export.py). Their duration is no latency
+STREAMED_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson", b"text/csv")
+
+request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to the end of its response",
+    LATENCY_BUCKETS, ("route", "method", "status"))
+request_db_queries = registry.histogram(
+    "http_request_db_queries", "Statements run while serving a request", QUERY_COUNT_BUCKETS, ("route",))
+request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "Time spent in statements while serving a request", DB_SECONDS_BUCKETS, ("route",))
+request_db_checkout_seconds = registry.histogram(
+    "http_request_db_checkout_seconds", "Time spent waiting for pooled connections while serving a request", DB_SECONDS_BUCKETS, ("route",))
+
+def route_template(scope):
+    """The path template of the matched route, so metric labels stay bounded"""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+class SlowRequestLog:
+    """The most recent requests slower than threshold_ms, oldest dropped first"""
+
+    def __init__(self, threshold_ms=SLOW_REQUEST_MS, size=SLOW_REQUEST_BUFFER):
+        self.threshold = threshold_ms / 1000
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self, limit=None):
+        """Newest first"""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+slow_requests = SlowRequestLog()
+
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware that times each request and counts its database work,
+    recorded per route template once the response is done. Requests over the slow
+    threshold are kept in slow_requests with their timing breakdown and statements.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # Status and time to the response headers, as seen by the client
+        response = {"status": 500, "started": None, "streamed": False}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["started"] = time.perf_counter()
+                response["streamed"] = any(
+                    key == b"content-type" and value.startswith(STREAMED_CONTENT_TYPES)
+                    for key, value in message.get("headers", [])
+                )
+            await send(message)
+
+        stats, token = begin_request_db_stats()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            duration = time.perf_counter() - started
+            end_request_db_stats(token)
+
+            route = route_template(scope)
+            # Streamed responses stay out of the latency histogram and the slow request log
+            if not response["streamed"]:
+                request_duration_seconds.observe(duration, (route, scope["method"], str(response["status"])))
+                request_db_queries.observe(stats.queries, (route,))
+                request_db_seconds.observe(stats.seconds, (route,))
+                request_db_checkout_seconds.observe(stats.checkout_seconds, (route,))
+
+                if duration >= slow_requests.threshold:
+                    slow_requests.add({
+                        "at": datetime.now(timezone.utc).isoformat(),
+                        "method": scope["method"],
+                        "route": route,
+                        "path": scope["path"],
+                        "status": response["status"],
+                        "duration_ms": _ms(duration),
+                        "response_start_ms": _ms(response["started"] - started) if response["started"] else None,
+                        "db_ms": _ms(stats.seconds),
+                        "db_checkout_ms": _ms(stats.checkout_seconds),
+                        "app_ms": _ms(max(0.0, duration - stats.seconds - stats.checkout_seconds)),
+                        "queries": stats.queries,
+                        "statements": [{"sql": sql, "ms": _ms(seconds)} for sql, seconds in stats.statements],
+                    })
@@ -0,0 +1,19 @@
+from decimal import Decimal
+import orjson
+from fastapi.responses import ORJSONResponse
+
+def _default(obj):
+    # Same text the pydantic serializer produces for a Decimal, so amounts keep their scale
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    JSON response rendered by orjson, with native datetime handling and Decimal as string.
+    Returning it from a handler also skips FastAPI's response_model validation, so the
+    content must already have the documented shape.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,80 @@
+import asyncio
+from sqlalchemy import text
+
+from app.core.config import (
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS, EVENT_ROLLUP_INTERVAL_SECONDS, ROW_COUNT_COMPACT_INTERVAL_SECONDS
+)
+from libs.core.analytics import run_event_rollup
+from libs.core.database import get_engine
+from libs.core.database.partitions import run_partition_maintenance
+from libs.core.logs import logger
+from libs.core.totals import run_row_count_compaction
+
+class ScheduledJob:
+    """A maintenance function run every interval seconds, by one instance at a time"""
+
+    def __init__(self, name, interval, run):
+        self.name = name
+        self.interval = interval
+        self.run = run
+
+def run_exclusively(job):
+    """
+    Run a job under a Postgres advisory lock named after it. Instances that find the
+    lock taken skip this round, the one holding it is already doing the work.
+
+    Returns:
+        bool: Whether the job ran
+    """
+    lock = {"name": f"scheduled_job:{job.name}"}
+    with get_engine().connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), lock).scalar()
+        conn.commit()
+        if not acquired:
+            return False
+        try:
+            job.run()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), lock)
+            conn.commit()
+    return True
+
+async def _run_periodically(job):
+    while True:
+        await asyncio.sleep(job.interval)
+        try:
+            # The jobs use sync sessions, keep them off the event loop
+            await asyncio.to_thread(run_exclusively, job)
+        except Exception as e:
+            logger.error(f"Scheduled job {job.name} failed: {str(e)}")
+
+class JobScheduler:
+    """
+    Runs the maintenance jobs in-process, each on its own timer, for as long as the
+    app is up. Every instance schedules them, the advisory lock lets one run at a time.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(_run_periodically(job)) for job in self.jobs]
+        logger.info(f"Scheduled jobs started: {', '.join(f'{job.name} every {job.interval}s' for job in self.jobs)}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+def maintenance_jobs():
+    """The jobs the app schedules for itself"""
+    return [
+        # Keeps next month's agent_event partition ahead of the first write into it
+        ScheduledJob("partition_maintenance", PARTITION_MAINTENANCE_INTERVAL_SECONDS, run_partition_maintenance),
+        # Folds new events into agent_event_daily for the analytics endpoints
+        ScheduledJob("event_rollup", EVENT_ROLLUP_INTERVAL_SECONDS, run_event_rollup),
+        # Folds the row_count deltas behind the exact list totals
+        ScheduledJob("row_count_compaction", ROW_COUNT_COMPACT_INTERVAL_SECONDS, run_row_count_compaction),
+    ]
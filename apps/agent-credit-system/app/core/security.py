@@ -3,11 +3,14 @@ from typing import Optional
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
 
-from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.config import SECRET_KEY, ALGORITHM, EVENT_STREAM_TOKEN_SECONDS
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# scope claim of the tokens that only open the live event stream
+EVENT_STREAM_SCOPE = "event_stream"
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
     Create a JWT access token
@@ -21,6 +24,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_stream_token(username: str):
+    """
+    Create a short-lived JWT that only opens the live event stream
+    """
+    return create_access_token(
+        data={"sub": username, "scope": EVENT_STREAM_SCOPE},
+        expires_delta=timedelta(seconds=EVENT_STREAM_TOKEN_SECONDS)
+    )
+
 def decode_access_token(token: str):
     """
     Decode and verify a JWT token
@@ -1,16 +1,24 @@
-from fastapi import Depends, HTTPException, status
+import hmac
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 from jose import JWTError
 
-from app.core.security import oauth2_scheme, decode_access_token
+from app.core.config import METRICS_TOKEN
+from app.core.security import oauth2_scheme, decode_access_token, EVENT_STREAM_SCOPE
 from app.models.user import TokenData
 from libs.core.database import get_nexi_db
 from libs.core.entities.admin_user import AdminUser
+from libs.core.principals import principal_cache
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_nexi_db)):
     """
     Get the current user from the JWT token
     """
+    return await _user_from_token(token, db)
+
+async def _user_from_token(token: str, db: Session, scope: Optional[str] = None):
+    # A scoped token is only accepted where its scope is asked for, and an access token only where none is
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -18,7 +26,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
 
     payload = decode_access_token(token)
-    if payload is None:
+    if payload is None or payload.get("scope") != scope:
         raise credentials_exception
 
     username: str = payload.get("sub")
@@ -26,10 +34,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
 
     token_data = TokenData(username=username)
-    user = AdminUser.find_by_username(token_data.username, db)
 
+    # Served from the principal cache in the steady state, admin_user is only read on a miss
+    user = principal_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        admin = AdminUser.find_by_username(token_data.username, db)
+        if admin is None:
+            raise credentials_exception
+        user = principal_cache.put(admin, expires_at=payload.get("exp"))
 
     return user
 
@@ -40,3 +52,26 @@ async def get_current_active_user(current_user = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_metrics_reader(request: Request, db: Session = Depends(get_nexi_db)):
+    """
+    Allow a scraper presenting METRICS_TOKEN, or else any active admin user
+    """
+    token = await oauth2_scheme(request)
+    if METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return None
+    return await get_current_active_user(await get_current_user(token, db))
+
+
+async def get_stream_reader(
+    request: Request,
+    stream_token: Optional[str] = Query(None, description="A token from POST /events/stream/token, EventSource cannot send an Authorization header"),
+    db: Session = Depends(get_nexi_db)
+):
+    """
+    Check the admin user of a browser event stream, from its stream token or else the header
+    """
+    if stream_token:
+        return await get_current_active_user(await _user_from_token(stream_token, db, scope=EVENT_STREAM_SCOPE))
+    return await get_current_active_user(await get_current_user(await oauth2_scheme(request), db))
@@ -1,18 +1,36 @@
 import sys
 sys.path.append("../..")
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 
-from app.core.config import CORS_ORIGINS, CORS_CREDENTIALS, CORS_METHODS, CORS_HEADERS, API_PREFIX
+from app.core.config import CORS_ORIGINS, CORS_CREDENTIALS, CORS_METHODS, CORS_HEADERS, API_PREFIX, SCHEDULED_JOBS_ENABLED
+from app.core.request_metrics import RequestMetricsMiddleware
+from app.core.read_routing import ReadRoutingMiddleware
+from app.core.scheduled_jobs import JobScheduler, maintenance_jobs
 from app.api.api import api_router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Run the maintenance jobs for as long as the app is up
+    """
+    scheduler = JobScheduler(maintenance_jobs()) if SCHEDULED_JOBS_ENABLED else None
+    if scheduler:
+        scheduler.start()
+    try:
+        yield
+    finally:
+        if scheduler:
+            await scheduler.stop()
+
 def create_app() -> FastAPI:
     """
     Create and configure the FastAPI application
     """
-    app = FastAPI(title="Nexi Dashboard API")
+    app = FastAPI(title="Nexi Dashboard API", lifespan=lifespan)
 
     # Add CORS middleware
     app.add_middleware(
@@ -23,6 +41,12 @@ def create_app() -> FastAPI:
         allow_headers=CORS_HEADERS,
     )
 
+    # Per request database metrics, served at /api/system/metrics
+    app.add_middleware(RequestMetricsMiddleware)
+
+    # Reads go to the replicas, except for a client that has just written
+    app.add_middleware(ReadRoutingMiddleware)
+
     # Include API router
     app.include_router(api_router, prefix=API_PREFIX)
 
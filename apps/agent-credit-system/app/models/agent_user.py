@@ -27,7 +27,7 @@ class AgentUserResponse(AgentUserBase):
 
 class AgentUsersList(BaseModel):
     users: List[AgentUserResponse]
-    total: int
+    total: Optional[int]
 
 # Event Models
 class EventBase(BaseModel):
@@ -50,7 +50,12 @@ class EventResponse(EventBase):
 
 class EventsList(BaseModel):
     events: List[EventResponse]
-    total: int
+    total: Optional[int]
+    next_cursor: Optional[str] = None
+
+class StreamToken(BaseModel):
+    stream_token: str
+    expires_in: int
 
 # Credit Event Models
 class CreditEventBase(BaseModel):
@@ -74,9 +79,27 @@ class CreditEventResponse(EventResponse):
     def new_balance(self) -> Decimal:
         return Decimal(self.event_data.get("new_balance", "0"))
 
+class BulkCreditAdjustment(BaseModel):
+    user_id: Optional[str] = None
+    mobile: Optional[str] = None
+    amount: Decimal
+    description: Optional[str] = None
+
+class BulkCreditRequest(BaseModel):
+    # Either explicit adjustments, or a purchasable applied to the listed users
+    adjustments: List[BulkCreditAdjustment] = Field(default=[], max_length=100000)
+    purchasable_id: Optional[str] = None
+    user_ids: List[str] = Field(default=[], max_length=100000)
+    mobiles: List[str] = Field(default=[], max_length=100000)
+    count: int = Field(default=1, ge=1)
+    description: Optional[str] = None
+    allow_overdraft: bool = True
+    dry_run: bool = False
+
 class CreditEventsList(BaseModel):
     events: List[CreditEventResponse]
-    total: int
+    total: Optional[int]
+    next_cursor: Optional[str] = None
 
 # Add BaseEventResponse and BaseEventsList for backward compatibility
 BaseEventResponse = EventResponse
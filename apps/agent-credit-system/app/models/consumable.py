@@ -27,7 +27,7 @@ class ConsumableResponse(ConsumableBase):
 
 class ConsumablesList(BaseModel):
     consumables: List[ConsumableResponse]
-    total: int
+    total: Optional[int]
 
 # Apply Consumable Models
 class ApplyConsumableRequest(BaseModel):
@@ -29,7 +29,7 @@ class PurchasableResponse(PurchasableBase):
 
 class PurchasablesList(BaseModel):
     purchasables: List[PurchasableResponse]
-    total: int
+    total: Optional[int]
 
 # Apply Purchasable Models
 class ApplyPurchasableRequest(BaseModel):
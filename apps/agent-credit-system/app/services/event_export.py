@@ -0,0 +1,52 @@
+import csv
+import io
+import orjson
+
+from libs.core.database import get_read_engine
+from libs.core.entities.agent_event import AgentEvent
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# The balance fields are flattened for spreadsheets, event_data keeps the full payload
+CSV_COLUMNS = [
+    "id", "timestamp", "event_type", "target_id", "amount", "previous_balance", "new_balance",
+    "description", "created_by", "created_by_username", "appointment_id", "refund_event_id", "event_data",
+]
+
+def _ndjson_chunk(rows):
+    return b"".join(orjson.dumps(dict(row._mapping)) + b"\n" for row in rows)
+
+def _csv_chunk(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        event_data = row.event_data or {}
+        writer.writerow([
+            row.id, row.timestamp.isoformat(), row.event_type, row.target_id,
+            event_data.get("amount"), event_data.get("previous_balance"), event_data.get("new_balance"),
+            row.description, row.created_by, row.created_by_username, row.appointment_id, row.refund_event_id,
+            orjson.dumps(event_data).decode(),
+        ])
+    return buffer.getvalue().encode()
+
+def stream_events(export_format, event_type=None, target_id=None, since=None, until=None, batch_size=5000):
+    """
+    Yield the matching events as NDJSON or CSV, one chunk per batch of rows.
+
+    The rows come from a server-side cursor on a read connection of its own, on a
+    replica when there is one, the request's session is closed before a streaming
+    response starts. Only one batch is held in memory at a time, whatever the size
+    of the export.
+    """
+    query = AgentEvent.export_query(event_type=event_type, target_id=target_id, since=since, until=until)
+    with get_read_engine().connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(query)
+        if export_format == "csv":
+            yield _csv_chunk([], header=True)
+        for rows in result.partitions():
+            yield _ndjson_chunk(rows) if export_format == "ndjson" else _csv_chunk(rows)
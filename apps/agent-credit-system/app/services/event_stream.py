@@ -0,0 +1,236 @@
+import asyncio
+import asyncpg
+import orjson
+from datetime import datetime
+from sqlalchemy import select, tuple_
+
+from app.core.config import EVENT_STREAM_KEEPALIVE_SECONDS, EVENT_STREAM_QUEUE_SIZE, EVENT_STREAM_BACKFILL_LIMIT
+from libs.core.configs import config
+from libs.core.database import get_async_engine
+from libs.core.entities.agent_event import AgentEvent
+from libs.core.logs import logger
+from libs.core.metrics import registry
+
+# Channel of the notify_agent_event() trigger
+EVENT_CHANNEL = "agent_event"
+# Milliseconds a client waits before reconnecting after a reset or a dropped connection
+RETRY_MS = 3000
+
+class EventSubscription:
+    """The filters of one stream and the events waiting to be sent to it"""
+
+    def __init__(self, target_id=None, event_type=None, queue_size=EVENT_STREAM_QUEUE_SIZE):
+        self.target_id = target_id
+        self.event_type = event_type
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.reset_reason = None
+
+    def matches(self, event):
+        return (
+            (self.target_id is None or event.get("target_id") == self.target_id)
+            and (self.event_type is None or event.get("event_type") == self.event_type)
+        )
+
+    def push(self, event_id, payload):
+        try:
+            self.queue.put_nowait((event_id, payload))
+        except asyncio.QueueFull:
+            self.reset("overflow")
+
+    def reset(self, reason):
+        """
+        End the stream. Its client reconnects with Last-Event-ID and the events it
+        missed are replayed from the table, so whatever is still queued is dropped.
+        """
+        if self.reset_reason is not None:
+            return
+        self.reset_reason = reason
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class EventBroadcaster:
+    """
+    Fans the agent_event notifications out to the open streams of this worker over
+    a single LISTEN connection. The connection is opened by the first subscriber and
+    closed once no stream has been open for a keepalive interval. If it is lost every
+    stream is reset, and its client reconnects and catches up.
+    """
+
+    def __init__(self, channel=EVENT_CHANNEL, check_seconds=EVENT_STREAM_KEEPALIVE_SECONDS):
+        self.channel = channel
+        self.check_seconds = check_seconds
+        self._subscribers = set()
+        self._connection = None
+        self._lock = None
+        self._tasks = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    async def subscribe(self, target_id=None, event_type=None):
+        """
+        Register a stream, listening first, so every event committed after this
+        returns is delivered. Raises if the LISTEN connection cannot be opened.
+        """
+        await self._ensure_listening()
+        subscription = EventSubscription(target_id=target_id, event_type=event_type)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    async def _ensure_listening(self):
+        # Created on first use, inside the event loop serving the streams
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._connection is not None and not self._connection.is_closed():
+                return
+            # Always the primary, notifications are not replicated
+            db_config = config.db.base
+            connection = await asyncpg.connect(
+                host=db_config.host, port=db_config.port, database=db_config.name,
+                user=db_config.user, password=db_config.password, ssl=False,
+                server_settings={"application_name": "event_stream"},
+            )
+            await connection.add_listener(self.channel, self._on_notification)
+            connection.add_termination_listener(self._on_termination)
+            self._connection = connection
+            self._spawn(self._watch(connection))
+            logger.info(f"Listening on {self.channel} for the event streams")
+
+    def _spawn(self, coroutine):
+        # The loop only keeps weak references to its tasks
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        if not self._subscribers:
+            return
+        event = orjson.loads(payload)
+        if event.get("truncated"):
+            self._spawn(self._publish_truncated(event))
+        else:
+            self._publish(event, payload)
+
+    def _publish(self, event, payload):
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                subscription.push(event["id"], payload)
+
+    async def _publish_truncated(self, event):
+        # The row did not fit into the notification, only its key and filter columns did
+        query = AgentEvent.export_query().where(
+            AgentEvent.id == event["id"], AgentEvent.timestamp == datetime.fromisoformat(event["timestamp"])
+        )
+        try:
+            async with get_async_engine().connect() as conn:
+                row = (await conn.execute(query)).first()
+        except Exception as e:
+            logger.error(f"Could not read event {event['id']} for the event streams: {str(e)}")
+            for subscription in list(self._subscribers):
+                if subscription.matches(event):
+                    subscription.reset("unavailable")
+            return
+        if row is not None:
+            self._publish(event, orjson.dumps(dict(row._mapping)).decode())
+
+    def _on_termination(self, connection):
+        self._drop(connection)
+
+    def _drop(self, connection):
+        if self._connection is not connection:
+            return
+        self._connection = None
+        for subscription in list(self._subscribers):
+            subscription.reset("reconnect")
+
+    async def _watch(self, connection):
+        # A LISTEN connection is otherwise idle, a network failure would go unnoticed
+        while not connection.is_closed():
+            await asyncio.sleep(self.check_seconds)
+            if not self._subscribers:
+                self._drop(connection)
+                await connection.close()
+                return
+            try:
+                await asyncio.wait_for(connection.execute("SELECT 1"), timeout=self.check_seconds)
+            except Exception as e:
+                logger.warning(f"Lost the {self.channel} LISTEN connection: {str(e)}")
+                self._drop(connection)
+                connection.terminate()
+                return
+
+broadcaster = EventBroadcaster()
+
+registry.gauge("event_stream_subscribers", "Open live event streams of this worker",
+               lambda: {(): broadcaster.subscriber_count})
+
+def _message(event_id, payload):
+    return f"id: {event_id}\nevent: agent_event\ndata: {payload}\n\n".encode()
+
+def _reset_message(reason):
+    # The response ends after it, EventSource then reconnects on its own
+    return f"event: reset\ndata: {orjson.dumps({'reason': reason}).decode()}\n\n".encode()
+
+async def _backfill(subscription, last_event_id, limit):
+    # The events after last_event_id in (timestamp, id) order, read from the primary so
+    # replication lag cannot hide one that was committed before the stream listened
+    last_timestamp = select(AgentEvent.timestamp).where(AgentEvent.id == last_event_id).scalar_subquery()
+    query = AgentEvent.export_query(event_type=subscription.event_type, target_id=subscription.target_id).where(
+        AgentEvent.timestamp >= last_timestamp,
+        tuple_(AgentEvent.timestamp, AgentEvent.id) > tuple_(last_timestamp, last_event_id),
+    ).limit(limit)
+    async with get_async_engine().connect() as conn:
+        return (await conn.execute(query)).all()
+
+async def stream_events(target_id=None, event_type=None, last_event_id=None,
+                        keepalive_seconds=EVENT_STREAM_KEEPALIVE_SECONDS, backfill_limit=EVENT_STREAM_BACKFILL_LIMIT):
+    """
+    Yield the matching events as Server-Sent Events as they are committed, until the
+    client goes away or its subscription is reset.
+
+    Each event carries its id, so a reconnecting EventSource sends Last-Event-ID and
+    is first sent the events after it, up to backfill_limit, from the table; live
+    events it has already been sent that way are skipped. The database is only read
+    for that replay, the live events come from the broadcaster's notifications.
+    """
+    yield f"retry: {RETRY_MS}\n\n".encode()
+
+    # Subscribed here rather than by the endpoint, so the finally below always unsubscribes
+    try:
+        subscription = await broadcaster.subscribe(target_id=target_id, event_type=event_type)
+    except Exception as e:
+        logger.error(f"Could not open the event stream: {str(e)}")
+        yield _reset_message("unavailable")
+        return
+
+    try:
+        replayed = set()
+        if last_event_id:
+            rows = await _backfill(subscription, last_event_id, backfill_limit)
+            for row in rows:
+                replayed.add(row.id)
+                yield _message(row.id, orjson.dumps(dict(row._mapping)).decode())
+            if len(rows) == backfill_limit:
+                # Too far behind, the next connection picks up from the last one replayed
+                subscription.reset("backfill_limit")
+
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if item is None:
+                yield _reset_message(subscription.reset_reason)
+                return
+            event_id, payload = item
+            if event_id not in replayed:
+                yield _message(event_id, payload)
+    finally:
+        broadcaster.unsubscribe(subscription)
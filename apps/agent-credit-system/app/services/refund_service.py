@@ -1,6 +1,16 @@
 from libs.core.entities.agent_event import AgentEvent
 from libs.core.entities.agent_user import AgentUser
+from libs.core.ledger import apply_credit_change, build_credit_event_data
 from decimal import Decimal
+from sqlalchemy.exc import IntegrityError
+
+# What each constraint a refund write can hit means for the caller
+_CONSTRAINT_ERRORS = {
+    # A concurrent refund of the same charge already claimed it in agent_event_refund
+    "agent_event_refund_pkey": "Appointment already refunded",
+    # The user was deleted after the charge was read
+    "agent_event_target_id_fkey": "User not found",
+}
 
 def refund_appointment(appointment_id, user_id, db, dry_run=False):
     appointment = AgentEvent.find_by_appointment_id(appointment_id, db)
@@ -8,39 +18,46 @@ def refund_appointment(appointment_id, user_id, db, dry_run=False):
     if not appointment:
         raise ValueError("Appointment not found")
 
-    user = AgentUser.find_by_id(user_id, db)
-    if not user:
-        raise ValueError("User not found")
-
     if dry_run:
+        user = AgentUser.find_by_id(user_id, db)
+        if not user:
+            raise ValueError("User not found")
+
         return {
             "success": True,
             "message": "Dry run successful"
         }
 
-    single_amount = Decimal(appointment.event_data['amount'])
-    amount = single_amount * Decimal(appointment.event_data['count']) * -1
-
-    previous_balance = user.credit
-    new_balance = previous_balance + amount
-
-    # Update user's credit balance
-    user.credit = new_balance
-    db.commit()
-
-    # Create refund event
-    AgentEvent.create_refund_event(
-        target_id=user.id,
-        amount=amount,
-        previous_balance=previous_balance,
-        new_balance=new_balance,
-        refund_event_id=appointment.id,
-        description=f"Refund for appointment {appointment_id}",
-        appointment_id=appointment_id,
-        db=db
-    )
+    # The charge amount already covers the applied count, so the refund is its negation
+    amount = Decimal(appointment.event_data['amount']) * -1
+
+    # Update user's credit balance and create refund event
+    try:
+        apply_credit_change(
+            amount=amount,
+            user_id=user_id,
+            event_data=build_credit_event_data(
+                amount,
+                entry_type="refund",
+                refund_event_id=appointment.id,
+                appointment_id=appointment_id
+            ),
+            description=f"Refund for appointment {appointment_id}",
+            db=db
+        )
+    except IntegrityError as e:
+        db.rollback()
+        constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None) or ""
+        # Partitions attached after the legacy one carry the constraints with a number suffix
+        message = _CONSTRAINT_ERRORS.get(constraint.rstrip("0123456789"))
+        if message is None:
+            raise
+        raise ValueError(message) from e
 
     return {
         "success": True,
         "message": "Refund successful"
     }
+
+async def refund_appointment_async(appointment_id, user_id, db, dry_run=False):
+    return await db.run_sync(lambda session: refund_appointment(appointment_id, user_id, session, dry_run=dry_run))
@@ -0,0 +1,327 @@
+"""
+Contended-balance stress harness for the credit write path.
+
+Many threads send debits (consumable charges, no overdraft allowed) and refunds at a
+small set of hot agent users in a throwaway database, then the ledger invariants are
+checked:
+
+  - every hot user's balance equals the sum of its agent_credit events
+  - no balance and no recorded new_balance went below zero
+  - no lost update: the balance equals the seeded balance plus every change the
+    harness saw succeed, and there is one event per success
+  - no charge was refunded twice, although workers race to refund the same charges
+  - a refunded charge still cannot be refunded once the partition maintenance job
+    has moved it out of the default partition
+
+Throughput, latency percentiles and the time sessions spent waiting on row locks
+(sampled from pg_stat_activity) are reported per run, so locking strategies can be
+compared on the same numbers:
+
+  statement    Consumable.apply_consumable, the conditional UPDATE that checks and
+               writes the balance in one statement
+  for_update   Consumable.apply_consumables, SELECT ... FOR UPDATE then the check in
+               Python, --batch-size debits per transaction
+
+    cd apps/agent-credit-system
+    python -m benchmarks.contention --strategy statement --workers 32 --hot-users 4
+    python -m benchmarks.contention --strategy for_update --batch-size 10
+
+Exits 1 when an invariant does not hold.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from benchmarks.throwaway_db import throwaway_database
+
+class Ledger:
+    """What the workers saw succeed, the expected side of the invariants"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.changes = Counter()
+        self.events = Counter()
+        self.outcomes = Counter()
+        self.charges = []
+        self.latencies = []
+
+    def record(self, outcomes, seconds, changes=(), charges=()):
+        """One transaction: its outcome counts, its latency and the balance changes it committed"""
+        with self._lock:
+            self.outcomes.update(outcomes)
+            self.latencies.append(seconds)
+            for user_id, amount in changes:
+                self.changes[user_id] += amount
+                self.events[user_id] += 1
+            self.charges.extend(charges)
+
+    def pick_charge(self):
+        # Not removed, so several workers may race to refund the same charge
+        with self._lock:
+            return random.choice(self.charges) if self.charges else None
+
+def _debit(strategy, batch_size, fixture, ledger, db, worker, sequence):
+    from libs.core.entities.consumable import Consumable
+    from libs.core.ledger import InsufficientCreditError
+
+    items = []
+    for i in range(batch_size if strategy == "for_update" else 1):
+        consumable_id, cost = random.choice(fixture["consumables"])
+        items.append({
+            "consumable_id": consumable_id,
+            "user_id": random.choice(fixture["hot_users"]),
+            "count": 1,
+            "appointment_id": f"stress-{worker}-{sequence}-{i}",
+            "cost": cost,
+        })
+
+    started = time.perf_counter()
+    if strategy == "statement":
+        item = items[0]
+        try:
+            Consumable.apply_consumable(item["consumable_id"], item["user_id"], 1, None, None, db, appointment_id=item["appointment_id"])
+            results = [{"success": True}]
+        except InsufficientCreditError:
+            results = [{"success": False}]
+    else:
+        results = Consumable.apply_consumables(items, None, db)
+    elapsed = time.perf_counter() - started
+
+    applied = [item for item, result in zip(items, results) if result["success"]]
+    ledger.record(
+        {"debit": len(applied), "debit_rejected": len(items) - len(applied)}, elapsed,
+        changes=[(item["user_id"], -item["cost"]) for item in applied],
+        charges=[(item["user_id"], item["appointment_id"], item["cost"]) for item in applied],
+    )
+
+def _refund(ledger, db):
+    import app.services.refund_service as refund_service
+
+    charge = ledger.pick_charge()
+    if charge is None:
+        return
+    user_id, appointment_id, cost = charge
+    started = time.perf_counter()
+    try:
+        refund_service.refund_appointment(appointment_id, user_id, db)
+        ledger.record({"refund": 1}, time.perf_counter() - started, changes=[(user_id, cost)])
+    except ValueError:
+        # Already refunded, by this worker earlier or by a concurrent one
+        db.rollback()
+        ledger.record({"refund_rejected": 1}, time.perf_counter() - started)
+
+def _worker(strategy, batch_size, refund_ratio, deadline, fixture, ledger, worker):
+    from libs.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        sequence = 0
+        while time.perf_counter() < deadline:
+            sequence += 1
+            if random.random() < refund_ratio:
+                _refund(ledger, db)
+            else:
+                _debit(strategy, batch_size, fixture, ledger, db, worker, sequence)
+    finally:
+        db.close()
+
+def _sample_lock_waits(stop, interval, samples):
+    """Count sessions waiting on a lock every interval seconds, on a connection of its own"""
+    from sqlalchemy import text
+    from libs.core.database import get_engine
+
+    with get_engine().connect() as conn:
+        while not stop.is_set():
+            waiting = conn.execute(text(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            )).scalar()
+            conn.commit()
+            samples.append(waiting)
+            stop.wait(interval)
+
+def check_invariants(fixture, ledger):
+    """Violations of the ledger invariants on the hot users, empty when they all hold"""
+    from sqlalchemy import text
+    from libs.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("""
+            SELECT u.id, u.credit,
+                   coalesce(sum(CAST(e.event_data->>'amount' AS NUMERIC)), 0) AS ledger_balance,
+                   count(e.id) AS events,
+                   coalesce(min(CAST(e.event_data->>'new_balance' AS NUMERIC)), 0) AS lowest_balance
+            FROM agent_user u
+            LEFT JOIN agent_event e ON e.target_id = u.id AND e.event_type = 'agent_credit'
+            WHERE u.id = ANY(:ids)
+            GROUP BY u.id, u.credit
+        """), {"ids": fixture["hot_users"]}).all()
+        double_refunds = db.execute(text("""
+            SELECT count(*) FROM (
+                SELECT refund_event_id FROM agent_event
+                WHERE refund_event_id IS NOT NULL AND target_id = ANY(:ids)
+                GROUP BY refund_event_id HAVING count(*) > 1
+            ) AS doubled
+        """), {"ids": fixture["hot_users"]}).scalar()
+    finally:
+        db.close()
+
+    violations = []
+    for row in rows:
+        expected = fixture["balances"][row.id] + ledger.changes[row.id]
+        if row.credit != row.ledger_balance:
+            violations.append(f"{row.id}: balance {row.credit} but events sum to {row.ledger_balance}")
+        if row.credit < 0 or row.lowest_balance < 0:
+            violations.append(f"{row.id}: went negative, balance {row.credit}, lowest recorded {row.lowest_balance}")
+        if row.credit != expected:
+            violations.append(f"{row.id}: balance {row.credit}, expected {expected} from the successful changes (lost update)")
+        if row.events != fixture["events"][row.id] + ledger.events[row.id]:
+            violations.append(f"{row.id}: {row.events} events, expected {fixture['events'][row.id] + ledger.events[row.id]}")
+    if double_refunds:
+        violations.append(f"{double_refunds} charges refunded more than once")
+    return violations
+
+def check_refunds_after_partition_move(fixture, sample=10):
+    """
+    Violations of refund-once after a partition move, empty when it holds. A few refunded
+    charges and their refunds are moved to a month past the existing partitions, so they
+    land in the default partition, then the maintenance job moves them into a new monthly
+    partition and each charge is refunded again, which has to fail.
+    """
+    from sqlalchemy import text
+    from libs.core.database import SessionLocal
+    from libs.core.database.partitions import create_agent_event_partitions, MONTHS_AHEAD
+    import app.services.refund_service as refund_service
+
+    months_ahead = MONTHS_AHEAD + 2
+    db = SessionLocal()
+    try:
+        refunded = db.execute(text("""
+            SELECT charge.id, charge.target_id, charge.appointment_id
+            FROM agent_event charge
+            JOIN agent_event refund ON refund.refund_event_id = charge.id
+            WHERE charge.target_id = ANY(:ids)
+            ORDER BY charge.id
+            LIMIT :sample
+        """), {"ids": fixture["hot_users"], "sample": sample}).all()
+        if not refunded:
+            return []
+        charge_ids = [row.id for row in refunded]
+        db.execute(text("""
+            UPDATE agent_event SET timestamp = date_trunc('month', now()) + make_interval(months => :months)
+            WHERE id = ANY(:ids) OR refund_event_id = ANY(:ids)
+        """), {"ids": charge_ids, "months": months_ahead})
+        db.commit()
+        in_default = db.execute(text("SELECT count(*) FROM agent_event_p_default WHERE id = ANY(:ids)"), {"ids": charge_ids}).scalar()
+        create_agent_event_partitions(db, months_ahead=months_ahead)
+
+        violations = []
+        if in_default != len(charge_ids):
+            violations.append(f"only {in_default} of {len(charge_ids)} moved charges landed in the default partition")
+        for row in refunded:
+            try:
+                refund_service.refund_appointment(row.appointment_id, row.target_id, db)
+                violations.append(f"charge {row.id} was refunded again after a partition move")
+            except ValueError:
+                db.rollback()
+        return violations
+    finally:
+        db.close()
+
+def _percentile(latencies, fraction):
+    index = min(len(latencies) - 1, max(0, int(round(fraction * len(latencies))) - 1))
+    return latencies[index]
+
+def run(strategy, workers, hot_users, duration, refund_ratio, batch_size, balance, sample_interval):
+    from sqlalchemy import text
+    from libs.core.database import SessionLocal
+    from benchmarks.seed import seed
+
+    seeded = seed(users=hot_users, consumables=5, purchasables=1, events_per_user=1)
+    db = SessionLocal()
+    try:
+        # Top every hot user up to the starting balance through the ledger, so events still sum up
+        from libs.core.ledger import apply_credit_change
+        for user_id, _ in seeded["users"]:
+            apply_credit_change(Decimal(balance) - 100, db, user_id=user_id)
+        consumables = db.execute(text("SELECT id, cost FROM consumable")).all()
+        fixture = {
+            "hot_users": [user_id for user_id, _ in seeded["users"]],
+            "consumables": [(row.id, row.cost) for row in consumables],
+            "balances": {user_id: Decimal(balance) for user_id, _ in seeded["users"]},
+            "events": {user_id: 2 for user_id, _ in seeded["users"]},
+        }
+    finally:
+        db.close()
+
+    ledger = Ledger()
+    stop = threading.Event()
+    samples = []
+    sampler = threading.Thread(target=_sample_lock_waits, args=(stop, sample_interval, samples), daemon=True)
+    sampler.start()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_worker, strategy, batch_size, refund_ratio, deadline, fixture, ledger, worker) for worker in range(workers)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    latencies = sorted(ledger.latencies)
+    writes = ledger.outcomes["debit"] + ledger.outcomes["refund"]
+    return {
+        "strategy": strategy,
+        "batch_size": batch_size if strategy == "for_update" else 1,
+        "workers": workers,
+        "hot_users": hot_users,
+        "seconds": round(elapsed, 2),
+        "outcomes": dict(ledger.outcomes),
+        "committed_writes_per_second": round(writes / elapsed, 1),
+        "transactions_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        # Each sample is the number of sessions blocked on a lock at that instant
+        "lock_wait_seconds": round(sum(samples) * sample_interval, 2),
+        "mean_sessions_waiting": round(sum(samples) / len(samples), 2) if samples else 0,
+        "violations": check_invariants(fixture, ledger) + check_refunds_after_partition_move(fixture),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Contended-balance stress harness for the credit write path")
+    parser.add_argument("--strategy", choices=["statement", "for_update"], default="statement")
+    parser.add_argument("--batch-size", type=int, default=1, help="Debits per transaction with --strategy for_update")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent threads, each with its own session")
+    parser.add_argument("--hot-users", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--refund-ratio", type=float, default=0.3, help="Share of operations that are refunds")
+    parser.add_argument("--balance", default="200", help="Starting balance of each hot user, low enough to hit the overdraft rule")
+    parser.add_argument("--sample-interval", type=float, default=0.005, help="Seconds between lock wait samples")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the throwaway database")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with throwaway_database(keep=args.keep_db):
+        report = run(args.strategy, args.workers, args.hot_users, args.duration, args.refund_ratio,
+                     args.batch_size, args.balance, args.sample_interval)
+
+    print(json.dumps(report, indent=2, default=str))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    if report["violations"]:
+        sys.exit(1)
@@ -0,0 +1,220 @@
+"""
+Load benchmark of the hot endpoints against a throwaway local Postgres.
+
+Seeds synthetic users, catalog and events (see seed.py), then drives each scenario
+with concurrent workers through an in-process ASGI client, so the numbers cover the
+app and the database but no network. Throughput and p50/p95/p99 latency per scenario
+are written to a JSON file and compared with a baseline; the run fails when a
+scenario is slower than the baseline by more than the threshold.
+
+    cd apps/agent-credit-system
+    python -m benchmarks.load --update-baseline      # record benchmarks/baseline.json
+    python -m benchmarks.load                        # compare with it, exit 1 on a regression
+    python -m benchmarks.load --users 20000 --events-per-user 50 --concurrency 32
+
+Baselines are only comparable on the same machine and scale, the scale is stored
+with the results and a mismatch is reported instead of compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from benchmarks.throwaway_db import throwaway_database
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def _tool_ok(response):
+    # The tools router reports failures in the envelope with a 200
+    return response.status_code == 200 and response.json()["success"]
+
+def _scenarios(fixture, headers):
+    """Each scenario is (name, request(client, i), check(response))"""
+    users = fixture["users"]
+    consumables = fixture["consumables"]
+    purchasables = fixture["purchasables"]
+    charges = fixture["charges"]
+    # Search terms in the shapes the dashboard sends: name prefixes and mobile digit prefixes
+    terms = ["Bench Agent 1", "Agent 42", "+8520000", "852000012", "bench7"]
+
+    def apply_consumable(client, i):
+        user_id, _ = random.choice(users)
+        return client.post("/api/tools/apply_appointment_consumable", json={
+            "consumable_id": random.choice(consumables), "agent_user_id": user_id,
+            "count": 1, "appointment_id": f"bench-run-{i}"
+        })
+
+    def refund(client, i):
+        # Each seeded charge is refunded once, the scenario is capped at len(charges)
+        user_id, appointment_id = charges[i]
+        return client.post("/api/tools/refund_appointment", json={
+            "agent_user_id": user_id, "appointment_id": appointment_id
+        })
+
+    def purchase(client, i):
+        user_id, _ = random.choice(users)
+        return client.post("/api/tools/create_purchase_request", json={
+            "purchasable_id": random.choice(purchasables), "agent_user_id": user_id
+        })
+
+    def get_user(client, i):
+        _, mobile = random.choice(users)
+        return client.get(f"/api/tools/get_agent_user/{mobile}")
+
+    def list_events(client, i):
+        return client.get("/api/system/events", params={"limit": 50}, headers=headers)
+
+    def search_users(client, i):
+        return client.get("/api/agents/users", params={"search": random.choice(terms), "limit": 20}, headers=headers)
+
+    ok = lambda response: response.status_code == 200
+    return [
+        ("apply_consumable", apply_consumable, _tool_ok),
+        ("refund", refund, _tool_ok),
+        ("purchase", purchase, ok),
+        ("get_user", get_user, _tool_ok),
+        ("list_events", list_events, ok),
+        ("search_users", search_users, ok),
+    ]
+
+def _percentile(latencies, fraction):
+    """Nearest rank on sorted latencies"""
+    index = min(len(latencies) - 1, max(0, int(round(fraction * len(latencies))) - 1))
+    return latencies[index]
+
+async def _run_scenario(client, request, check, first, requests, concurrency):
+    latencies = []
+    errors = 0
+    next_index = first
+    end = first + requests
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < end:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - started)
+            if not check(response):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+async def run(fixture, requests, concurrency, warmup, only=None):
+    import httpx
+    from app.main import app
+    from app.core.security import create_access_token
+    from libs.core.database import get_async_engine
+
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": fixture["admin"]})}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, request, check in _scenarios(fixture, headers):
+            if only and name not in only:
+                continue
+            count = requests
+            if name == "refund":
+                # Every seeded charge can be refunded once
+                count = min(requests, len(fixture["charges"]) - warmup)
+            for i in range(warmup):
+                await request(client, i)
+            results[name] = await _run_scenario(client, request, check, warmup, count, concurrency)
+            print(f"{name:<18} {results[name]['throughput_rps']:8.1f} req/s  p50 {results[name]['p50_ms']:7.2f} ms  "
+                  f"p95 {results[name]['p95_ms']:7.2f} ms  p99 {results[name]['p99_ms']:7.2f} ms  errors {results[name]['errors']}")
+
+    await get_async_engine().dispose()
+    return results
+
+def compare(results, baseline, threshold):
+    """Regressions against the baseline: slower p95 or lower throughput by more than threshold"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load benchmark of the hot endpoints against a throwaway Postgres")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events-per-user", type=int, default=20)
+    parser.add_argument("--consumables", type=int, default=20)
+    parser.add_argument("--purchasables", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario")
+    parser.add_argument("--scenario", action="append", help="Only run this scenario, may be repeated")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the request mix")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown as a fraction, 0.2 is 20%%")
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the throwaway database")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scale = {"users": args.users, "events_per_user": args.events_per_user, "consumables": args.consumables,
+             "purchasables": args.purchasables, "requests": args.requests, "concurrency": args.concurrency}
+
+    with throwaway_database(keep=args.keep_db):
+        from benchmarks.seed import seed
+        started = time.perf_counter()
+        fixture = seed(users=args.users, consumables=args.consumables, purchasables=args.purchasables, events_per_user=args.events_per_user)
+        print(f"[benchmarks] seeded {args.users} users, {args.users * args.events_per_user} events in {time.perf_counter() - started:.1f} s")
+        scenarios = asyncio.run(run(fixture, args.requests, args.concurrency, args.warmup, only=args.scenario))
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "scale": scale,
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[benchmarks] baseline written to {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["scale"] != scale:
+        print(f"[benchmarks] baseline was recorded at {baseline['scale']}, not comparing")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"[benchmarks] REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"[benchmarks] no regression beyond {args.threshold:.0%} of {args.baseline}")
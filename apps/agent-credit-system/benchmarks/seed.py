@@ -0,0 +1,100 @@
+"""
+Synthetic data for the benchmarks, inserted set-based so large scales seed in seconds.
+
+Every agent user gets events_per_user agent_credit events, alternating a 100 top-up
+and a 50 charge on an appointment, spread over the last 90 days. Balances match the
+ledger, so the reconciliation job and the refund flow work on the seeded data.
+"""
+import os
+import sys
+from datetime import timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from sqlalchemy import text
+
+from libs.core.database import SessionLocal
+from libs.core.entities.admin_user import AdminUser
+
+BENCH_ADMIN = "bench-admin"
+
+_SEED_USERS_SQL = """
+    INSERT INTO agent_user (id, mobile, email, name, credit)
+    SELECT CAST(CAST(md5('bench-user-' || i) AS uuid) AS text),
+           '+852' || lpad(CAST(i AS text), 8, '0'),
+           'bench' || i || '@example.com',
+           'Bench Agent ' || i,
+           0
+    FROM generate_series(1, :users) AS i
+"""
+
+# Odd events are top-ups, even events are charges on appointment bench-<user>-<event>
+_SEED_EVENTS_SQL = """
+    INSERT INTO agent_event (id, event_type, target_id, event_data, description, timestamp, appointment_id)
+    SELECT upper(substr(md5('bench-event-' || i || '-' || j), 1, 26)),
+           'agent_credit',
+           CAST(CAST(md5('bench-user-' || i) AS uuid) AS text),
+           jsonb_build_object(
+               'type', 'default',
+               'amount', CASE WHEN j % 2 = 1 THEN '100' ELSE '-50' END,
+               'previous_balance', CAST(100 * (j / 2) - 50 * ((j - 1) / 2) AS text),
+               'new_balance', CAST(100 * ((j + 1) / 2) - 50 * (j / 2) AS text)
+           ) || CASE WHEN j % 2 = 0 THEN jsonb_build_object('appointment_id', 'bench-' || i || '-' || j) ELSE '{}' END,
+           CASE WHEN j % 2 = 1 THEN 'Bench top-up' ELSE 'Bench charge' END,
+           now() - make_interval(secs => (:events_per_user - j) * (:span_seconds / :events_per_user) + i),
+           CASE WHEN j % 2 = 0 THEN 'bench-' || i || '-' || j END
+    FROM generate_series(1, :users) AS i, generate_series(1, :events_per_user) AS j
+"""
+
+_SEED_BALANCES_SQL = """
+    UPDATE agent_user
+    SET credit = 100 * ((CAST(:events_per_user AS int) + 1) / 2) - 50 * (CAST(:events_per_user AS int) / 2)
+    WHERE email LIKE 'bench%@example.com'
+"""
+
+def seed(users=1000, consumables=20, purchasables=5, events_per_user=20):
+    """
+    Insert the synthetic data and return what the scenarios need to address it.
+
+    Returns:
+        dict: admin username, users as (id, mobile), consumable and purchasable ids,
+              and the seeded (user id, appointment id) charges that can be refunded
+    """
+    db = SessionLocal()
+    try:
+        admin = AdminUser.create_admin(BENCH_ADMIN, "bench-admin@example.com", "bench-password", db)
+
+        params = {"users": users, "events_per_user": events_per_user, "span_seconds": int(timedelta(days=90).total_seconds())}
+        db.execute(text(_SEED_USERS_SQL), params)
+        db.execute(text(_SEED_EVENTS_SQL), params)
+        db.execute(text(_SEED_BALANCES_SQL), params)
+
+        db.execute(
+            text("INSERT INTO consumable (id, name, cost, meta_data) "
+                 "SELECT CAST(CAST(md5('bench-consumable-' || i) AS uuid) AS text), 'Bench consumable ' || i, 1 + i % 5, '{}' "
+                 "FROM generate_series(1, :consumables) AS i"),
+            {"consumables": consumables}
+        )
+        db.execute(
+            text("INSERT INTO purchasable (id, name, price, credit_amount) "
+                 "SELECT CAST(CAST(md5('bench-purchasable-' || i) AS uuid) AS text), 'Bench pack ' || i, 10 * i, 100 * i "
+                 "FROM generate_series(1, :purchasables) AS i"),
+            {"purchasables": purchasables}
+        )
+        db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+        user_rows = db.execute(text("SELECT id, mobile FROM agent_user ORDER BY mobile")).all()
+        return {
+            "admin": admin.username,
+            "users": [(row.id, row.mobile) for row in user_rows],
+            "consumables": [row.id for row in db.execute(text("SELECT id FROM consumable"))],
+            "purchasables": [row.id for row in db.execute(text("SELECT id FROM purchasable"))],
+            "charges": [
+                (row.target_id, row.appointment_id)
+                for row in db.execute(text("SELECT target_id, appointment_id FROM agent_event WHERE appointment_id LIKE 'bench-%' ORDER BY id"))
+            ],
+        }
+    finally:
+        db.close()
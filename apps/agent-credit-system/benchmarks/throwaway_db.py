@@ -0,0 +1,59 @@
+"""
+A throwaway Postgres database for the benchmarks.
+
+A fresh database is created on the server configured by the usual DB_* variables,
+migrated, used, then dropped. The DB_USER needs the CREATEDB privilege. Nothing
+touches DB_NAME itself, it is only the prefix of the throwaway name.
+"""
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+import psycopg2
+
+from libs.core.configs import config
+
+def _execute(statement):
+    """Run a statement on the maintenance database, outside a transaction as CREATE DATABASE needs"""
+    db_config = config.db.base
+    conn = psycopg2.connect(host=db_config.host, port=db_config.port, user=db_config.user,
+                            password=db_config.password, dbname="postgres")
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+@contextmanager
+def throwaway_database(keep=False):
+    """
+    Create and migrate a database named <DB_NAME>_bench_<random>, and point the
+    app at it for the duration of the block. Must be entered before the first
+    session is made, the engines are only created on first use.
+    """
+    from libs.core.database import get_engine, run_migrations
+
+    name = f"{config.db.base.name}_bench_{uuid.uuid4().hex[:8]}"
+    _execute(f'CREATE DATABASE "{name}"')
+    print(f"[benchmarks] created database {name}")
+
+    original_name = config.db.base.name
+    config.db.base.name = name
+    os.environ["DB_NAME"] = name
+    try:
+        run_migrations()
+        yield name
+    finally:
+        # Connections still open on the async engine are closed by the forced drop
+        get_engine().dispose()
+        config.db.base.name = original_name
+        os.environ["DB_NAME"] = original_name
+        if keep:
+            print(f"[benchmarks] kept database {name}")
+        else:
+            _execute(f'DROP DATABASE "{name}" WITH (FORCE)')
+            print(f"[benchmarks] dropped database {name}")
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of the tools router response path.
+
+Compares the previous path (StandardResponse validation, then the stdlib json
+encoder, as FastAPI does for a returned dict) with tool_response (orjson, no
+re-validation), on payloads shaped like /tools/list_consumables and
+/tools/get_agent_user. With --mobile it also times both endpoints end to end
+through the ASGI app, which needs the database.
+
+    cd apps/agent-credit-system
+    python -m benchmarks.tools_json
+    python -m benchmarks.tools_json --mobile +85291234567
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.tools import StandardResponse, tool_response
+
+def consumables_payload(size):
+    consumables = [
+        {"id": str(uuid.uuid4()), "name": f"Consumable {i}", "cost": Decimal("12.50"), "meta_data": {"unit": "call", "tier": i % 3}}
+        for i in range(size)
+    ]
+    return {
+        "success": True,
+        "data": {"consumables": consumables, "total": len(consumables)},
+        "message": "Consumables retrieved successfully"
+    }
+
+def agent_user_payload():
+    user = {"id": str(uuid.uuid4()), "mobile": "+85291234567", "email": "agent@example.com", "name": "Agent", "credit": Decimal("190.00")}
+    return {
+        "success": True,
+        "data": {"user": user},
+        "message": "Agent user retrieved successfully"
+    }
+
+def render_previous(content):
+    # What FastAPI does with a dict and response_model=StandardResponse
+    validated = StandardResponse.model_validate(content)
+    encoded = jsonable_encoder(validated.model_dump(mode="json"))
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def render_fast(content):
+    return tool_response(content["success"], data=content["data"], message=content["message"]).body
+
+def timeit(fn, content, iterations):
+    fn(content)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(content)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+async def time_endpoint(client, url, iterations):
+    await client.get(url)
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+async def run_endpoints(mobile, iterations):
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for url in ["/api/tools/list_consumables", f"/api/tools/get_agent_user/{mobile}"]:
+            p50, p99 = await time_endpoint(client, url, iterations)
+            print(f"{url:<45} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tools router response path micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--catalog-size", type=int, default=50)
+    parser.add_argument("--mobile", help="Also time the endpoints end to end for this agent user")
+    args = parser.parse_args()
+
+    for name, content in [
+        (f"list_consumables ({args.catalog_size} items)", consumables_payload(args.catalog_size)),
+        ("get_agent_user", agent_user_payload()),
+    ]:
+        assert json.loads(render_previous(content)) == json.loads(render_fast(content))
+        previous = timeit(render_previous, content, args.iterations)
+        fast = timeit(render_fast, content, args.iterations)
+        print(f"{name:<45} previous {previous:8.1f} us  fast {fast:8.1f} us  {previous / fast:5.1f}x")
+
+    if args.mobile:
+        asyncio.run(run_endpoints(args.mobile, args.iterations // 10))
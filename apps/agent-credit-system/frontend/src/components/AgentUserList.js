@@ -440,6 +440,7 @@ const AgentUserList = () => {
       {openCreditHistory && (
         <CreditHistory
           mobile={selectedUser?.mobile}
+          userId={selectedUser?.id}
           onClose={handleCloseCreditHistory}
         />
       )}
@@ -1,8 +1,9 @@
 import React, { useState, useEffect } from 'react';
 import { fetchAgentCreditHistory } from '../services/agentUserService';
+import { subscribeToEvents } from '../services/eventsService';
 import { authService } from '../services/api';
 
-const CreditHistory = ({ mobile, onClose }) => {
+const CreditHistory = ({ mobile, userId, onClose }) => {
   const [events, setEvents] = useState([]);
   const [loading, setLoading] = useState(false);
   const [totalEvents, setTotalEvents] = useState(0);
@@ -16,6 +17,16 @@ const CreditHistory = ({ mobile, onClose }) => {
     }
   }, [mobile, page, rowsPerPage]);
 
+  // The first page shows the user's new credit events as they are pushed instead of being reloaded
+  useEffect(() => {
+    if (!userId || page !== 0) return undefined;
+
+    return subscribeToEvents((event) => {
+      setEvents(prev => [event, ...prev.filter(existing => existing.id !== event.id)].slice(0, rowsPerPage));
+      setTotalEvents(prev => prev + 1);
+    }, 'agent_credit', userId);
+  }, [userId, page, rowsPerPage]);
+
   const loadCreditHistory = async () => {
     setLoading(true);
     try {
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { fetchEvents, fetchEventTypes } from '../services/eventsService';
+import { fetchEvents, fetchEventTypes, subscribeToEvents } from '../services/eventsService';
 import { fetchAgentUserById } from '../services/agentUserService';
 import { authService } from '../services/api';
 
@@ -20,6 +20,17 @@ const EventsList = () => {
     loadEventTypes();
   }, [page, rowsPerPage, eventTypeFilter]);
 
+  // The first page shows new events as they are pushed instead of being reloaded
+  useEffect(() => {
+    if (page !== 0) return undefined;
+
+    return subscribeToEvents((event) => {
+      setEvents(prev => [event, ...prev.filter(existing => existing.id !== event.id)].slice(0, rowsPerPage));
+      setTotalEvents(prev => prev + 1);
+      loadUserInfo(event.target_id);
+    }, eventTypeFilter || null);
+  }, [page, rowsPerPage, eventTypeFilter]);
+
   const loadEventTypes = async () => {
     try {
       const types = await fetchEventTypes();
@@ -876,7 +876,9 @@ export const agentUserService = {
         params: {
           search,
           skip: (page - 1) * limit,
-          limit
+          limit,
+          // The search dialog never shows a total, skip counting the matches
+          total: 'none'
         }
       });
       return response.data;
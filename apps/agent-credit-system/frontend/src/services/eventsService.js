@@ -39,3 +39,69 @@ export const fetchEventTypes = async () => {
     return ['agent_credit']; // Provide a default in case of error
   }
 };
+
+// Milliseconds to wait before reconnecting, as the server asks in its retry field
+const STREAM_RETRY_MS = 3000;
+
+// Calls onEvent with each new event as it is committed, returns a function that stops listening.
+// EventSource cannot send the Authorization header, so each connection is opened with a
+// short-lived stream token in the query string. It has expired by the time the browser would
+// reconnect on its own, so reconnects are made here with a new token, resuming after the last
+// event received.
+export const subscribeToEvents = (onEvent, eventType = null, targetId = null) => {
+  let source = null;
+  let retry = null;
+  let lastEventId = null;
+  let stopped = false;
+
+  const reconnect = () => {
+    if (source) {
+      source.close();
+      source = null;
+    }
+    if (stopped || retry) return;
+    retry = setTimeout(() => {
+      retry = null;
+      connect();
+    }, STREAM_RETRY_MS);
+  };
+
+  const connect = async () => {
+    let streamToken;
+    try {
+      const response = await api.post(`${API_URL}/stream/token`);
+      streamToken = response.data.stream_token;
+    } catch (error) {
+      console.error('Error opening the event stream:', error);
+      reconnect();
+      return;
+    }
+    if (stopped) return;
+
+    const params = new URLSearchParams({ stream_token: streamToken });
+    if (eventType) {
+      params.append('event_type', eventType);
+    }
+    if (targetId) {
+      params.append('target_id', targetId);
+    }
+    if (lastEventId) {
+      params.append('last_event_id', lastEventId);
+    }
+    source = new EventSource(`${api.defaults.baseURL}${API_URL}/stream?${params}`);
+    source.addEventListener('agent_event', (message) => {
+      lastEventId = message.lastEventId;
+      onEvent(JSON.parse(message.data));
+    });
+    // The server ends the stream after a reset, and errors include a dropped connection
+    source.addEventListener('reset', reconnect);
+    source.onerror = reconnect;
+  };
+
+  connect();
+  return () => {
+    stopped = true;
+    clearTimeout(retry);
+    if (source) source.close();
+  };
+};
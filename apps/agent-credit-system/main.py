@@ -1,9 +1,23 @@
 import sys
 sys.path.append("../..")
 
-from app.main import app
-from libs.core.database.migrations import run_migrations
+from libs.core.logs import startup_report
+
+with startup_report.phase("import"):
+    from app.main import app
+    from libs.core.database import get_engine
+    from libs.core.database.migrations import run_migrations
+    from libs.core.database.partitions import run_partition_maintenance
+
 if __name__ == "__main__":
     import uvicorn
-    run_migrations()
+    with startup_report.phase("engine"):
+        # First connection, reused from the pool by the migrations and the first request
+        with get_engine().connect():
+            pass
+    with startup_report.phase("migrations"):
+        run_migrations()
+    with startup_report.phase("partition maintenance"):
+        run_partition_maintenance()
+    startup_report.print_report()
     uvicorn.run(app, host="0.0.0.0", port=8100)
@@ -0,0 +1,4 @@
+from .event_rollup import roll_up_events, run_event_rollup
+from .event_reports import events_summary, events_by_type
+
+__all__ = ["roll_up_events", "run_event_rollup", "events_summary", "events_by_type"]
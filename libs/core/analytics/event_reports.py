@@ -0,0 +1,184 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, text
+
+from ..entities.agent_event import AgentEvent
+from .event_rollup import ROLLUP_NAME, AGGREGATE_EVENTS_SQL, EVENTS_AFTER_SQL
+
+METRICS = ("events", "credits_spent", "credits_purchased", "refunds", "credits_refunded")
+
+# The rollup rows of one dimension plus the events the rollup has not reached yet,
+# aggregated the same way. The position is read in the same statement, so an event
+# is counted either from the rollup or from the tail, never both.
+_REPORT_SQL = """
+    WITH position AS (
+        SELECT coalesce(event_timestamp, '-infinity') AS event_timestamp, coalesce(event_id, '') AS event_id
+        FROM event_rollup_position WHERE name = :rollup
+    ),
+    tail_events AS (
+        {tail_events}
+          AND timestamp >= :since
+    ),
+    tail AS ({tail}),
+    daily AS (
+        SELECT day, event_type, key, events, credits_spent, credits_purchased, refunds, credits_refunded
+        FROM agent_event_daily
+        WHERE dimension = :dimension AND day >= :since {filters}
+        UNION ALL
+        SELECT day, event_type, key, events, credits_spent, credits_purchased, refunds, credits_refunded
+        FROM tail
+        WHERE dimension = :dimension {filters}
+    )
+    SELECT {group_by} AS {label}, sum(events) AS events, sum(credits_spent) AS credits_spent,
+           sum(credits_purchased) AS credits_purchased, sum(refunds) AS refunds,
+           sum(credits_refunded) AS credits_refunded
+    FROM daily
+    GROUP BY {group_by}
+    ORDER BY {order_by}
+    LIMIT :limit
+"""
+
+_TAIL_EVENTS_SQL = EVENTS_AFTER_SQL.format(
+    after_timestamp="(SELECT event_timestamp FROM position)",
+    after_id="(SELECT event_id FROM position)",
+)
+
+def _breakdown(db, dimension, group_by, since, key=None, event_type=None, label=None, order_by=None, limit=1000):
+    filters = ""
+    if key is not None:
+        filters += " AND key = :key"
+    if event_type is not None:
+        filters += " AND event_type = :event_type"
+    statement = _REPORT_SQL.format(
+        tail_events=_TAIL_EVENTS_SQL,
+        tail=AGGREGATE_EVENTS_SQL.format(events="tail_events"),
+        filters=filters,
+        group_by=group_by,
+        label=label or group_by,
+        order_by=order_by or group_by,
+    )
+    rows = db.execute(text(statement), {
+        "rollup": ROLLUP_NAME,
+        "dimension": dimension,
+        "since": since,
+        "key": key,
+        "event_type": event_type,
+        "limit": limit,
+    }).mappings().all()
+    return [dict(row) for row in rows]
+
+def _totals(rows):
+    return {metric: sum(row[metric] for row in rows) for metric in METRICS}
+
+def _recent_events(db, since, target_id=None, event_type=None, limit=20):
+    """The newest events of the window, as the dashboard lists them"""
+    conditions = AgentEvent.time_range(datetime.combine(since, time.min))
+    if target_id:
+        conditions.append(AgentEvent.target_id == target_id)
+    if event_type:
+        conditions.append(AgentEvent.event_type == event_type)
+    events = db.execute(
+        select(AgentEvent).where(*conditions).order_by(AgentEvent.timestamp.desc(), AgentEvent.id.desc()).limit(limit)
+    ).scalars()
+    return [_dashboard_event(event) for event in events]
+
+def _dashboard_event(event):
+    # The dashboard's event table, the agent user is its reference and the appointment its session
+    metadata = {
+        "description": event.description,
+        "created_by_username": event.created_by_username,
+        "refund_event_id": event.refund_event_id,
+    }
+    return {
+        "id": event.id,
+        "event_name": event.event_type,
+        "session_id": event.appointment_id or "",
+        "reference_id": event.target_id,
+        "timestamp": event.timestamp,
+        "event_data": event.event_data,
+        "metadata": {key: value for key, value in metadata.items() if value is not None},
+    }
+
+def _window(days):
+    """The first day covered by a report of the last days days, today included"""
+    return date.today() - timedelta(days=days - 1)
+
+def events_summary(db, days=7, target_id=None, top=20, recent=20, include_users=True):
+    """
+    Event counts and credit flows over the last days days, from the daily rollups.
+
+    The analytics dashboard reads total_events, event_counts, daily_counts,
+    top_references (the agent users with the most events) and recent_events, the
+    only part read from agent_event itself, a page of the newest events.
+
+    Args:
+        db (Session): Database session
+        days (int): Days covered, today included
+        target_id (str): Only the events of this agent user
+        top (int): Agent users, consumables and purchasables listed, by event count
+        recent (int): Newest events listed
+        include_users (bool): Rank the users for top_references, which reads one
+            rollup row per active user and day of the window, unlike the other breakdowns
+
+    Returns:
+        dict: since, totals, by_type, by_day, top_items and the dashboard's fields
+    """
+    since = _window(days)
+    dimension, key = ("user", target_id) if target_id else ("total", None)
+    by_type = _breakdown(db, dimension, "event_type", since, key=key)
+    by_day = _breakdown(db, dimension, "day", since, key=key)
+    totals = _totals(by_type)
+    top_users = _breakdown(db, "user", "key", since, key=key, label="reference_id", order_by="events DESC, key", limit=top) if include_users else []
+    return {
+        "days": days,
+        "since": since,
+        "target_id": target_id,
+        "totals": totals,
+        "by_type": by_type,
+        "by_day": by_day,
+        # The item rollup is not split per user
+        "top_items": [] if target_id else _breakdown(
+            db, "item", "key", since, label="name", order_by="events DESC, key", limit=top
+        ),
+        "total_events": totals["events"],
+        "event_counts": {row["event_type"]: row["events"] for row in by_type},
+        "daily_counts": [{"date": row["day"], "count": row["events"]} for row in by_day],
+        "top_references": [{"reference_id": row["reference_id"], "count": row["events"]} for row in top_users],
+        "recent_events": _recent_events(db, since, target_id=target_id, limit=recent),
+    }
+
+def events_by_type(event_type, db, days=30, target_id=None, limit=100, include_users=False):
+    """
+    Counts and credit flows of one event type over the last days days, from the daily rollups,
+    with the newest limit events of the type for the dashboard's event list.
+
+    Args:
+        event_type (str): Event type, e.g. agent_credit
+        db (Session): Database session
+        days (int): Days covered, today included
+        target_id (str): Only the events of this agent user
+        limit (int): Events, items and users listed
+        include_users (bool): Also rank the users, which reads one rollup row per
+            active user and day of the window, unlike the other breakdowns
+
+    Returns:
+        dict: since, totals, by_day, events and, across all users, by_item and top_users
+    """
+    since = _window(days)
+    dimension, key = ("user", target_id) if target_id else ("total", None)
+    by_day = _breakdown(db, dimension, "day", since, key=key, event_type=event_type)
+    report = {
+        "event_type": event_type,
+        "days": days,
+        "since": since,
+        "target_id": target_id,
+        "totals": _totals(by_day),
+        "by_day": by_day,
+        "events": _recent_events(db, since, target_id=target_id, event_type=event_type, limit=limit),
+        "by_item": [],
+        "top_users": [],
+    }
+    if not target_id:
+        report["by_item"] = _breakdown(db, "item", "key", since, event_type=event_type, label="name", order_by="events DESC, key", limit=limit)
+    if not target_id and include_users:
+        report["top_users"] = _breakdown(db, "user", "key", since, event_type=event_type, label="user_id", order_by="events DESC, key", limit=limit)
+    return report
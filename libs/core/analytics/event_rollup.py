@@ -0,0 +1,178 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from ..logs import logger
+
+ROLLUP_NAME = "agent_event_daily"
+
+# Folds a set of events, the relation named by {events}, into the rows of
+# agent_event_daily: one GROUPING SETS pass yields the total, user and item
+# dimensions. Events without a consumable or purchasable have no item row.
+AGGREGATE_EVENTS_SQL = """
+    SELECT day, event_type,
+           CASE WHEN GROUPING(target_id) = 0 THEN 'user'
+                WHEN GROUPING(item_name) = 0 THEN 'item'
+                ELSE 'total' END AS dimension,
+           coalesce(target_id, item_name, '') AS key,
+           count(*) AS events,
+           coalesce(sum(-amount) FILTER (WHERE amount < 0), 0) AS credits_spent,
+           coalesce(sum(amount) FILTER (WHERE purchase), 0) AS credits_purchased,
+           count(*) FILTER (WHERE refund) AS refunds,
+           coalesce(sum(amount) FILTER (WHERE refund), 0) AS credits_refunded
+    FROM (
+        SELECT CAST(e.timestamp AS DATE) AS day, e.event_type, e.target_id,
+               -- A refund only names its charge, the charge names the consumable. A
+               -- subquery rather than a join, so only refunds pay for the lookup.
+               coalesce(e.event_data->>'consumable_name', e.event_data->>'purchasable_name',
+                        CASE WHEN e.refund_event_id IS NOT NULL THEN (
+                            SELECT charge.event_data->>'consumable_name' FROM agent_event AS charge
+                            WHERE charge.id = e.refund_event_id LIMIT 1
+                        ) END) AS item_name,
+               CASE WHEN e.event_type = 'agent_credit' THEN CAST(e.event_data->>'amount' AS NUMERIC) END AS amount,
+               e.event_data->>'type' = 'refund' AS refund,
+               e.event_data ? 'purchasable_name' AS purchase
+        FROM {events} AS e
+    ) AS classified
+    GROUP BY GROUPING SETS ((day, event_type), (day, event_type, target_id), (day, event_type, item_name))
+    HAVING GROUPING(item_name) = 1 OR item_name IS NOT NULL
+"""
+
+# Events after a (timestamp, id) position, the plain bound lets the planner skip older partitions
+EVENTS_AFTER_SQL = """
+    SELECT id, timestamp, event_type, target_id, event_data, refund_event_id
+    FROM agent_event
+    WHERE timestamp >= {after_timestamp} AND (timestamp, id) > ({after_timestamp}, {after_id})
+"""
+
+_LOCK_POSITION_SQL = """
+    SELECT coalesce(event_timestamp, '-infinity') AS event_timestamp, coalesce(event_id, '') AS event_id
+    FROM event_rollup_position WHERE name = :name
+    FOR UPDATE
+"""
+
+_ROLL_UP_BATCH_SQL = """
+    WITH batch AS (
+        {events_after}
+          AND timestamp < :cutoff
+        ORDER BY timestamp, id
+        LIMIT :batch_size
+    ),
+    aggregated AS ({aggregate}),
+    upserted AS (
+        INSERT INTO agent_event_daily (dimension, key, day, event_type, events, credits_spent, credits_purchased, refunds, credits_refunded)
+        SELECT dimension, key, day, event_type, events, credits_spent, credits_purchased, refunds, credits_refunded
+        FROM aggregated
+        ON CONFLICT (dimension, key, day, event_type) DO UPDATE SET
+            events = agent_event_daily.events + excluded.events,
+            credits_spent = agent_event_daily.credits_spent + excluded.credits_spent,
+            credits_purchased = agent_event_daily.credits_purchased + excluded.credits_purchased,
+            refunds = agent_event_daily.refunds + excluded.refunds,
+            credits_refunded = agent_event_daily.credits_refunded + excluded.credits_refunded
+    )
+    SELECT count(*) AS events, max(timestamp) AS event_timestamp,
+           (SELECT id FROM batch ORDER BY timestamp DESC, id DESC LIMIT 1) AS event_id
+    FROM batch
+""".format(
+    events_after=EVENTS_AFTER_SQL.format(after_timestamp=":after_timestamp", after_id=":after_id"),
+    aggregate=AGGREGATE_EVENTS_SQL.format(events="batch"),
+)
+
+_ADVANCE_POSITION_SQL = """
+    UPDATE event_rollup_position
+    SET event_timestamp = :event_timestamp, event_id = :event_id, events = events + :events, updated_at = :updated_at
+    WHERE name = :name
+"""
+
+def roll_up_events(db, batch_size=50000, settle_seconds=60, max_batches=None):
+    """
+    Fold the agent_event rows after the stored position into agent_event_daily.
+
+    Events are consumed in (timestamp, id) order, which is ULID order for the ids the
+    ledger generates, batch_size at a time. Each batch is aggregated and upserted by
+    one statement and the position advanced in the same transaction, so a batch is
+    counted exactly once even if the job is interrupted. Concurrent runs queue on the
+    position row.
+
+    Only events older than settle_seconds are folded in. A ledger write takes its
+    timestamp before it commits, so a newer position could still gain an older event
+    afterwards. The reports add the events after the position on the fly.
+
+    Args:
+        db (Session): Database session
+        batch_size (int): Events per transaction
+        settle_seconds (int): Minimum age of an event before it is folded in
+        max_batches (int): Stop after this many batches, None to catch up completely
+
+    Returns:
+        dict: events and batches folded in, and the position reached
+    """
+    cutoff = datetime.now() - timedelta(seconds=settle_seconds)
+    report = {"events": 0, "batches": 0, "event_timestamp": None, "event_id": None}
+
+    while max_batches is None or report["batches"] < max_batches:
+        try:
+            position = db.execute(text(_LOCK_POSITION_SQL), {"name": ROLLUP_NAME}).one()
+            batch = db.execute(text(_ROLL_UP_BATCH_SQL), {
+                "after_timestamp": position.event_timestamp,
+                "after_id": position.event_id,
+                "cutoff": cutoff,
+                "batch_size": batch_size,
+            }).one()
+            if not batch.events:
+                db.rollback()
+                break
+            db.execute(text(_ADVANCE_POSITION_SQL), {
+                "name": ROLLUP_NAME,
+                "event_timestamp": batch.event_timestamp,
+                "event_id": batch.event_id,
+                "events": batch.events,
+                "updated_at": datetime.now(),
+            })
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        report["events"] += batch.events
+        report["batches"] += 1
+        report["event_timestamp"] = batch.event_timestamp
+        report["event_id"] = batch.event_id
+        logger.info(f"Rolled up {report['events']} events, up to {batch.event_timestamp} {batch.event_id}")
+        if batch.events < batch_size:
+            break
+
+    return report
+
+def run_event_rollup(batch_size=50000, settle_seconds=60):
+    """
+    Rollup job, run from a scheduled job every minute or so. A failure is only
+    logged, the reports still add the events the rollup has not reached.
+    """
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+
+    session = create_nexi_db_session()
+    try:
+        return roll_up_events(session, batch_size=batch_size, settle_seconds=settle_seconds)
+    except Exception as e:
+        logger.error(f"agent_event rollup failed: {str(e)}")
+    finally:
+        session.close()
+
+# Run from the repository root: python -m libs.core.analytics.event_rollup
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fold new agent events into the daily analytics rollups")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--settle-seconds", type=int, default=60)
+    parser.add_argument("--every", type=float, help="Keep running, once every this many seconds")
+    args = parser.parse_args()
+
+    while True:
+        report = run_event_rollup(batch_size=args.batch_size, settle_seconds=args.settle_seconds)
+        print(json.dumps(report, default=str))
+        if not args.every:
+            sys.exit(0 if report is not None else 1)
+        time.sleep(args.every)
@@ -0,0 +1,3 @@
+from .catalog_cache import CatalogCache, catalog_stats
+
+__all__ = ["CatalogCache", "catalog_stats"]
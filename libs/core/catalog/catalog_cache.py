@@ -0,0 +1,124 @@
+import threading
+import time
+from decimal import Decimal
+
+import orjson
+
+from ..configs import config
+
+_caches = {}
+
+def _default(obj):
+    # Decimal as its string, the same text the API responses give amounts
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class CatalogCache:
+    """
+    In-process read-through cache of a small catalog table.
+
+    The whole table is loaded at once through loader(db), which returns the rows as
+    dicts in list order. Lookups by id and the list payload are then served from memory
+    until the cache is invalidated or the TTL runs out. The cached dicts are shared
+    between callers and must be treated as read-only.
+
+    Each row is also rendered to JSON by orjson once, when it is stored, so list
+    responses are put together from bytes instead of serializing the rows per request.
+    """
+
+    def __init__(self, name, loader, ttl=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = config.system.catalog_cache_ttl if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entry = None
+        _caches[name] = self
+
+    def _cached(self):
+        entry = self._entry
+        if entry is not None and entry["expires_at"] > time.monotonic():
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def _store(self, generation, items):
+        entry = {
+            "expires_at": time.monotonic() + self.ttl,
+            "by_id": {item["id"]: item for item in items},
+            "items": items,
+            "rendered": [orjson.dumps(item, default=_default, option=orjson.OPT_NON_STR_KEYS) for item in items],
+        }
+        with self._lock:
+            # An invalidation while the load ran means the rows may already be stale
+            if generation == self._generation:
+                self._entry = entry
+        return entry
+
+    def _load(self, db):
+        generation = self._generation
+        return self._store(generation, self.loader(db))
+
+    async def _load_async(self, db):
+        generation = self._generation
+        return self._store(generation, await db.run_sync(self.loader))
+
+    def get(self, id, db):
+        """The row with this id as a dict, or None"""
+        entry = self._cached() or self._load(db)
+        return entry["by_id"].get(id)
+
+    async def get_async(self, id, db):
+        entry = self._cached() or await self._load_async(db)
+        return entry["by_id"].get(id)
+
+    def list(self, db):
+        """Every row as a dict, in catalog order"""
+        entry = self._cached() or self._load(db)
+        return entry["items"]
+
+    async def list_async(self, db):
+        entry = self._cached() or await self._load_async(db)
+        return entry["items"]
+
+    @staticmethod
+    def _page_json(entry, skip, limit):
+        rendered = entry["rendered"]
+        page = rendered[skip:] if limit is None else rendered[skip:skip + limit]
+        return b"[" + b",".join(page) + b"]", len(rendered)
+
+    def list_json(self, db, skip=0, limit=None):
+        """A page of the rows as a JSON array, and the number of rows in the catalog"""
+        entry = self._cached() or self._load(db)
+        return self._page_json(entry, skip, limit)
+
+    async def list_json_async(self, db, skip=0, limit=None):
+        entry = self._cached() or await self._load_async(db)
+        return self._page_json(entry, skip, limit)
+
+    def invalidate(self):
+        """Drop the cached rows and their JSON, call after the write that changed them has committed"""
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations,
+            "cached_items": len(self._entry["items"]) if self._entry else 0,
+            "ttl": self.ttl,
+        }
+
+def catalog_stats():
+    """Hit and miss counters of every catalog cache, by name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -16,6 +16,7 @@ class DatabaseConfig:
 
 class DatabaseConfigCollection:
     base: DatabaseConfig
+    replicas: list[DatabaseConfig]
 
     def __init__(self):
         self.base = DatabaseConfig(
@@ -25,11 +26,35 @@ class DatabaseConfigCollection:
             password=os.getenv("DB_PASSWORD", "11111111"),
             name=os.getenv("DB_NAME", "agent_credit_system")
         )
+        # Streaming replicas of base for the dashboard reads, as host or host:port
+        # separated by commas. Same database and credentials unless overridden.
+        self.replicas = []
+        for address in filter(None, (part.strip() for part in os.getenv("DB_REPLICA_HOSTS", "").split(","))):
+            host, _, port = address.partition(":")
+            self.replicas.append(DatabaseConfig(
+                host=host,
+                port=port or self.base.port,
+                user=os.getenv("DB_REPLICA_USER", self.base.user),
+                password=os.getenv("DB_REPLICA_PASSWORD", self.base.password),
+                name=self.base.name
+            ))
 
 class SystemConfig:
+    catalog_cache_ttl: float
+    principal_cache_ttl: float
+    password_hash_workers: int
+    password_hash_max_pending: int
 
     def __init__(self):
-        pass
+        # Seconds before a cached catalog is reloaded even without an invalidation,
+        # covers writes made by other instances
+        self.catalog_cache_ttl = float(os.getenv("CATALOG_CACHE_TTL", 60))
+        # Seconds an authenticated admin is served from memory before admin_user is read again
+        self.principal_cache_ttl = float(os.getenv("PRINCIPAL_CACHE_TTL", 30))
+        # Threads that run bcrypt, and how many hash or verify calls may run or wait
+        # for one before further logins are turned away
+        self.password_hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+        self.password_hash_max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 8))
 
 class Config:
     environment: str
@@ -1,2 +1,7 @@
-from .get_nexi_db import get_nexi_db, SessionLocal, Base
+from .get_nexi_db import get_nexi_db, get_engine, SessionLocal, Base
+from .get_nexi_async_db import get_nexi_async_db, get_async_engine, AsyncSessionLocal
+from .get_nexi_read_db import (
+    get_nexi_read_db, get_read_engine, get_replica_engines, ReadSessionLocal,
+    begin_primary_reads, end_primary_reads
+)
 from .migrations import run_migrations
@@ -0,0 +1,72 @@
+import threading
+from typing import AsyncGenerator
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from libs.core.logs import logger
+from libs.core.configs import config
+from libs.core.metrics import InstrumentedAsyncAdaptedQueuePool, instrument_engine
+
+# Async database connection setup, mirrors get_db_engine on the asyncpg driver
+def get_async_db_engine():
+    db_config = config.db.base
+    db_host = db_config.host
+    db_port = db_config.port
+    db_name = db_config.name
+    db_user = db_config.user
+    db_password = db_config.password
+    logger.info(f"[core/database] async engine for {db_host}:{db_port}/{db_name}")
+    engine = create_async_engine(f'postgresql+asyncpg://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}',
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_logging_name='async',
+        # Same pool sizing as the sync engine, both pools share the server's connection budget
+        pool_size=10,
+        max_overflow=20,
+        pool_recycle=1800,  # 30 minutes
+        pool_pre_ping=True,
+        pool_timeout=30,
+        pool_use_lifo=True,
+        echo=config.environment == 'demo' or config.environment == 'local' or config.environment == 'staging',
+        # asyncpg takes ssl instead of libpq's sslmode
+        connect_args={
+            'ssl': False,
+        })
+    # Events are registered on the sync engine underneath
+    instrument_engine(engine.sync_engine)
+    return engine
+
+# Created on first use, like the sync engine
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+def get_async_engine():
+    """The shared async engine, created on first use"""
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = get_async_db_engine()
+    return _async_engine
+
+class LazyAsyncSessionMaker(async_sessionmaker):
+    """An async_sessionmaker that binds to the shared async engine when the first session is made"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+AsyncSessionLocal = LazyAsyncSessionMaker(
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+)
+
+async def get_nexi_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except OperationalError as e:
+            # Log the error and rollback if needed
+            logger.error(f"Database operational error: {str(e)}")
+            await db.rollback()
+            raise
@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
 from datetime import datetime
 from typing import Generator
 from sqlalchemy.exc import OperationalError, StatementError
@@ -8,12 +9,13 @@ from sqlalchemy.orm.query import Query as _Query
 from sqlalchemy.orm import Session, declarative_base
 from libs.core.logs import logger
 from libs.core.configs import config
+from libs.core.metrics import InstrumentedQueuePool, instrument_engine
 # Create base class for declarative models
 Base = declarative_base()
 
-# Database connection setup
-def get_db_engine():
-    db_config = config.db.base
+# Database connection setup, the primary unless a replica's config is given
+def get_db_engine(db_config=None, pool_logging_name='sync'):
+    db_config = db_config or config.db.base
     db_host = db_config.host
     db_port = db_config.port
     db_name = db_config.name
@@ -21,6 +23,9 @@ def get_db_engine():
     db_password = db_config.password
     print(f"[core/database] DB_HOST: {db_host}, DB_PORT: {db_port}, DB_NAME: {db_name}, DB_USER: {db_user}")
     engine = create_engine(f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}',
+        # Times checkouts for /api/system/metrics, the name labels this pool there
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=pool_logging_name,
         # Increase pool size for better throughput
         pool_size=10,
         # Limit max overflow to prevent too many connections
@@ -44,19 +49,34 @@ def get_db_engine():
             'keepalives_interval': 10,
             'keepalives_count': 5
         })
-    return engine
+    return instrument_engine(engine)
 
-# Create database tables
-print("--- Creating db engine")
-engine = get_db_engine()
-print("--- Creating db tables")
-Base.metadata.create_all(engine)
+# The engine is created on first use rather than at import, so importing the
+# database package costs no connections. The schema comes from the migrations.
+_engine = None
+_engine_lock = threading.Lock()
 
-SessionLocal: Session = sessionmaker(
+def get_engine():
+    """The shared engine, created on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = get_db_engine()
+    return _engine
+
+class LazySessionMaker(sessionmaker):
+    """A sessionmaker that binds to the shared engine when the first session is made"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+SessionLocal: Session = LazySessionMaker(
     autocommit=False,
     expire_on_commit=False,
     autoflush=False,
-    bind=engine,
 )
 
 # class GenDBInterface:
@@ -0,0 +1,69 @@
+import itertools
+import threading
+from contextvars import ContextVar
+from typing import Generator
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from libs.core.logs import logger
+from libs.core.configs import config
+from .get_nexi_db import get_db_engine, get_engine
+
+# Reads that can be served slightly stale (dashboard lists, searches, history) go to
+# the replicas in config.db.replicas, round robin. Without replicas they share the
+# primary's pool. Either way the transactions are READ ONLY, so a handler that
+# writes through a read session fails in development the way it would on a replica.
+_replica_engines = None
+_primary_read_engine = None
+_replica_engines_lock = threading.Lock()
+_next_replica = itertools.count()
+
+# Set for the current request when its client wrote recently and has to read its own writes
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+def get_replica_engines():
+    """One engine per configured replica, created on first use"""
+    global _replica_engines, _primary_read_engine
+    if _replica_engines is None:
+        with _replica_engines_lock:
+            if _replica_engines is None:
+                # Shares the primary's pool, only the transactions differ
+                _primary_read_engine = get_engine().execution_options(postgresql_readonly=True)
+                _replica_engines = [
+                    get_db_engine(replica, pool_logging_name=f'replica{index}').execution_options(postgresql_readonly=True)
+                    for index, replica in enumerate(config.db.replicas)
+                ]
+    return _replica_engines
+
+def get_read_engine():
+    """The engine for a read-only session: the next replica, or the primary when reads must see its latest writes"""
+    replicas = get_replica_engines()
+    if not replicas or _primary_reads.get():
+        return _primary_read_engine
+    return replicas[next(_next_replica) % len(replicas)]
+
+def begin_primary_reads():
+    """Route the read sessions of the current context to the primary, returns the token for end_primary_reads"""
+    return _primary_reads.set(True)
+
+def end_primary_reads(token):
+    _primary_reads.reset(token)
+
+ReadSessionLocal: Session = sessionmaker(
+    autocommit=False,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
+def get_nexi_read_db() -> Generator:
+    db = ReadSessionLocal(bind=get_read_engine())
+    try:
+        yield db
+    except OperationalError as e:
+        logger.error(f"Database operational error on a read session: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def create_nexi_read_db_session():
+    return ReadSessionLocal(bind=get_read_engine())
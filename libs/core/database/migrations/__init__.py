@@ -1 +1 @@
-from .run_migrations import run_migrations
\ No newline at end of file
+from .run_migrations import run_migrations, MigrationChecksumError
@@ -1,68 +1,167 @@
+import hashlib
 import os
 
+# First line of a migration that runs outside a transaction, statement by statement, e.g.
+# to commit a backfill per chunk or to build an index CONCURRENTLY. Each statement has to
+# be safe to run again, a failure leaves the ones before it applied.
+NO_TRANSACTION = "-- migration: no-transaction"
+
+class MigrationChecksumError(Exception):
+    """Raised when an applied migration file was changed after it was applied"""
+    pass
+
+def _migration_files(migration_dir):
+    """Every migration file name with the sha256 of its contents, in apply order"""
+    migration_files = sorted([f for f in os.listdir(migration_dir)
+                            if f.endswith('.sql') and f != 'schema.sql'])
+    checksums = {}
+    for migration_file in migration_files:
+        with open(os.path.join(migration_dir, migration_file), 'rb') as f:
+            checksums[migration_file] = hashlib.sha256(f.read()).hexdigest()
+    return checksums
+
+def _applied_migrations(conn):
+    """Applied migration names with their checksum, in one query"""
+    from sqlalchemy import text
+    return dict(conn.execute(text("SELECT name, checksum FROM migrations")).all())
+
+def _verify_checksums(checksums, applied):
+    changed = [name for name, checksum in applied.items()
+               if checksum is not None and name in checksums and checksums[name] != checksum]
+    if changed:
+        raise MigrationChecksumError(f"Applied migrations changed on disk: {', '.join(sorted(changed))}")
+
+def _split_statements(migration_sql):
+    """
+    The statements of a migration, in order. A statement ends with a semicolon at the
+    end of a line, outside the $$ quoted bodies of functions and DO blocks.
+    """
+    statements = []
+    lines = []
+    quoted = False
+    for line in migration_sql.splitlines():
+        lines.append(line)
+        code = line.strip()
+        if code.startswith("--"):
+            continue
+        if code.count("$$") % 2:
+            quoted = not quoted
+        if not quoted and code.endswith(";"):
+            statements.append("\n".join(lines))
+            lines = []
+    statements.append("\n".join(lines))
+    # Drop what is only comments, e.g. after the last statement
+    return [statement.strip() for statement in statements
+            if any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines())]
+
+def _apply_without_transaction(conn, migration_sql):
+    from sqlalchemy import text
+
+    conn.commit()
+    conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        for statement in _split_statements(migration_sql):
+            conn.execute(text(statement))
+    finally:
+        # Ends SQLAlchemy's transaction object, the database has nothing left to commit
+        conn.rollback()
+        conn.execution_options(isolation_level=conn.default_isolation_level)
+
 def run_migrations():
     """
     Run database migrations.
+
+    Instances that find nothing pending return after a single query. Otherwise the
+    migrations are applied under a Postgres advisory lock, so instances booting at
+    the same time apply each file once. Applied files are checked against the sha256
+    recorded when they were applied.
     """
-    from sqlalchemy import create_engine, text
-    from libs.core.database.get_nexi_db import get_db_engine
+    from sqlalchemy import text
+    from sqlalchemy.exc import ProgrammingError
+    from libs.core.database.get_nexi_db import get_engine
     from libs.core.logs import logger
     import dotenv
     dotenv.load_dotenv()
 
     try:
-        # Get database engine
+        # Get the shared database engine, the app reuses its pool afterwards
         print("DB_HOST", os.environ['DB_HOST'])
-        engine = get_db_engine()
+        engine = get_engine()
+
+        migration_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+        checksums = _migration_files(migration_dir)
 
-        # Create migrations table if it doesn't exist
         with engine.connect() as conn:
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS migrations (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                -- ALTER TABLE migrations RENAME COLUMN filename TO name;
-                -- ALTER TABLE migrations RENAME COLUMN applied_at TO timestamp;
-            """))
+            # Fast path, no lock: everything applied and recorded with a checksum
+            try:
+                applied = _applied_migrations(conn)
+                conn.commit()
+            except ProgrammingError:
+                # No migrations table, or one from before checksums were recorded
+                conn.rollback()
+                applied = None
+
+            if applied is not None:
+                _verify_checksums(checksums, applied)
+                if all(applied.get(name) for name in checksums):
+                    logger.info(f"Database migrations up to date ({len(checksums)} applied)")
+                    return
+
+            # Session level lock, held across the per migration transactions below
+            conn.execute(text("SELECT pg_advisory_lock(hashtext('run_migrations'))"))
             conn.commit()
+            try:
+                # Create migrations table if it doesn't exist
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS migrations (
+                        id SERIAL PRIMARY KEY,
+                        name VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                    ALTER TABLE migrations ADD COLUMN IF NOT EXISTS checksum VARCHAR(64);
+                """))
+                conn.commit()
 
-        # Get list of migration files
-        migration_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
-        # print(f"Migration directory: {migration_dir}")
-        migration_files = sorted([f for f in os.listdir(migration_dir)
-                                if f.endswith('.sql') and f != 'schema.sql'])
+                # Another instance may have applied them while we waited for the lock
+                applied = _applied_migrations(conn)
+                _verify_checksums(checksums, applied)
 
-        print(f"Running migrations from {migration_files}")
-        # Execute each migration file
-        with engine.connect() as conn:
-            for migration_file in migration_files:
-                # Check if migration was already applied
-                result = conn.execute(
-                    text("SELECT id FROM migrations WHERE name = :name"),
-                    {"name": migration_file}
-                )
-                if result.fetchone() is None:
+                # Files applied before checksums were recorded are trusted as they are now
+                unrecorded = [name for name in checksums if name in applied and applied[name] is None]
+                for migration_file in unrecorded:
+                    conn.execute(
+                        text("UPDATE migrations SET checksum = :checksum WHERE name = :name AND checksum IS NULL"),
+                        {"name": migration_file, "checksum": checksums[migration_file]}
+                    )
+                conn.commit()
+
+                pending = [name for name in checksums if name not in applied]
+                print(f"Running migrations {pending}")
+                for migration_file in pending:
                     # Read and execute migration
                     with open(os.path.join(migration_dir, migration_file)) as f:
                         migration_sql = f.read()
-                        try:
+                    try:
+                        if migration_sql.startswith(NO_TRANSACTION):
+                            _apply_without_transaction(conn, migration_sql)
+                        else:
                             conn.execute(text(migration_sql))
 
-                            # Record migration
-                            conn.execute(
-                                text("INSERT INTO migrations (name) VALUES (:name)"),
-                                {"name": migration_file}
-                            )
-                            conn.commit()
-                            logger.info(f"Applied migration: {migration_file}")
-                        except Exception as e:
-                            conn.rollback()
-                            logger.error(f"Error applying migration: {str(e)}")
-                            raise e
-                else:
-                    logger.info(f"Skipping migration: {migration_file} (already applied)")
+                        # Record migration
+                        conn.execute(
+                            text("INSERT INTO migrations (name, checksum) VALUES (:name, :checksum)"),
+                            {"name": migration_file, "checksum": checksums[migration_file]}
+                        )
+                        conn.commit()
+                        logger.info(f"Applied migration: {migration_file}")
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error(f"Error applying migration: {str(e)}")
+                        raise e
+            finally:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext('run_migrations'))"))
+                conn.commit()
 
         logger.info("Database migrations completed successfully")
 
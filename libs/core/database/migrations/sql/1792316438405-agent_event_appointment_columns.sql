@@ -0,0 +1,63 @@
+-- migration: no-transaction
+-- Promote the appointment and refund linkage out of event_data into indexed columns,
+-- so refund lookups no longer scan agent_event on JSONB text expressions.
+--
+-- Applied outside a transaction: the backfill commits chunk by chunk, so no row stays
+-- locked longer than its own chunk, and the indexes are built CONCURRENTLY, without
+-- blocking writes to the ledger. Every statement is safe to run again after a failure.
+ALTER TABLE agent_event ADD COLUMN IF NOT EXISTS appointment_id VARCHAR(255);
+ALTER TABLE agent_event ADD COLUMN IF NOT EXISTS refund_event_id VARCHAR(26);
+
+-- Backfill appointment_id in id-ordered chunks, each committed before the next one
+DO $$
+DECLARE
+  batch_size CONSTANT INTEGER := 10000;
+  last_id VARCHAR(26) := '';
+  chunk_end VARCHAR(26);
+BEGIN
+  LOOP
+    SELECT max(id) INTO chunk_end
+    FROM (SELECT id FROM agent_event WHERE id > last_id ORDER BY id LIMIT batch_size) chunk;
+    EXIT WHEN chunk_end IS NULL;
+
+    UPDATE agent_event
+    SET appointment_id = event_data->>'appointment_id'
+    WHERE id > last_id AND id <= chunk_end
+      AND appointment_id IS NULL
+      AND event_data ? 'appointment_id';
+
+    last_id := chunk_end;
+    COMMIT;
+  END LOOP;
+END $$;
+
+-- Backfill refund_event_id. Refunds are a small share of the ledger, so one pass is enough,
+-- and it only locks the refund rows, until it commits on its own.
+-- Only the earliest refund of each charge is linked, older data may hold a duplicate refund
+-- from before writes were atomic and the unique index below must still build.
+UPDATE agent_event e
+SET refund_event_id = first_refund.refund_event_id
+FROM (
+  SELECT DISTINCT ON (event_data->>'refund_event_id') id, event_data->>'refund_event_id' AS refund_event_id
+  FROM agent_event
+  WHERE event_data->>'type' = 'refund' AND event_data ? 'refund_event_id'
+  ORDER BY event_data->>'refund_event_id', id
+) first_refund
+WHERE e.id = first_refund.id AND e.refund_event_id IS NULL;
+
+-- A concurrent build that failed leaves an invalid index behind, which IF NOT EXISTS would keep
+DO $$
+DECLARE
+  index_name TEXT;
+BEGIN
+  FOREACH index_name IN ARRAY ARRAY['idx_agent_event_appointment_id', 'idx_agent_event_refund_event_id'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(index_name) AND NOT indisvalid) THEN
+      EXECUTE format('DROP INDEX %I', index_name);
+    END IF;
+  END LOOP;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_agent_event_appointment_id ON agent_event (appointment_id) WHERE appointment_id IS NOT NULL;
+
+-- A charge can be refunded at most once
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_agent_event_refund_event_id ON agent_event (refund_event_id) WHERE refund_event_id IS NOT NULL;
@@ -0,0 +1,10 @@
+-- Composite indexes matching the (timestamp DESC, id DESC) keyset order used by the
+-- event listings, so a cursor page is an index range scan at any depth.
+CREATE INDEX IF NOT EXISTS idx_agent_event_timestamp_id ON agent_event (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_agent_event_type_timestamp_id ON agent_event (event_type, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_agent_event_target_timestamp_id ON agent_event (target_id, timestamp DESC, id DESC);
+
+-- The single-column indexes are prefixes of the composite ones above
+DROP INDEX IF EXISTS idx_agent_event_timestamp;
+DROP INDEX IF EXISTS idx_agent_event_event_type;
+DROP INDEX IF EXISTS idx_agent_event_target_id;
@@ -0,0 +1,82 @@
+-- Incrementally maintained row counts for the list endpoints.
+-- Statement-level triggers append one delta row per (scope, key) touched by a statement,
+-- so concurrent writers never contend on a shared counter row. A total is the sum of its
+-- deltas; compact_row_count() folds them back into one row per (scope, key).
+CREATE TABLE IF NOT EXISTS row_count (
+    id BIGSERIAL PRIMARY KEY,
+    scope VARCHAR(64) NOT NULL,
+    key VARCHAR(255) NOT NULL DEFAULT '',
+    delta BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_row_count_scope_key ON row_count (scope, key) INCLUDE (delta);
+
+CREATE OR REPLACE FUNCTION compact_row_count()
+RETURNS VOID AS $$
+BEGIN
+  WITH folded AS (
+    DELETE FROM row_count RETURNING scope, key, delta
+  )
+  INSERT INTO row_count (scope, key, delta)
+  SELECT scope, key, sum(delta) FROM folded GROUP BY scope, key HAVING sum(delta) <> 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Whole-table counters, used by agent_user, consumable and purchasable
+CREATE OR REPLACE FUNCTION row_count_table()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO row_count (scope, delta) SELECT TG_TABLE_NAME, count(*) FROM changed_rows HAVING count(*) > 0;
+  ELSE
+    INSERT INTO row_count (scope, delta) SELECT TG_TABLE_NAME, -count(*) FROM changed_rows HAVING count(*) > 0;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- agent_event also keeps counters per event_type and per target_id
+CREATE OR REPLACE FUNCTION row_count_agent_event()
+RETURNS TRIGGER AS $$
+DECLARE
+  direction INTEGER := CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+  INSERT INTO row_count (scope, key, delta)
+  SELECT 'agent_event', '', direction * count(*) FROM changed_rows HAVING count(*) > 0
+  UNION ALL
+  SELECT 'agent_event.event_type', event_type, direction * count(*) FROM changed_rows GROUP BY event_type
+  UNION ALL
+  SELECT 'agent_event.target_id', target_id, direction * count(*) FROM changed_rows GROUP BY target_id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS row_count_insert ON agent_user;
+DROP TRIGGER IF EXISTS row_count_delete ON agent_user;
+CREATE TRIGGER row_count_insert AFTER INSERT ON agent_user REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+CREATE TRIGGER row_count_delete AFTER DELETE ON agent_user REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+
+DROP TRIGGER IF EXISTS row_count_insert ON consumable;
+DROP TRIGGER IF EXISTS row_count_delete ON consumable;
+CREATE TRIGGER row_count_insert AFTER INSERT ON consumable REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+CREATE TRIGGER row_count_delete AFTER DELETE ON consumable REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+
+DROP TRIGGER IF EXISTS row_count_insert ON purchasable;
+DROP TRIGGER IF EXISTS row_count_delete ON purchasable;
+CREATE TRIGGER row_count_insert AFTER INSERT ON purchasable REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+CREATE TRIGGER row_count_delete AFTER DELETE ON purchasable REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_table();
+
+DROP TRIGGER IF EXISTS row_count_insert ON agent_event;
+DROP TRIGGER IF EXISTS row_count_delete ON agent_event;
+CREATE TRIGGER row_count_insert AFTER INSERT ON agent_event REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_agent_event();
+CREATE TRIGGER row_count_delete AFTER DELETE ON agent_event REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_agent_event();
+
+-- Seed the counters from the current data. The triggers above hold a lock on each
+-- table until this migration commits, so no write can slip between seed and trigger.
+DELETE FROM row_count;
+INSERT INTO row_count (scope, delta) SELECT 'agent_user', count(*) FROM agent_user;
+INSERT INTO row_count (scope, delta) SELECT 'consumable', count(*) FROM consumable;
+INSERT INTO row_count (scope, delta) SELECT 'purchasable', count(*) FROM purchasable;
+INSERT INTO row_count (scope, delta) SELECT 'agent_event', count(*) FROM agent_event;
+INSERT INTO row_count (scope, key, delta) SELECT 'agent_event.event_type', event_type, count(*) FROM agent_event GROUP BY event_type;
+INSERT INTO row_count (scope, key, delta) SELECT 'agent_event.target_id', target_id, count(*) FROM agent_event GROUP BY target_id;
@@ -0,0 +1,128 @@
+-- Convert agent_event to native range partitioning by month on timestamp.
+--
+-- The existing table is not copied. It is attached as agent_event_p_legacy, covering
+-- everything before the first monthly partition, so the conversion costs one validation
+-- scan and a primary key rebuild instead of rewriting the ledger. New rows land in monthly
+-- partitions created by create_agent_event_partitions(), which the partition maintenance
+-- job (libs/core/database/partitions.py) keeps ahead of time.
+
+-- Partitioned tables cannot enforce uniqueness without the partition key, so the
+-- "a charge is refunded at most once" rule moves to its own table, keyed by the charge.
+CREATE TABLE IF NOT EXISTS agent_event_refund (
+    charge_event_id VARCHAR(26) PRIMARY KEY,
+    refund_event_id VARCHAR(26) NOT NULL
+);
+
+INSERT INTO agent_event_refund (charge_event_id, refund_event_id)
+SELECT refund_event_id, id FROM agent_event WHERE refund_event_id IS NOT NULL
+ON CONFLICT (charge_event_id) DO NOTHING;
+
+-- Move the old table and everything attached to it out of the way
+ALTER TABLE agent_event RENAME TO agent_event_p_legacy;
+ALTER INDEX IF EXISTS idx_agent_event_timestamp_id RENAME TO idx_agent_event_p_legacy_timestamp_id;
+ALTER INDEX IF EXISTS idx_agent_event_type_timestamp_id RENAME TO idx_agent_event_p_legacy_type_timestamp_id;
+ALTER INDEX IF EXISTS idx_agent_event_target_timestamp_id RENAME TO idx_agent_event_p_legacy_target_timestamp_id;
+ALTER INDEX IF EXISTS idx_agent_event_appointment_id RENAME TO idx_agent_event_p_legacy_appointment_id;
+DROP INDEX IF EXISTS idx_agent_event_refund_event_id;
+DROP TRIGGER IF EXISTS set_created_by_username ON agent_event_p_legacy;
+DROP TRIGGER IF EXISTS row_count_insert ON agent_event_p_legacy;
+DROP TRIGGER IF EXISTS row_count_delete ON agent_event_p_legacy;
+
+-- The partition key has to be part of the primary key
+ALTER TABLE agent_event_p_legacy DROP CONSTRAINT agent_event_pkey;
+ALTER TABLE agent_event_p_legacy ADD CONSTRAINT agent_event_p_legacy_pkey PRIMARY KEY (id, timestamp);
+
+CREATE TABLE agent_event (
+    id VARCHAR(26) NOT NULL,
+    event_type VARCHAR NOT NULL,
+    target_id VARCHAR(36) NOT NULL REFERENCES agent_user(id) ON DELETE CASCADE,
+    event_data JSONB NOT NULL,
+    description TEXT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_by VARCHAR(36) DEFAULT NULL REFERENCES admin_user(id),
+    created_by_username VARCHAR(255),
+    appointment_id VARCHAR(255),
+    refund_event_id VARCHAR(26),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Same definitions as the legacy indexes, so attaching reuses them instead of rebuilding
+CREATE INDEX idx_agent_event_timestamp_id ON agent_event (timestamp DESC, id DESC);
+CREATE INDEX idx_agent_event_type_timestamp_id ON agent_event (event_type, timestamp DESC, id DESC);
+CREATE INDEX idx_agent_event_target_timestamp_id ON agent_event (target_id, timestamp DESC, id DESC);
+CREATE INDEX idx_agent_event_appointment_id ON agent_event (appointment_id) WHERE appointment_id IS NOT NULL;
+CREATE INDEX idx_agent_event_refund_event_id ON agent_event (refund_event_id) WHERE refund_event_id IS NOT NULL;
+
+-- Everything up to the start of next month stays in the legacy partition
+DO $$
+BEGIN
+  EXECUTE format(
+    'ALTER TABLE agent_event ATTACH PARTITION agent_event_p_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+    date_trunc('month', now()) + interval '1 month'
+  );
+END $$;
+
+-- Catches rows outside every monthly partition, e.g. if the maintenance job stopped running
+CREATE TABLE agent_event_p_default PARTITION OF agent_event DEFAULT;
+
+-- Creates the monthly partitions from next month up to months_ahead months from now.
+-- Rows that already landed in the default partition for a new month are moved into it.
+CREATE OR REPLACE FUNCTION create_agent_event_partitions(months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start TIMESTAMP;
+  partition_name TEXT;
+  created INTEGER := 0;
+BEGIN
+  -- Serialize concurrent callers, e.g. several instances booting at once
+  PERFORM pg_advisory_xact_lock(hashtext('create_agent_event_partitions'));
+
+  FOR i IN 1..months_ahead LOOP
+    month_start := date_trunc('month', now()) + make_interval(months => i);
+    partition_name := 'agent_event_p' || to_char(month_start, 'YYYYMM');
+
+    CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+    EXECUTE format('CREATE TABLE %I (LIKE agent_event INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+      'WITH moved AS (DELETE FROM agent_event_p_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+      month_start, month_start + interval '1 month', partition_name
+    );
+    EXECUTE format(
+      'ALTER TABLE agent_event ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+      partition_name, month_start, month_start + interval '1 month'
+    );
+    created := created + 1;
+  END LOOP;
+
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_agent_event_partitions(3);
+
+-- Triggers on the partitioned table, cloned onto every partition
+CREATE TRIGGER set_created_by_username
+BEFORE INSERT OR UPDATE ON agent_event
+FOR EACH ROW
+WHEN (NEW.created_by IS NOT NULL)
+EXECUTE FUNCTION update_created_by_username();
+
+CREATE TRIGGER row_count_insert AFTER INSERT ON agent_event REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_agent_event();
+CREATE TRIGGER row_count_delete AFTER DELETE ON agent_event REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION row_count_agent_event();
+
+CREATE OR REPLACE FUNCTION track_agent_event_refund()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    -- Raises unique_violation when the charge already has a refund
+    INSERT INTO agent_event_refund (charge_event_id, refund_event_id) VALUES (NEW.refund_event_id, NEW.id);
+  ELSE
+    DELETE FROM agent_event_refund WHERE charge_event_id = OLD.refund_event_id AND refund_event_id = OLD.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER track_refund_insert AFTER INSERT ON agent_event FOR EACH ROW WHEN (NEW.refund_event_id IS NOT NULL) EXECUTE FUNCTION track_agent_event_refund();
+CREATE TRIGGER track_refund_delete AFTER DELETE ON agent_event FOR EACH ROW WHEN (OLD.refund_event_id IS NOT NULL) EXECUTE FUNCTION track_agent_event_refund();
@@ -0,0 +1,12 @@
+-- Ledger balance of each agent user up to a position in agent_event, written by the
+-- reconciliation job so later runs only replay the events after it.
+-- balance is the sum of the event amounts, not agent_user.credit, so a snapshot never
+-- hides drift between the two.
+CREATE TABLE IF NOT EXISTS agent_balance_snapshot (
+    user_id VARCHAR(36) PRIMARY KEY REFERENCES agent_user(id) ON DELETE CASCADE,
+    balance NUMERIC(18, 2) NOT NULL,
+    event_timestamp TIMESTAMP NOT NULL,
+    event_id VARCHAR(26) NOT NULL,
+    event_count BIGINT NOT NULL DEFAULT 0,
+    taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
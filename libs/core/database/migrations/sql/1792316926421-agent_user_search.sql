@@ -0,0 +1,31 @@
+-- Indexes for the agent user search box, which searches mobile, name and email by substring.
+
+DO $$
+BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION
+  WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm extension already exists or could not be created';
+END $$;
+
+-- Trigram indexes serve ILIKE '%term%' for terms of 3 or more characters.
+-- Without pg_trgm the search still works, it just scans agent_user.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+    CREATE INDEX IF NOT EXISTS agent_user_mobile_trgm_idx ON agent_user USING gin (mobile gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS agent_user_name_trgm_idx ON agent_user USING gin (name gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS agent_user_email_trgm_idx ON agent_user USING gin (email gin_trgm_ops);
+  ELSE
+    RAISE NOTICE 'pg_trgm is not available, skipping the agent_user trigram indexes';
+  END IF;
+END $$;
+
+-- Mobile numbers reduced to their digits, so "+852 9123-4567" and "85291234567" both
+-- prefix-match a search for "852 9123"
+ALTER TABLE agent_user ADD COLUMN IF NOT EXISTS mobile_digits VARCHAR(20)
+  GENERATED ALWAYS AS (regexp_replace(mobile, '[^0-9]', '', 'g')) STORED;
+CREATE INDEX IF NOT EXISTS agent_user_mobile_digits_idx ON agent_user (mobile_digits text_pattern_ops);
+
+-- Search results are ordered by credit, a broad term can then walk this index and stop at the page limit
+CREATE INDEX IF NOT EXISTS agent_user_credit_idx ON agent_user (credit DESC, id);
@@ -0,0 +1,35 @@
+-- Daily rollups of agent_event for the analytics endpoints, maintained incrementally by
+-- libs/core/analytics/event_rollup.py from the position stored in event_rollup_position.
+--
+-- Each event is counted in three dimensions of the same table:
+--   total  key ''                  per day and event type
+--   user   key agent user id       per day, event type and agent user
+--   item   key consumable or purchasable name, per day and event type
+-- Refunds are attributed to the consumable of the charge they refund.
+CREATE TABLE IF NOT EXISTS agent_event_daily (
+    dimension VARCHAR(10) NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    events BIGINT NOT NULL DEFAULT 0,
+    -- Debits, positive numbers
+    credits_spent NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    credits_purchased NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    refunds BIGINT NOT NULL DEFAULT 0,
+    credits_refunded NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, key, day, event_type)
+);
+
+-- The summary reads whole days of one dimension, whatever the key
+CREATE INDEX IF NOT EXISTS idx_agent_event_daily_dimension_day ON agent_event_daily (dimension, day, event_type);
+
+-- The (timestamp, id) of the last event folded into a rollup, NULL before the first run
+CREATE TABLE IF NOT EXISTS event_rollup_position (
+    name VARCHAR(50) PRIMARY KEY,
+    event_timestamp TIMESTAMP,
+    event_id VARCHAR(26),
+    events BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO event_rollup_position (name) VALUES ('agent_event_daily') ON CONFLICT (name) DO NOTHING;
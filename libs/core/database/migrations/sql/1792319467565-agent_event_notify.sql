@@ -0,0 +1,27 @@
+-- Pushes every committed agent_event row to LISTEN agent_event, for the dashboards'
+-- live event stream (apps/agent-credit-system/app/services/event_stream.py).
+-- Notifications are delivered at commit, in commit order, and never for a rolled back
+-- write. A payload is the row as JSON; one that would not fit the 8000 byte limit of
+-- NOTIFY is replaced by its id, timestamp, target_id and event_type, flagged truncated,
+-- and the listener reads the row itself.
+CREATE OR REPLACE FUNCTION notify_agent_event()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('agent_event', CASE
+    WHEN octet_length(payload) < 7900 THEN payload
+    ELSE CAST(json_build_object(
+      'id', id, 'timestamp', timestamp, 'target_id', target_id, 'event_type', event_type, 'truncated', true
+    ) AS TEXT)
+  END)
+  FROM (
+    SELECT id, timestamp, target_id, event_type, CAST(row_to_json(changed_rows) AS TEXT) AS payload
+    FROM changed_rows
+    ORDER BY timestamp, id
+  ) AS notifications;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One statement-level trigger on the partitioned table, so a bulk insert runs it once
+DROP TRIGGER IF EXISTS notify_agent_event_insert ON agent_event;
+CREATE TRIGGER notify_agent_event_insert AFTER INSERT ON agent_event REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_agent_event();
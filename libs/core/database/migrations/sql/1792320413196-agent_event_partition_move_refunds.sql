@@ -0,0 +1,48 @@
+-- Moving rows out of the default partition deletes them from it, and track_refund_delete
+-- (cloned onto agent_event_p_default) deletes the agent_event_refund row of every refund
+-- moved. The INSERT into the new, not yet attached, partition fires no trigger, so the
+-- charges of those refunds could be refunded again. The guard rows are now put back by a
+-- second statement: the trigger's deletes only run at the end of the moving statement,
+-- so re-inserting them within it would be undone.
+CREATE OR REPLACE FUNCTION create_agent_event_partitions(months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start TIMESTAMP;
+  partition_name TEXT;
+  created INTEGER := 0;
+BEGIN
+  -- Serialize concurrent callers, e.g. several instances booting at once
+  PERFORM pg_advisory_xact_lock(hashtext('create_agent_event_partitions'));
+
+  FOR i IN 1..months_ahead LOOP
+    month_start := date_trunc('month', now()) + make_interval(months => i);
+    partition_name := 'agent_event_p' || to_char(month_start, 'YYYYMM');
+
+    CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+    EXECUTE format('CREATE TABLE %I (LIKE agent_event INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+      'WITH moved AS (DELETE FROM agent_event_p_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+      month_start, month_start + interval '1 month', partition_name
+    );
+    -- Uncommitted until the function's transaction commits, so a concurrent refund of one
+    -- of these charges waits on the deleted guard row and then conflicts with this one
+    EXECUTE format(
+      'INSERT INTO agent_event_refund (charge_event_id, refund_event_id) SELECT refund_event_id, id FROM %I WHERE refund_event_id IS NOT NULL ON CONFLICT (charge_event_id) DO NOTHING',
+      partition_name
+    );
+    EXECUTE format(
+      'ALTER TABLE agent_event ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+      partition_name, month_start, month_start + interval '1 month'
+    );
+    created := created + 1;
+  END LOOP;
+
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Guard rows already lost by an earlier move
+INSERT INTO agent_event_refund (charge_event_id, refund_event_id)
+SELECT refund_event_id, id FROM agent_event WHERE refund_event_id IS NOT NULL
+ON CONFLICT (charge_event_id) DO NOTHING;
@@ -0,0 +1,52 @@
+-- Every agent user's ledger starts from 0: credit given at creation is recorded as an
+-- agent_credit event of type "opening", so reconciliation replays each user from 0 and
+-- drift before a user's first event is no longer taken for a starting balance.
+
+-- A ULID for events written by SQL, the format the app gives event ids: 10 characters
+-- of milliseconds since the epoch, then 16 random ones, in Crockford's base32
+CREATE OR REPLACE FUNCTION generate_ulid(at TIMESTAMPTZ DEFAULT clock_timestamp())
+RETURNS VARCHAR(26) AS $$
+DECLARE
+  alphabet CONSTANT TEXT := '0123456789ABCDEFGHJKMNPQRSTVWXYZ';
+  ms BIGINT := CAST(floor(extract(epoch FROM at) * 1000) AS BIGINT);
+  result TEXT := '';
+BEGIN
+  FOR i IN REVERSE 9..0 LOOP
+    result := result || substr(alphabet, CAST((ms >> (5 * i)) & 31 AS INTEGER) + 1, 1);
+  END LOOP;
+  FOR i IN 1..16 LOOP
+    result := result || substr(alphabet, CAST(floor(random() * 32) AS INTEGER) + 1, 1);
+  END LOOP;
+  RETURN result;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+-- Opening events of the existing users, just before their first event. The balance is
+-- the previous_balance of that event, or the current credit of a user without events:
+-- the best record there is, drift before a user's first event cannot be told apart now.
+-- They are older than the analytics rollup position, so the daily rollups skip them.
+WITH first_event AS (
+  SELECT DISTINCT ON (target_id) target_id, timestamp, event_data->>'previous_balance' AS previous_balance
+  FROM agent_event
+  WHERE event_type = 'agent_credit'
+  ORDER BY target_id, timestamp, id
+),
+opening AS (
+  SELECT u.id AS user_id,
+         CASE WHEN f.target_id IS NULL THEN u.credit
+              ELSE CAST(coalesce(f.previous_balance, '0') AS NUMERIC(18, 2)) END AS balance,
+         coalesce(f.timestamp - interval '1 millisecond', u.created_at, LOCALTIMESTAMP) AS timestamp
+  FROM agent_user u
+  LEFT JOIN first_event f ON f.target_id = u.id
+  WHERE NOT EXISTS (
+    SELECT 1 FROM agent_event e
+    WHERE e.target_id = u.id AND e.event_type = 'agent_credit' AND e.event_data->>'type' = 'opening'
+  )
+)
+INSERT INTO agent_event (id, event_type, target_id, event_data, description, timestamp)
+SELECT generate_ulid(timestamp), 'agent_credit', user_id,
+       jsonb_build_object('type', 'opening', 'amount', CAST(balance AS TEXT),
+                          'previous_balance', '0.00', 'new_balance', CAST(balance AS TEXT)),
+       'Opening balance', timestamp
+FROM opening
+WHERE balance <> 0;
@@ -0,0 +1,52 @@
+import os
+import sys
+from sqlalchemy import text
+
+# Months of agent_event partitions kept ready ahead of the current one
+MONTHS_AHEAD = 3
+
+def create_agent_event_partitions(db, months_ahead=MONTHS_AHEAD):
+    """
+    Pre-create the monthly agent_event partitions for the coming months.
+
+    Safe to run concurrently and repeatedly, existing partitions are left alone.
+    Rows that fell into the default partition for a new month are moved into it.
+
+    Args:
+        db (Session): Database session
+        months_ahead (int): Number of months after the current one to cover
+
+    Returns:
+        int: Number of partitions created
+    """
+    created = db.execute(
+        text("SELECT create_agent_event_partitions(:months_ahead)"),
+        {"months_ahead": months_ahead}
+    ).scalar_one()
+    db.commit()
+    return created
+
+def run_partition_maintenance(months_ahead=MONTHS_AHEAD):
+    """
+    Partition maintenance job, run at startup and from a scheduled job so the
+    next month's partition always exists before the first write lands in it.
+    A failure is only logged, writes still succeed through the default partition.
+    """
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+    from libs.core.logs import logger
+
+    session = create_nexi_db_session()
+    try:
+        created = create_agent_event_partitions(session, months_ahead=months_ahead)
+        logger.info(f"agent_event partition maintenance done, {created} partition(s) created")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"agent_event partition maintenance failed: {str(e)}")
+    finally:
+        session.close()
+
+if __name__ == '__main__':
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../')))
+
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else MONTHS_AHEAD
+    run_partition_maintenance(months_ahead=months)
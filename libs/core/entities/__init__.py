@@ -1,6 +1,7 @@
 from .admin_user import AdminUser
 from .agent_user import AgentUser
-from .agent_event import AgentEvent
+from .agent_event import AgentEvent, AgentEventRefund
 from .consumable import Consumable
+from .agent_balance_snapshot import AgentBalanceSnapshot
 
-__all__ = ["AdminUser", "AgentUser", "AgentEvent", "Consumable"]
+__all__ = ["AdminUser", "AgentUser", "AgentEvent", "AgentEventRefund", "Consumable", "AgentBalanceSnapshot"]
@@ -5,6 +5,7 @@ import uuid
 from datetime import datetime
 
 from ..database import Base
+from ..principals import principal_cache, password_hasher
 
 class AdminUser(Base):
     __tablename__ = 'admin_user'
@@ -17,11 +18,11 @@ class AdminUser(Base):
     created_at = Column(DateTime, default=datetime.now)
     last_login = Column(DateTime, nullable=True)
 
-    def __init__(self, username, email, password, id=None, is_active=True):
+    def __init__(self, username, email, password, id=None, is_active=True, password_hash=None):
         self.id = id or str(uuid.uuid4())
         self.username = username
         self.email = email
-        self.password_hash = self.hash_password(password)
+        self.password_hash = password_hash or self.hash_password(password)
         self.is_active = is_active
 
     @staticmethod
@@ -31,6 +32,15 @@ class AdminUser(Base):
     def verify_password(self, password):
         return bcrypt.verify(password, self.password_hash)
 
+    @staticmethod
+    async def hash_password_async(password):
+        """Hash on the password hasher pool, raises PasswordHasherBusy when it is saturated"""
+        return await password_hasher.hash(password)
+
+    async def verify_password_async(self, password):
+        """Verify on the password hasher pool, raises PasswordHasherBusy when it is saturated"""
+        return await password_hasher.verify(password, self.password_hash)
+
     def update_last_login(self):
         self.last_login = datetime.now()
 
@@ -47,11 +57,29 @@ class AdminUser(Base):
         return db.query(AdminUser).filter(AdminUser.id == id).first()
 
     @staticmethod
-    def create_admin(username, email, password, db, is_active=True):
-        admin = AdminUser(username=username, email=email, password=password, is_active=is_active)
+    def create_admin(username, email, password, db, is_active=True, password_hash=None):
+        admin = AdminUser(username=username, email=email, password=password, is_active=is_active, password_hash=password_hash)
         db.add(admin)
         db.commit()
         return admin
 
+    def update_admin(self, email=None, password=None, is_active=None, db=None):
+        if email:
+            self.email = email
+        if password:
+            self.password_hash = self.hash_password(password)
+        if is_active is not None:
+            self.is_active = is_active
+
+        if db:
+            db.commit()
+            # Requests authenticated as this admin must see the change right away
+            principal_cache.invalidate(self.username)
+
+        return self
+
+    def deactivate(self, db=None):
+        return self.update_admin(is_active=False, db=db)
+
     def __repr__(self):
         return f"<AdminUser(id='{self.id}', username='{self.username}', email='{self.email}')>"
\ No newline at end of file
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, DateTime, Numeric, BigInteger, ForeignKey
+from datetime import datetime
+
+from ..database import Base
+
+class AgentBalanceSnapshot(Base):
+    """
+    Ledger balance of an agent user up to the (event_timestamp, event_id) position
+    in agent_event, written by the reconciliation job.
+    """
+    __tablename__ = 'agent_balance_snapshot'
+
+    user_id = Column(String, ForeignKey('agent_user.id', ondelete='CASCADE'), primary_key=True)
+    balance = Column(Numeric(18, 2), nullable=False)
+    event_timestamp = Column(DateTime, nullable=False)
+    event_id = Column(String, nullable=False)
+    event_count = Column(BigInteger, nullable=False, default=0)
+    taken_at = Column(DateTime, default=datetime.now)
+
+    @staticmethod
+    def find_by_user_id(user_id, db):
+        return db.query(AgentBalanceSnapshot).filter(AgentBalanceSnapshot.user_id == user_id).first()
+
+    def __repr__(self):
+        return f"<AgentBalanceSnapshot(user='{self.user_id}', balance='{self.balance}', event='{self.event_id}')>"
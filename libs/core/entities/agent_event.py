@@ -1,6 +1,9 @@
-from sqlalchemy import Column, String, DateTime, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, JSON, Text, ForeignKey, exists, tuple_, select
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
+from decimal import Decimal
+import base64
+import binascii
 import ulid
 
 from ..database import Base
@@ -17,6 +20,9 @@ class AgentEvent(Base):
     created_by = Column(String, ForeignKey('admin_user.id', ondelete='SET NULL'), nullable=True)
     created_by_username = Column(String, nullable=True, info={'readonly': True})
     timestamp = Column(DateTime, default=datetime.now)
+    # Promoted from event_data so refund lookups can use an index
+    appointment_id = Column(String, nullable=True)
+    refund_event_id = Column(String, nullable=True)
 
     def __init__(self, event_type, target_id, event_data, description=None, created_by=None, id=None):
         self.id = id or str(ulid.ulid())
@@ -25,6 +31,8 @@ class AgentEvent(Base):
         self.event_data = event_data
         self.description = description
         self.created_by = created_by
+        self.appointment_id = event_data.get("appointment_id")
+        self.refund_event_id = event_data.get("refund_event_id") if event_data.get("type") == "refund" else None
 
     @staticmethod
     def create_credit_event(target_id, amount, previous_balance, new_balance, consumable_name=None, count=None, purchasable_name=None, appointment_id=None, description=None, created_by=None, db=None):
@@ -59,6 +67,27 @@ class AgentEvent(Base):
 
         return event
 
+    @staticmethod
+    def opening_event(target_id, credit):
+        """
+        The event recording the credit an agent user is created with, so every ledger
+        starts from 0. None when there is no credit to record.
+        """
+        credit = Decimal(str(credit)).quantize(Decimal("0.01"))
+        if not credit:
+            return None
+        return AgentEvent(
+            event_type="agent_credit",
+            target_id=target_id,
+            event_data={
+                "type": "opening",
+                "amount": str(credit),
+                "previous_balance": "0.00",
+                "new_balance": str(credit),
+            },
+            description="Opening balance"
+        )
+
     @staticmethod
     def create_refund_event(target_id, amount, previous_balance, new_balance, refund_event_id, appointment_id=None, description=None, created_by=None, db=None):
         """Create a refund related event for an agent user"""
@@ -89,41 +118,102 @@ class AgentEvent(Base):
 
 
     @staticmethod
-    def get_all_events(db, skip=0, limit=100):
-        return db.query(AgentEvent).order_by(AgentEvent.timestamp.desc())\
-            .offset(skip).limit(limit).all()
+    def encode_cursor(event):
+        """Encode the (timestamp, id) position of an event as an opaque page cursor"""
+        position = f"{event.timestamp.isoformat()}|{event.id}"
+        return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
 
     @staticmethod
-    def get_events_by_type(event_type, db, skip=0, limit=100):
-        return db.query(AgentEvent).filter(AgentEvent.event_type == event_type)\
-            .order_by(AgentEvent.timestamp.desc())\
-            .offset(skip).limit(limit).all()
+    def decode_cursor(cursor):
+        """Decode a page cursor, raises ValueError if it is malformed"""
+        try:
+            position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            timestamp, event_id = position.split("|", 1)
+            return datetime.fromisoformat(timestamp), event_id
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError("Invalid cursor")
 
     @staticmethod
-    def get_target_events(target_id, db, skip=0, limit=100):
-        return db.query(AgentEvent).filter(AgentEvent.target_id == target_id)\
-            .order_by(AgentEvent.timestamp.desc())\
-            .offset(skip).limit(limit).all()
+    def next_cursor(events, limit):
+        """Cursor for the page after events, or None when this was the last page"""
+        if len(events) < limit:
+            return None
+        return AgentEvent.encode_cursor(events[-1])
 
     @staticmethod
-    def find_by_appointment_id(appointment_id, db):
-        event = db.query(AgentEvent).filter(
-            AgentEvent.event_data['appointment_id'].astext.cast(String) == appointment_id,
-            AgentEvent.event_data['type'].astext.cast(String) == 'default'
-        ).first()
+    def time_range(since=None, until=None):
+        """
+        Conditions for events with since <= timestamp < until, either bound optional.
+        agent_event is partitioned by month on timestamp, so a range lets Postgres
+        skip every partition outside it.
+        """
+        conditions = []
+        if since:
+            conditions.append(AgentEvent.timestamp >= since)
+        if until:
+            conditions.append(AgentEvent.timestamp < until)
+        return conditions
 
-        if not event:
-            return None
+    @staticmethod
+    def _page(query, skip, limit, cursor, since=None, until=None):
+        # Newest first. With a cursor the page starts right after the cursor's
+        # (timestamp, id) position on the index, so deep pages cost the same as
+        # the first one; skip is kept for callers that still page by offset.
+        query = query.filter(*AgentEvent.time_range(since, until))
+        query = query.order_by(AgentEvent.timestamp.desc(), AgentEvent.id.desc())
+        if cursor:
+            timestamp, event_id = AgentEvent.decode_cursor(cursor)
+            # The plain timestamp bound is implied by the row comparison, but only it
+            # lets the planner prune the partitions newer than the cursor
+            query = query.filter(
+                AgentEvent.timestamp <= timestamp,
+                tuple_(AgentEvent.timestamp, AgentEvent.id) < tuple_(timestamp, event_id)
+            )
+        else:
+            query = query.offset(skip)
+        return query.limit(limit).all()
 
-        refund_event = db.query(AgentEvent).filter(
-            AgentEvent.event_data['refund_event_id'].astext.cast(String) == event.id,
-            AgentEvent.event_data['type'].astext.cast(String) == 'refund'
-        ).first()
+    @staticmethod
+    def export_query(event_type=None, target_id=None, since=None, until=None):
+        """
+        Every matching event as plain rows, oldest first, for streaming exports.
+        The (timestamp, id) order is served by the same indexes as the pages, read backwards.
+        """
+        conditions = AgentEvent.time_range(since, until)
+        if event_type:
+            conditions.append(AgentEvent.event_type == event_type)
+        if target_id:
+            conditions.append(AgentEvent.target_id == target_id)
+        return (
+            select(
+                AgentEvent.id, AgentEvent.timestamp, AgentEvent.event_type, AgentEvent.target_id,
+                AgentEvent.event_data, AgentEvent.description, AgentEvent.created_by,
+                AgentEvent.created_by_username, AgentEvent.appointment_id, AgentEvent.refund_event_id
+            )
+            .where(*conditions)
+            .order_by(AgentEvent.timestamp, AgentEvent.id)
+        )
 
-        if refund_event:
-            return None
+    @staticmethod
+    def get_all_events(db, skip=0, limit=100, cursor=None, since=None, until=None):
+        return AgentEvent._page(db.query(AgentEvent), skip, limit, cursor, since=since, until=until)
 
-        return event
+    @staticmethod
+    def get_events_by_type(event_type, db, skip=0, limit=100, cursor=None, since=None, until=None):
+        return AgentEvent._page(db.query(AgentEvent).filter(AgentEvent.event_type == event_type), skip, limit, cursor, since=since, until=until)
+
+    @staticmethod
+    def get_target_events(target_id, db, skip=0, limit=100, cursor=None, since=None, until=None):
+        return AgentEvent._page(db.query(AgentEvent).filter(AgentEvent.target_id == target_id), skip, limit, cursor, since=since, until=until)
+
+    @staticmethod
+    def find_by_appointment_id(appointment_id, db):
+        """Find the charge for an appointment that has not been refunded yet"""
+        return db.query(AgentEvent).filter(
+            AgentEvent.appointment_id == appointment_id,
+            AgentEvent.event_data['type'].astext.cast(String) == 'default',
+            ~exists().where(AgentEventRefund.charge_event_id == AgentEvent.id)
+        ).order_by(AgentEvent.id).first()
 
     @staticmethod
     def count_target_events(target_id, db):
@@ -132,3 +222,16 @@ class AgentEvent(Base):
 
     def __repr__(self):
         return f"<AgentEvent(id='{self.id}', type='{self.event_type}', target='{self.target_id}')>"
+
+class AgentEventRefund(Base):
+    """
+    The refund of each refunded charge, one row per charge. Maintained by a trigger
+    on agent_event, its primary key is what stops a charge being refunded twice.
+    """
+    __tablename__ = 'agent_event_refund'
+
+    charge_event_id = Column(String, primary_key=True)
+    refund_event_id = Column(String, nullable=False)
+
+    def __repr__(self):
+        return f"<AgentEventRefund(charge='{self.charge_event_id}', refund='{self.refund_event_id}')>"
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, String, DateTime, Numeric
+from sqlalchemy import Column, String, DateTime, Numeric, Computed, select, or_
 from sqlalchemy.sql import func
+import re
 import uuid
 from datetime import datetime
 
 from ..database import Base
 
+# A search term made only of these looks like a phone number
+_PHONE_TERM = re.compile(r"^[\d\s+\-().]+$")
+
 class AgentUser(Base):
     __tablename__ = 'agent_user'
 
@@ -15,6 +19,8 @@ class AgentUser(Base):
     credit = Column(Numeric(18, 2), nullable=False, default=0.00)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Digits of mobile, maintained by Postgres for prefix search
+    mobile_digits = Column(String, Computed("regexp_replace(mobile, '[^0-9]', '', 'g')", persisted=True))
 
     def __init__(self, mobile, email, name, credit=0.00, id=None):
         self.id = id or str(uuid.uuid4())
@@ -49,13 +55,78 @@ class AgentUser(Base):
     def create_user(mobile, email, name, db, credit=0.00, id=None):
         user = AgentUser(mobile=mobile, email=email, name=name, credit=credit, id=id)
         db.add(user)
+        opening = AgentUser._opening_event(user)
+        if opening is not None:
+            # The event references the user
+            db.flush()
+            db.add(opening)
         db.commit()
         return user
 
+    @staticmethod
+    def _opening_event(user):
+        # Imported here, agent_event imports this module
+        from .agent_event import AgentEvent
+        return AgentEvent.opening_event(user.id, user.credit)
+
+    @staticmethod
+    async def find_by_id_async(id, db):
+        result = await db.execute(select(AgentUser).where(AgentUser.id == id))
+        return result.scalars().first()
+
+    @staticmethod
+    async def find_by_mobile_async(mobile, db):
+        result = await db.execute(select(AgentUser).where(AgentUser.mobile == mobile))
+        return result.scalars().first()
+
+    @staticmethod
+    async def find_by_email_async(email, db):
+        result = await db.execute(select(AgentUser).where(AgentUser.email == email))
+        return result.scalars().first()
+
+    @staticmethod
+    async def create_user_async(mobile, email, name, db, credit=0.00, id=None):
+        user = AgentUser(mobile=mobile, email=email, name=name, credit=credit, id=id)
+        db.add(user)
+        opening = AgentUser._opening_event(user)
+        if opening is not None:
+            await db.flush()
+            db.add(opening)
+        await db.commit()
+        return user
+
     @staticmethod
     def get_all_users(db, skip=0, limit=100):
         return db.query(AgentUser).offset(skip).limit(limit).all()
 
+    @staticmethod
+    def search_filter(search):
+        """
+        Match search as a substring of mobile, name or email, served by the trigram indexes.
+        A term that looks like a phone number also matches as a prefix of the mobile
+        number's digits, so spacing, dashes and the leading + do not matter.
+        """
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        like_search = f"%{escaped}%"
+        conditions = [
+            AgentUser.mobile.ilike(like_search, escape="\\"),
+            AgentUser.name.ilike(like_search, escape="\\"),
+            AgentUser.email.ilike(like_search, escape="\\"),
+        ]
+
+        digits = re.sub(r"\D", "", search)
+        if digits and _PHONE_TERM.match(search):
+            conditions.append(AgentUser.mobile_digits.like(f"{digits}%"))
+
+        return or_(*conditions)
+
+    @staticmethod
+    def search_users(search, db, skip=0, limit=100):
+        """Search agent users by mobile, name or email, highest credit first"""
+        return db.query(AgentUser).filter(AgentUser.search_filter(search)).order_by(
+            AgentUser.credit.desc(), AgentUser.id
+        ).offset(skip).limit(limit).all()
+
     def update_user(self, email=None, name=None, db=None):
         if email:
             self.email = email
@@ -1,12 +1,15 @@
-from sqlalchemy import Column, String, DateTime, Numeric, JSON
+from sqlalchemy import Column, String, DateTime, Numeric, JSON, select
 from sqlalchemy.sql import func
 import uuid
 from decimal import Decimal
 from datetime import datetime
 
 from ..database import Base
-from .agent_user import AgentUser
-from .agent_event import AgentEvent
+from ..catalog import CatalogCache
+# The module rather than its names: the ledger imports these entities, so when it is
+# imported first (python -m libs.core.ledger...) it is only partially initialized here
+from ..ledger import credit_ledger
+
 class Consumable(Base):
     __tablename__ = 'consumable'
 
@@ -35,70 +38,155 @@ class Consumable(Base):
     def find_by_id(id, db):
         return db.query(Consumable).filter(Consumable.id == id).first()
 
+    @staticmethod
+    async def find_by_id_async(id, db):
+        result = await db.execute(select(Consumable).where(Consumable.id == id))
+        return result.scalars().first()
+
+    @staticmethod
+    def find_cached(id, db):
+        """Find a consumable in the catalog cache, returns its to_dict() or None"""
+        return consumable_catalog.get(id, db)
+
+    @staticmethod
+    async def find_cached_async(id, db):
+        return await consumable_catalog.get_async(id, db)
+
+    @staticmethod
+    def get_catalog(db):
+        """Every consumable as to_dict(), ordered by name, from the catalog cache"""
+        return consumable_catalog.list(db)
+
+    @staticmethod
+    async def get_catalog_async(db):
+        return await consumable_catalog.list_async(db)
+
+    @staticmethod
+    def get_catalog_json(db, skip=0, limit=None):
+        """A page of get_catalog() as a JSON array, rendered when cached, and the catalog size"""
+        return consumable_catalog.list_json(db, skip, limit)
+
+    @staticmethod
+    async def get_catalog_json_async(db, skip=0, limit=None):
+        return await consumable_catalog.list_json_async(db, skip, limit)
+
     @staticmethod
     def create_consumable(name, cost, db, meta_data=None, id=None):
         consumable = Consumable(name=name, cost=cost, meta_data=meta_data, id=id)
         db.add(consumable)
         db.commit()
+        consumable_catalog.invalidate()
         return consumable
 
     @staticmethod
     def get_all_consumables(db, skip=0, limit=100):
         return db.query(Consumable).order_by(Consumable.name).offset(skip).limit(limit).all()
 
+    @staticmethod
+    async def get_all_consumables_async(db, skip=0, limit=100):
+        result = await db.execute(select(Consumable).order_by(Consumable.name).offset(skip).limit(limit))
+        return result.scalars().all()
+
+    @staticmethod
+    async def count_consumables_async(db):
+        result = await db.execute(select(func.count()).select_from(Consumable))
+        return result.scalar_one()
+
     @staticmethod
     def apply_consumable(consumable_id, user_id, count, description, current_user, db, appointment_id=None):
         try:
-            consumable = Consumable.find_by_id(consumable_id, db)
+            consumable = Consumable.find_cached(consumable_id, db)
             if not consumable:
                 raise ValueError("Consumable not found")
 
-            user = AgentUser.find_by_id(user_id, db)
-            if not user:
-                raise ValueError("User not found")
-
-            single_amount = Decimal('-' + str(consumable.cost))
+            single_amount = Decimal('-' + str(consumable["cost"]))
             amount = single_amount * count
 
-            previous_balance = user.credit
-            new_balance = previous_balance + amount
-
-            if new_balance < 0:
-                raise ValueError(f"User doesn't have enough credit, current credit: {previous_balance}")
-
-            # Update user credit
-            user.credit = new_balance
-            db.commit()
-
             created_by = current_user.id if current_user else None
-            description = description or f"Applied {count} {consumable.name}" + ("s" if count > 1 else "")
+            description = description or f"Applied {count} {consumable['name']}" + ("s" if count > 1 else "")
 
-            # Create credit event for event sourcing
-            AgentEvent.create_credit_event(
-                target_id=user.id,
+            # Update user credit and create credit event for event sourcing
+            result = credit_ledger.apply_credit_change(
                 amount=amount,
-                previous_balance=previous_balance,
-                new_balance=new_balance,
-                consumable_name=consumable.name,
-                count=count,
+                user_id=user_id,
+                event_data=credit_ledger.build_credit_event_data(
+                    amount,
+                    consumable_name=consumable["name"],
+                    count=count,
+                    appointment_id=appointment_id
+                ),
                 description=description,
-                appointment_id=appointment_id,
                 created_by=created_by,
+                allow_overdraft=False,
                 db=db
             )
 
             return {
                 "success": True,
                 "user": {
-                    "id": user.id,
-                    "name": user.name,
-                    "credit": float(user.credit)
+                    "id": result["user"]["id"],
+                    "name": result["user"]["name"],
+                    "credit": float(result["user"]["credit"])
                 },
             }
         except Exception as e:
             db.rollback()
             raise e
 
+    @staticmethod
+    def apply_consumables(items, current_user, db):
+        """
+        Apply a batch of consumables in one transaction.
+
+        Each item is a dict with consumable_id, user_id, count and optionally
+        appointment_id and description. Items that fail are reported in the
+        result list and do not stop the others.
+        """
+        created_by = current_user.id if current_user else None
+
+        entries = []
+        positions = []
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            consumable = Consumable.find_cached(item["consumable_id"], db)
+            if not consumable:
+                results[index] = {"success": False, "message": "Consumable not found"}
+                continue
+
+            count = item["count"]
+            amount = Decimal('-' + str(consumable["cost"])) * count
+            description = item.get("description") or f"Applied {count} {consumable['name']}" + ("s" if count > 1 else "")
+            entries.append({
+                "user_id": item["user_id"],
+                "amount": amount,
+                "event_data": credit_ledger.build_credit_event_data(
+                    amount,
+                    consumable_name=consumable["name"],
+                    count=count,
+                    appointment_id=item.get("appointment_id")
+                ),
+                "description": description,
+                "created_by": created_by,
+                "allow_overdraft": False,
+            })
+            positions.append(index)
+
+        for index, result in zip(positions, credit_ledger.apply_credit_changes(entries, db)):
+            results[index] = result
+
+        return results
+
+    @staticmethod
+    async def apply_consumable_async(consumable_id, user_id, count, description, current_user, db, appointment_id=None):
+        # The ledger write is shared with the sync path, run it on the async connection
+        return await db.run_sync(
+            lambda session: Consumable.apply_consumable(consumable_id, user_id, count, description, current_user, session, appointment_id=appointment_id)
+        )
+
+    @staticmethod
+    async def apply_consumables_async(items, current_user, db):
+        return await db.run_sync(lambda session: Consumable.apply_consumables(items, current_user, session))
+
     def update_consumable(self, name=None, cost=None, meta_data=None, db=None):
         if name:
             self.name = name
@@ -109,8 +197,19 @@ class Consumable(Base):
 
         if db:
             db.commit()
+            consumable_catalog.invalidate()
 
         return self
 
+    def delete_consumable(self, db):
+        db.delete(self)
+        db.commit()
+        consumable_catalog.invalidate()
+
     def __repr__(self):
         return f"<Consumable(id='{self.id}', name='{self.name}', cost='{self.cost}')>"
+
+consumable_catalog = CatalogCache(
+    "consumable",
+    lambda db: [consumable.to_dict() for consumable in db.query(Consumable).order_by(Consumable.name).all()]
+)
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, String, DateTime, Numeric, JSON
+from sqlalchemy import Column, String, DateTime, Numeric, JSON, select
 from sqlalchemy.sql import func
 import uuid
 from datetime import datetime
 
 from ..database import Base
+from ..catalog import CatalogCache
 
 class Purchasable(Base):
     __tablename__ = 'purchasable'
@@ -36,17 +37,60 @@ class Purchasable(Base):
     def find_by_id(id, db):
         return db.query(Purchasable).filter(Purchasable.id == id).first()
 
+    @staticmethod
+    async def find_by_id_async(id, db):
+        result = await db.execute(select(Purchasable).where(Purchasable.id == id))
+        return result.scalars().first()
+
+    @staticmethod
+    def find_cached(id, db):
+        """Find a purchasable in the catalog cache, returns its to_dict() or None"""
+        return purchasable_catalog.get(id, db)
+
+    @staticmethod
+    async def find_cached_async(id, db):
+        return await purchasable_catalog.get_async(id, db)
+
+    @staticmethod
+    def get_catalog(db):
+        """Every purchasable as to_dict(), ordered by name, from the catalog cache"""
+        return purchasable_catalog.list(db)
+
+    @staticmethod
+    async def get_catalog_async(db):
+        return await purchasable_catalog.list_async(db)
+
+    @staticmethod
+    def get_catalog_json(db, skip=0, limit=None):
+        """A page of get_catalog() as a JSON array, rendered when cached, and the catalog size"""
+        return purchasable_catalog.list_json(db, skip, limit)
+
+    @staticmethod
+    async def get_catalog_json_async(db, skip=0, limit=None):
+        return await purchasable_catalog.list_json_async(db, skip, limit)
+
     @staticmethod
     def create_purchasable(name, price, credit_amount, db, meta_data=None, id=None):
         purchasable = Purchasable(name=name, price=price, credit_amount=credit_amount, meta_data=meta_data, id=id)
         db.add(purchasable)
         db.commit()
+        purchasable_catalog.invalidate()
         return purchasable
 
     @staticmethod
     def get_all_purchasables(db, skip=0, limit=100):
         return db.query(Purchasable).order_by(Purchasable.name).offset(skip).limit(limit).all()
 
+    @staticmethod
+    async def get_all_purchasables_async(db, skip=0, limit=100):
+        result = await db.execute(select(Purchasable).order_by(Purchasable.name).offset(skip).limit(limit))
+        return result.scalars().all()
+
+    @staticmethod
+    async def count_purchasables_async(db):
+        result = await db.execute(select(func.count()).select_from(Purchasable))
+        return result.scalar_one()
+
     def update_purchasable(self, name=None, price=None, credit_amount=None, meta_data=None, db=None):
         if name:
             self.name = name
@@ -59,8 +103,19 @@ class Purchasable(Base):
 
         if db:
             db.commit()
+            purchasable_catalog.invalidate()
 
         return self
 
+    def delete_purchasable(self, db):
+        db.delete(self)
+        db.commit()
+        purchasable_catalog.invalidate()
+
     def __repr__(self):
         return f"<Purchasable(id='{self.id}', name='{self.name}', price='{self.price}', credit_amount='{self.credit_amount}')>"
+
+purchasable_catalog = CatalogCache(
+    "purchasable",
+    lambda db: [purchasable.to_dict() for purchasable in db.query(Purchasable).order_by(Purchasable.name).all()]
+)
@@ -0,0 +1,3 @@
+from .agent_user_import import import_agent_users
+
+__all__ = ["import_agent_users"]
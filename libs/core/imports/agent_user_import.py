@@ -0,0 +1,194 @@
+import argparse
+import csv
+import json
+import sys
+import psycopg2
+from sqlalchemy import text
+
+from ..logs import logger
+
+COLUMNS = ("mobile", "name", "email", "credit")
+REQUIRED_COLUMNS = ("mobile", "name")
+
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE agent_user_import (
+        line BIGINT GENERATED ALWAYS AS IDENTITY,
+        mobile TEXT,
+        name TEXT,
+        email TEXT,
+        credit TEXT,
+        error TEXT
+    ) ON COMMIT DROP
+"""
+
+_NORMALIZE_SQL = """
+    UPDATE agent_user_import
+    SET mobile = nullif(btrim(mobile), ''),
+        name = nullif(btrim(name), ''),
+        email = nullif(btrim(email), ''),
+        credit = nullif(btrim(credit), '')
+"""
+
+# First failing rule wins. Within the file the first row with a mobile or email keeps
+# it and later rows are reported; rows are only checked against agent_user once
+# they are otherwise valid, through the unique indexes on mobile and email.
+_VALIDATE_SQL = r"""
+    UPDATE agent_user_import AS s
+    SET error = v.error
+    FROM (
+        SELECT line, CASE
+            WHEN mobile IS NULL THEN 'Mobile is required'
+            WHEN length(mobile) > 20 THEN 'Mobile is longer than 20 characters'
+            WHEN name IS NULL THEN 'Name is required'
+            WHEN length(name) > 255 THEN 'Name is longer than 255 characters'
+            WHEN email IS NOT NULL AND (length(email) > 255 OR email !~ '^[^@\s]+@[^@\s]+\.[^@\s]+$') THEN 'Invalid email'
+            WHEN credit IS NOT NULL AND credit !~ '^\d{1,16}(\.\d{1,2})?$' THEN 'Credit must be a non-negative amount with at most 2 decimals'
+            WHEN first_mobile_line < line THEN 'Mobile duplicated in the file, first on row ' || (first_mobile_line + 1)
+            WHEN email IS NOT NULL AND first_email_line < line THEN 'Email duplicated in the file, first on row ' || (first_email_line + 1)
+            WHEN EXISTS (SELECT 1 FROM agent_user u WHERE u.mobile = staged.mobile) THEN 'Mobile number already registered'
+            WHEN email IS NOT NULL AND EXISTS (SELECT 1 FROM agent_user u WHERE u.email = staged.email) THEN 'Email already registered'
+        END AS error
+        FROM (
+            SELECT *,
+                   min(line) OVER (PARTITION BY mobile) AS first_mobile_line,
+                   min(line) OVER (PARTITION BY email) AS first_email_line
+            FROM agent_user_import
+        ) AS staged
+    ) AS v
+    WHERE s.line = v.line AND v.error IS NOT NULL
+"""
+
+# One statement for every valid row. A user registered by someone else since the
+# validation is skipped by ON CONFLICT and reported instead of failing the import.
+# Starting credit is recorded as an opening event, like AgentUser.create_user does.
+_INSERT_SQL = """
+    WITH inserted AS (
+        INSERT INTO agent_user (mobile, email, name, credit)
+        SELECT mobile, email, name, coalesce(CAST(credit AS NUMERIC), 0)
+        FROM agent_user_import
+        WHERE error IS NULL
+        ORDER BY line
+        ON CONFLICT DO NOTHING
+        RETURNING id, mobile, credit
+    ),
+    opened AS (
+        INSERT INTO agent_event (id, event_type, target_id, event_data, description, timestamp)
+        SELECT generate_ulid(), 'agent_credit', id,
+               jsonb_build_object('type', 'opening', 'amount', CAST(credit AS TEXT),
+                                  'previous_balance', '0.00', 'new_balance', CAST(credit AS TEXT)),
+               'Opening balance', LOCALTIMESTAMP
+        FROM inserted
+        WHERE credit <> 0
+    )
+    UPDATE agent_user_import AS s
+    SET error = 'Mobile or email registered while importing'
+    WHERE s.error IS NULL AND NOT EXISTS (SELECT 1 FROM inserted WHERE inserted.mobile = s.mobile)
+"""
+
+def _read_header(stream):
+    """The CSV columns named by the header line, mapped to agent_user_import columns"""
+    line = stream.readline()
+    if isinstance(line, bytes):
+        # Spreadsheet exports often start with a byte order mark
+        line = line.decode("utf-8")
+    line = line.lstrip("\ufeff")
+    header = [name.strip().lower() for name in next(csv.reader([line]), [])]
+    unknown = [name for name in header if name not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}, expected {', '.join(COLUMNS)}")
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if len(set(header)) != len(header):
+        raise ValueError("Duplicated columns in the header")
+    return header
+
+def import_agent_users(stream, db, dry_run=False, max_errors=1000):
+    """
+    Import agent users from a CSV file with a header row naming mobile, name and
+    optionally email and credit, in any order.
+
+    The rows are loaded into a temporary staging table with COPY, normalized and
+    validated with set-based statements, and the valid ones inserted with one
+    INSERT ... SELECT, so the cost hardly grows with the row count. Invalid rows
+    are skipped and reported, they do not stop the import.
+
+    Args:
+        stream: Binary or text file object positioned at the header row
+        db (Session): Database session
+        dry_run (bool): Validate and report without inserting anything
+        max_errors (int): Errors kept in the report, all of them are counted
+
+    Returns:
+        dict: rows, imported, failed and errors, each error with its spreadsheet
+              row (the header is row 1), mobile and message
+
+    Raises:
+        ValueError: If the header or the CSV itself cannot be read
+    """
+    header = _read_header(stream)
+    try:
+        db.execute(text(_CREATE_STAGING_SQL))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY agent_user_import ({', '.join(header)}) FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')",
+                stream
+            )
+        except psycopg2.Error as e:
+            db.rollback()
+            # The context names the line, COPY counts from the first line after the header
+            raise ValueError(f"Could not read the CSV: {e.diag.message_primary} ({e.diag.context}, line 1 is the row after the header)")
+        finally:
+            cursor.close()
+
+        db.execute(text(_NORMALIZE_SQL))
+        db.execute(text(_VALIDATE_SQL))
+        if not dry_run:
+            db.execute(text(_INSERT_SQL))
+
+        rows, failed = db.execute(text("SELECT count(*), count(error) FROM agent_user_import")).one()
+        errors = [
+            {"row": row.line + 1, "mobile": row.mobile, "error": row.error}
+            for row in db.execute(
+                text("SELECT line, mobile, error FROM agent_user_import WHERE error IS NOT NULL ORDER BY line LIMIT :max_errors"),
+                {"max_errors": max_errors}
+            )
+        ]
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    report = {
+        "rows": rows,
+        "imported": 0 if dry_run else rows - failed,
+        "failed": failed,
+        "dry_run": dry_run,
+        "errors": errors,
+    }
+    logger.info(f"Agent user import: {report['imported']} imported, {failed} failed of {rows} rows")
+    return report
+
+if __name__ == '__main__':
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+
+    parser = argparse.ArgumentParser(description="Import agent users from a CSV file")
+    parser.add_argument("file", help="CSV with a header row: mobile, name, and optionally email and credit")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without inserting")
+    parser.add_argument("--max-errors", type=int, default=1000, help="Errors listed in the report")
+    args = parser.parse_args()
+
+    db = create_nexi_db_session()
+    try:
+        with open(args.file, "rb") as f:
+            report = import_agent_users(f, db, dry_run=args.dry_run, max_errors=args.max_errors)
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,14 @@
+from .credit_ledger import (
+    apply_credit_change, apply_credit_change_async,
+    apply_credit_changes, apply_credit_changes_async,
+    build_credit_event_data, UserNotFoundError, InsufficientCreditError
+)
+from .reconciliation import reconcile_balances
+from .bulk_adjustment import bulk_adjust_credit, purchasable_adjustments
+
+__all__ = [
+    "apply_credit_change", "apply_credit_change_async",
+    "apply_credit_changes", "apply_credit_changes_async",
+    "build_credit_event_data", "UserNotFoundError", "InsufficientCreditError",
+    "reconcile_balances", "bulk_adjust_credit", "purchasable_adjustments"
+]
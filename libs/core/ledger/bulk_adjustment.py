@@ -0,0 +1,247 @@
+import argparse
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import text
+
+from ..logs import logger
+from .credit_ledger import apply_credit_changes, build_credit_event_data
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# One round trip resolves a whole chunk, by id or by mobile, with the balances a dry run needs
+_RESOLVE_USERS_SQL = """
+    SELECT id, mobile, credit FROM agent_user
+    WHERE id = ANY(CAST(:ids AS VARCHAR[])) OR mobile = ANY(CAST(:mobiles AS VARCHAR[]))
+"""
+
+_CENT = Decimal("0.01")
+
+def purchasable_adjustments(purchasable, user_ids=(), mobiles=(), count=1, description=None):
+    """
+    The adjustments that apply a purchasable count times to each of a set of users,
+    with the same event payload and description as applying it to one user.
+
+    Args:
+        purchasable: Purchasable entity or dict with name and credit_amount
+        user_ids (list[str]): Agent user ids
+        mobiles (list[str]): Agent user mobiles
+        count (int): Purchasables applied to each user
+        description (str): Event description, defaults to "Applied <count> <name>"
+
+    Returns:
+        list[dict]: Adjustments for bulk_adjust_credit
+    """
+    if isinstance(purchasable, dict):
+        name, credit_amount = purchasable["name"], purchasable["credit_amount"]
+    else:
+        name, credit_amount = purchasable.name, purchasable.credit_amount
+
+    amount = Decimal(credit_amount) * count
+    description = description or f"Applied {count} {name}" + ("s" if count > 1 else "")
+    event_data = build_credit_event_data(amount, purchasable_name=name, count=count)
+    targets = [{"user_id": user_id} for user_id in user_ids] + [{"mobile": mobile} for mobile in mobiles]
+    return [dict(target, amount=amount, description=description, event_data=event_data) for target in targets]
+
+def _parse_amount(value):
+    """The amount as a Decimal, or None when it is not a non-zero amount with at most 2 decimals"""
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount == 0 or amount != amount.quantize(_CENT):
+        return None
+    return amount
+
+def bulk_adjust_credit(adjustments, db, dry_run=False, created_by=None, allow_overdraft=True,
+                       chunk_size=DEFAULT_CHUNK_SIZE, max_errors=1000, progress=None):
+    """
+    Apply credit top-ups and corrections to many agent users.
+
+    The adjustments are processed in chunks. Each chunk resolves its users in one
+    query, then goes through apply_credit_changes: the users are locked in id order,
+    the balances written with one UPDATE ... FROM unnest and the matching
+    agent_credit events with one multi-row INSERT, committed together. A chunk is
+    one transaction, so a failure leaves the earlier chunks applied and the report
+    of the chunks done so far is passed to progress. Invalid adjustments, unknown
+    users and refused overdrafts are skipped and reported, the rest still apply.
+
+    Args:
+        adjustments (list[dict]): Each with user_id or mobile, amount, and optionally
+            description and event_data (see build_credit_event_data)
+        db (Session): Database session
+        dry_run (bool): Compute the outcome and totals from the current balances
+            without writing or locking anything
+        created_by (str): Admin user id recorded on the events
+        allow_overdraft (bool): Whether a negative adjustment may take a balance below zero
+        chunk_size (int): Adjustments per transaction
+        max_errors (int): Errors kept in the report, all of them are counted
+        progress (callable): Called with the report after every chunk
+
+    Returns:
+        dict: adjustments, applied, failed, users, credited, debited, net, chunks,
+              dry_run and errors, each error with the adjustment index, user and message
+    """
+    report = {
+        "adjustments": len(adjustments),
+        "applied": 0,
+        "failed": 0,
+        "users": 0,
+        "credited": Decimal("0"),
+        "debited": Decimal("0"),
+        "net": Decimal("0"),
+        "chunks": 0,
+        "dry_run": dry_run,
+        "errors": [],
+    }
+    touched = set()
+    # A dry run carries its running balances across chunks, a real run reads the committed ones
+    dry_run_balances = {}
+
+    def fail(index, adjustment, message):
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({
+                "index": index,
+                "user_id": adjustment.get("user_id"),
+                "mobile": adjustment.get("mobile"),
+                "error": message,
+            })
+
+    for start in range(0, len(adjustments), chunk_size):
+        chunk = list(enumerate(adjustments[start:start + chunk_size], start))
+        rows = db.execute(text(_RESOLVE_USERS_SQL), {
+            "ids": [adjustment["user_id"] for _, adjustment in chunk if adjustment.get("user_id")],
+            "mobiles": [adjustment["mobile"] for _, adjustment in chunk if not adjustment.get("user_id") and adjustment.get("mobile")],
+        }).all()
+        by_id = {row.id: row for row in rows}
+        by_mobile = {row.mobile: row for row in rows}
+
+        pending = []
+        for index, adjustment in chunk:
+            if adjustment.get("user_id"):
+                user = by_id.get(adjustment["user_id"])
+            elif adjustment.get("mobile"):
+                user = by_mobile.get(adjustment["mobile"])
+            else:
+                fail(index, adjustment, "Either user_id or mobile is required")
+                continue
+            amount = _parse_amount(adjustment.get("amount"))
+            if amount is None:
+                fail(index, adjustment, "Amount must be a non-zero amount with at most 2 decimals")
+            elif user is None:
+                fail(index, adjustment, "User not found")
+            else:
+                pending.append((index, adjustment, user, amount))
+
+        if dry_run:
+            results = []
+            for _, _, user, amount in pending:
+                previous_balance = dry_run_balances.get(user.id, user.credit)
+                if not allow_overdraft and previous_balance + amount < 0:
+                    results.append({"success": False, "message": f"User doesn't have enough credit, current credit: {previous_balance}"})
+                else:
+                    dry_run_balances[user.id] = previous_balance + amount
+                    results.append({"success": True})
+        else:
+            results = apply_credit_changes([
+                {
+                    "user_id": user.id,
+                    "amount": amount,
+                    "event_data": adjustment.get("event_data") or build_credit_event_data(amount),
+                    "description": adjustment.get("description"),
+                    "created_by": created_by,
+                    "allow_overdraft": allow_overdraft,
+                }
+                for _, adjustment, user, amount in pending
+            ], db)
+
+        for (index, adjustment, user, amount), result in zip(pending, results):
+            if not result["success"]:
+                fail(index, adjustment, result["message"])
+                continue
+            report["applied"] += 1
+            touched.add(user.id)
+            if amount > 0:
+                report["credited"] += amount
+            else:
+                report["debited"] -= amount
+            report["net"] += amount
+
+        report["users"] = len(touched)
+        report["chunks"] += 1
+        logger.info(f"Bulk credit adjustment{' (dry run)' if dry_run else ''}: "
+                    f"{start + len(chunk)}/{len(adjustments)} processed, {report['applied']} applied, {report['failed']} failed")
+        if progress:
+            progress(report)
+
+    if dry_run:
+        db.rollback()
+
+    # Overdrafts are found after the other checks of their chunk
+    report["errors"].sort(key=lambda error: error["index"])
+    return report
+
+def _read_adjustments(f, purchasable_id, count, description, db):
+    """The adjustments of a CSV file, or the purchasable applied to the users it lists"""
+    rows = list(csv.DictReader(f))
+    if purchasable_id is None:
+        return [
+            {
+                "user_id": row.get("user_id") or None,
+                "mobile": row.get("mobile") or None,
+                "amount": row.get("amount"),
+                "description": row.get("description") or description,
+            }
+            for row in rows
+        ]
+
+    from ..entities.purchasable import Purchasable
+    purchasable = Purchasable.find_by_id(purchasable_id, db)
+    if purchasable is None:
+        raise ValueError("Purchasable not found")
+    return purchasable_adjustments(
+        purchasable,
+        user_ids=[row["user_id"] for row in rows if row.get("user_id")],
+        mobiles=[row["mobile"] for row in rows if not row.get("user_id") and row.get("mobile")],
+        count=count,
+        description=description
+    )
+
+# Run from the repository root: python -m libs.core.ledger.bulk_adjustment adjustments.csv --dry-run
+if __name__ == '__main__':
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+
+    parser = argparse.ArgumentParser(description="Apply credit adjustments to many agent users")
+    parser.add_argument("file", help="CSV with a header row: user_id or mobile, amount and optionally description; "
+                                     "only user_id or mobile with --purchasable")
+    parser.add_argument("--purchasable", help="Apply this purchasable to every listed user instead of the amounts")
+    parser.add_argument("--count", type=int, default=1, help="Purchasables applied to each user")
+    parser.add_argument("--description", help="Event description when a row has none")
+    parser.add_argument("--created-by", help="Admin user id recorded on the events")
+    parser.add_argument("--no-overdraft", action="store_true", help="Refuse adjustments that would take a balance below zero")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Report the outcome and totals without writing")
+    args = parser.parse_args()
+
+    def print_progress(report):
+        print(f"chunk {report['chunks']}: {report['applied']} applied, {report['failed']} failed, net {report['net']}", file=sys.stderr)
+
+    db = create_nexi_db_session()
+    try:
+        with open(args.file, newline="", encoding="utf-8-sig") as f:
+            adjustments = _read_adjustments(f, args.purchasable, args.count, args.description, db)
+        report = bulk_adjust_credit(
+            adjustments, db,
+            dry_run=args.dry_run,
+            created_by=args.created_by,
+            allow_overdraft=not args.no_overdraft,
+            chunk_size=args.chunk_size,
+            progress=print_progress
+        )
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(1 if report["failed"] else 0)
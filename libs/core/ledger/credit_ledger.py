@@ -0,0 +1,283 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+import ulid
+from sqlalchemy import text, select, insert
+
+from ..entities.agent_user import AgentUser
+from ..entities.agent_event import AgentEvent
+
+class UserNotFoundError(ValueError):
+    pass
+
+class InsufficientCreditError(ValueError):
+    pass
+
+# Balance update, overdraft check and event insert in a single statement.
+# The UPDATE takes the row lock on agent_user, so concurrent writes to the
+# same user serialize on it instead of overwriting each other's balance.
+_APPLY_CREDIT_CHANGE_SQL = """
+    WITH updated AS (
+        UPDATE agent_user
+        SET credit = credit + CAST(:amount AS NUMERIC), updated_at = :timestamp
+        WHERE {user_clause}
+          AND (:allow_overdraft OR credit + CAST(:amount AS NUMERIC) >= 0)
+        RETURNING id, mobile, email, name, credit, credit - CAST(:amount AS NUMERIC) AS previous_balance
+    ),
+    inserted AS (
+        INSERT INTO agent_event (id, event_type, target_id, event_data, description, created_by, timestamp, appointment_id, refund_event_id)
+        SELECT :event_id, 'agent_credit', updated.id,
+               CAST(:event_data AS JSONB) || jsonb_build_object(
+                   'previous_balance', updated.previous_balance::text,
+                   'new_balance', updated.credit::text
+               ),
+               :description, :created_by, :timestamp, :appointment_id, :refund_event_id
+        FROM updated
+        RETURNING id, event_type, target_id, event_data, description, created_by, created_by_username, timestamp
+    )
+    SELECT updated.id AS user_id, updated.mobile, updated.email, updated.name, updated.credit, updated.previous_balance,
+           inserted.id AS event_id, inserted.event_type, inserted.event_data, inserted.description,
+           inserted.created_by, inserted.created_by_username, inserted.timestamp
+    FROM updated CROSS JOIN inserted
+"""
+
+# Writes every balance of a batch in one statement. The rows are already
+# locked by the SELECT ... FOR UPDATE in apply_credit_changes.
+_SET_BALANCES_SQL = """
+    UPDATE agent_user AS u
+    SET credit = v.credit, updated_at = :timestamp
+    FROM unnest(CAST(:ids AS VARCHAR[]), CAST(:credits AS NUMERIC[])) AS v(id, credit)
+    WHERE u.id = v.id
+"""
+
+_CENT = Decimal("0.01")
+
+def build_credit_event_data(amount, entry_type="default", consumable_name=None, count=None, purchasable_name=None, appointment_id=None, refund_event_id=None):
+    """Build the event_data payload for a credit event, without the balance fields"""
+    event_data = {
+        "type": entry_type,
+        "amount": str(amount),
+    }
+
+    if consumable_name:
+        event_data["consumable_name"] = consumable_name
+    if purchasable_name:
+        event_data["purchasable_name"] = purchasable_name
+    if count:
+        event_data["count"] = count
+    if refund_event_id:
+        event_data["refund_event_id"] = str(refund_event_id)
+    if appointment_id:
+        event_data["appointment_id"] = appointment_id
+
+    return event_data
+
+def apply_credit_change(amount, db, user_id=None, mobile=None, event_data=None, description=None, created_by=None, allow_overdraft=True, commit=True):
+    """
+    Apply a credit change to an agent user and record the matching agent_credit event.
+
+    The user is selected by id or by mobile. The balance update, the overdraft
+    check and the event insert run as one statement, so a charge costs one
+    round trip and one commit.
+
+    Args:
+        amount (Decimal): Signed credit change, negative for charges
+        db (Session): Database session
+        user_id (str): Agent user id
+        mobile (str): Agent user mobile, used when user_id is not given
+        event_data (dict): Event payload, see build_credit_event_data
+        description (str): Event description
+        created_by (str): Admin user id that made the change
+        allow_overdraft (bool): Whether the balance may drop below zero
+        commit (bool): Commit the transaction, or roll it back on failure. Set to
+            False to batch writes, the caller then ends the transaction
+
+    Returns:
+        dict: The updated user, the created event and the balances
+
+    Raises:
+        UserNotFoundError: If the user does not exist
+        InsufficientCreditError: If the change would overdraw the user
+    """
+    if user_id is None and mobile is None:
+        raise ValueError("Either user_id or mobile is required")
+
+    amount = Decimal(amount)
+    if user_id is not None:
+        user_clause, user_value, user_column = "id = :user_value", user_id, AgentUser.id
+    else:
+        user_clause, user_value, user_column = "mobile = :user_value", mobile, AgentUser.mobile
+
+    event_data = dict(event_data) if event_data else build_credit_event_data(amount)
+    event_data.setdefault("type", "default")
+    event_data.setdefault("amount", str(amount))
+
+    row = db.execute(
+        text(_APPLY_CREDIT_CHANGE_SQL.format(user_clause=user_clause)),
+        {
+            "amount": amount,
+            "user_value": user_value,
+            "allow_overdraft": allow_overdraft,
+            "event_id": str(ulid.ulid()),
+            "event_data": json.dumps(event_data),
+            "description": description,
+            "created_by": created_by,
+            "timestamp": datetime.now(),
+            "appointment_id": event_data.get("appointment_id"),
+            "refund_event_id": event_data.get("refund_event_id") if event_data["type"] == "refund" else None,
+        }
+    ).mappings().first()
+
+    if row is None:
+        # Only the failure path pays for a second query to tell the two cases apart
+        balance = db.query(AgentUser.credit).filter(user_column == user_value).scalar()
+        # The statement wrote nothing. With commit=False the transaction is the caller's,
+        # it may hold earlier writes of the batch, so it is left for the caller to end
+        if commit:
+            db.rollback()
+        if balance is None:
+            raise UserNotFoundError("User not found")
+        raise InsufficientCreditError(f"User doesn't have enough credit, current credit: {balance}")
+
+    if commit:
+        db.commit()
+
+    return {
+        "user": {
+            "id": row["user_id"],
+            "mobile": row["mobile"],
+            "email": row["email"],
+            "name": row["name"],
+            "credit": row["credit"]
+        },
+        "event": {
+            "id": row["event_id"],
+            "event_type": row["event_type"],
+            "target_id": row["user_id"],
+            "event_data": row["event_data"],
+            "description": row["description"],
+            "created_by": row["created_by"],
+            "created_by_username": row["created_by_username"],
+            "timestamp": row["timestamp"]
+        },
+        "amount": amount,
+        "previous_balance": row["previous_balance"],
+        "new_balance": row["credit"]
+    }
+
+async def apply_credit_change_async(amount, db, **kwargs):
+    """Async variant of apply_credit_change, runs the same statement on an AsyncSession"""
+    return await db.run_sync(lambda session: apply_credit_change(amount, session, **kwargs))
+
+def apply_credit_changes(entries, db, commit=True):
+    """
+    Apply many credit changes in one transaction.
+
+    The users are locked with one SELECT ... FOR UPDATE, the entries are
+    checked in order against the running balances, and the new balances and
+    events are written with one UPDATE and one multi-row INSERT. An entry that
+    fails (unknown user, overdraft) is reported and skipped, the rest still apply.
+
+    Args:
+        entries (list[dict]): Each with user_id and amount, and optionally
+            event_data, description, created_by and allow_overdraft
+        db (Session): Database session
+        commit (bool): Commit the transaction, set to False to batch writes
+
+    Returns:
+        list[dict]: One result per entry, in order, with success and either
+            user, event_id and balances, or message
+    """
+    if not entries:
+        return []
+
+    try:
+        user_ids = sorted({entry["user_id"] for entry in entries})
+        # Lock in id order so concurrent batches cannot deadlock each other
+        users = {
+            row.id: row for row in db.execute(
+                select(AgentUser.id, AgentUser.mobile, AgentUser.email, AgentUser.name, AgentUser.credit)
+                .where(AgentUser.id.in_(user_ids))
+                .order_by(AgentUser.id)
+                .with_for_update()
+            )
+        }
+        balances = {user_id: user.credit for user_id, user in users.items()}
+
+        results = []
+        events = []
+        for entry in entries:
+            user_id = entry["user_id"]
+            if user_id not in balances:
+                results.append({"success": False, "message": "User not found"})
+                continue
+
+            amount = Decimal(entry["amount"])
+            previous_balance = balances[user_id]
+            new_balance = (previous_balance + amount).quantize(_CENT)
+            if not entry.get("allow_overdraft", True) and new_balance < 0:
+                results.append({"success": False, "message": f"User doesn't have enough credit, current credit: {previous_balance}"})
+                continue
+
+            balances[user_id] = new_balance
+            event_data = dict(entry.get("event_data") or build_credit_event_data(amount))
+            event_data.setdefault("type", "default")
+            event_data.setdefault("amount", str(amount))
+            event_data["previous_balance"] = str(previous_balance)
+            event_data["new_balance"] = str(new_balance)
+
+            event_id = str(ulid.ulid())
+            events.append({
+                "id": event_id,
+                "event_type": "agent_credit",
+                "target_id": user_id,
+                "event_data": event_data,
+                "description": entry.get("description"),
+                "created_by": entry.get("created_by"),
+                "timestamp": datetime.now(),
+                "appointment_id": event_data.get("appointment_id"),
+                "refund_event_id": event_data.get("refund_event_id") if event_data["type"] == "refund" else None,
+            })
+            results.append({
+                "success": True,
+                "user_id": user_id,
+                "event_id": event_id,
+                "amount": amount,
+                "previous_balance": previous_balance,
+                "new_balance": new_balance
+            })
+
+        if events:
+            changed = {event["target_id"] for event in events}
+            db.execute(
+                text(_SET_BALANCES_SQL),
+                {
+                    "ids": [user_id for user_id in user_ids if user_id in changed],
+                    "credits": [balances[user_id] for user_id in user_ids if user_id in changed],
+                    "timestamp": datetime.now(),
+                }
+            )
+            db.execute(insert(AgentEvent), events)
+
+        if commit:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for result in results:
+        if result["success"]:
+            user = users[result["user_id"]]
+            result["user"] = {
+                "id": user.id,
+                "mobile": user.mobile,
+                "email": user.email,
+                "name": user.name,
+                "credit": balances[user.id]
+            }
+
+    return results
+
+async def apply_credit_changes_async(entries, db, commit=True):
+    """Async variant of apply_credit_changes, runs the same statements on an AsyncSession"""
+    return await db.run_sync(lambda session: apply_credit_changes(entries, session, commit=commit))
@@ -0,0 +1,170 @@
+import argparse
+import itertools
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select, and_, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from ..entities.agent_user import AgentUser
+from ..entities.agent_event import AgentEvent
+from ..entities.agent_balance_snapshot import AgentBalanceSnapshot
+from ..logs import logger
+
+_CENT = Decimal("0.01")
+
+def _ledger_rows():
+    """
+    Every agent user with the credit events after their snapshot, ordered so each
+    user's events arrive together and oldest first. Users without events still get
+    one row, with the event columns NULL.
+    """
+    snapshot = AgentBalanceSnapshot
+    event = AgentEvent
+    return (
+        select(
+            AgentUser.id.label("user_id"),
+            AgentUser.credit,
+            snapshot.balance.label("snapshot_balance"),
+            snapshot.event_count.label("snapshot_event_count"),
+            event.id.label("event_id"),
+            event.timestamp.label("event_timestamp"),
+            event.event_data["amount"].astext.label("amount"),
+        )
+        .select_from(AgentUser)
+        .outerjoin(snapshot, snapshot.user_id == AgentUser.id)
+        .outerjoin(event, and_(
+            event.target_id == AgentUser.id,
+            event.event_type == "agent_credit",
+            or_(
+                snapshot.user_id.is_(None),
+                # The plain bound lets the planner skip partitions older than the snapshot
+                and_(
+                    event.timestamp >= snapshot.event_timestamp,
+                    tuple_(event.timestamp, event.id) > tuple_(snapshot.event_timestamp, snapshot.event_id)
+                )
+            )
+        ))
+        .order_by(AgentUser.id, event.timestamp, event.id)
+    )
+
+def _write_snapshots(snapshots, db):
+    statement = insert(AgentBalanceSnapshot).values(snapshots)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[AgentBalanceSnapshot.user_id],
+        set_={
+            "balance": statement.excluded.balance,
+            "event_timestamp": statement.excluded.event_timestamp,
+            "event_id": statement.excluded.event_id,
+            "event_count": statement.excluded.event_count,
+            "taken_at": statement.excluded.taken_at,
+        }
+    ))
+    db.commit()
+
+def reconcile_balances(db, write_snapshots=True, batch_size=10000, settle_seconds=300, max_reported=1000):
+    """
+    Check every agent user's credit against the sum of the amounts in their agent_event rows.
+
+    Events are streamed through a server-side cursor, batch_size rows at a time, and folded
+    into one running balance per user, so memory stays flat however large the ledger is.
+    A user with a snapshot starts from the snapshot balance and only replays later events.
+    A user without one replays every event from 0: credit given at creation time is in the
+    ledger as an opening event, so any drift before a user's first event is reported too.
+
+    Snapshots only cover events older than settle_seconds. A ledger write takes its timestamp
+    before it commits, so a newer position could still gain an older event afterwards.
+
+    Args:
+        db (Session): Database session, used for the snapshot writes
+        write_snapshots (bool): Whether to advance the per-user snapshots
+        batch_size (int): Rows fetched per round trip, and snapshots written per commit
+        settle_seconds (int): Minimum age of an event before a snapshot covers it
+        max_reported (int): Mismatches kept in the report, all of them are logged and counted
+
+    Returns:
+        dict: users, events, mismatch_count, mismatches and snapshots_written
+    """
+    cutoff = datetime.now() - timedelta(seconds=settle_seconds)
+    report = {"users": 0, "events": 0, "mismatch_count": 0, "mismatches": [], "snapshots_written": 0}
+    pending_snapshots = []
+
+    # A connection of its own, the snapshot commits on db must not end the streaming cursor
+    with db.get_bind().connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(_ledger_rows())
+
+        for user_id, rows in itertools.groupby(result, key=lambda row: row.user_id):
+            first = next(rows)
+            credit = first.credit
+            balance = first.snapshot_balance if first.snapshot_balance is not None else Decimal(0)
+            event_count = first.snapshot_event_count or 0
+            settled = None
+
+            for row in itertools.chain([first], rows):
+                if row.event_id is None:
+                    continue
+                balance += Decimal(row.amount)
+                event_count += 1
+                if row.event_timestamp < cutoff:
+                    settled = (balance, row.event_timestamp, row.event_id, event_count)
+
+            balance = balance.quantize(_CENT)
+            report["users"] += 1
+            report["events"] += event_count - (first.snapshot_event_count or 0)
+
+            if balance != credit:
+                report["mismatch_count"] += 1
+                mismatch = {"user_id": user_id, "credit": credit, "ledger_balance": balance, "difference": credit - balance}
+                logger.warning(f"Ledger mismatch for agent user {user_id}: credit {credit}, ledger {balance}")
+                if len(report["mismatches"]) < max_reported:
+                    report["mismatches"].append(mismatch)
+
+            if write_snapshots and settled:
+                settled_balance, event_timestamp, event_id, settled_count = settled
+                pending_snapshots.append({
+                    "user_id": user_id,
+                    "balance": settled_balance,
+                    "event_timestamp": event_timestamp,
+                    "event_id": event_id,
+                    "event_count": settled_count,
+                    "taken_at": datetime.now(),
+                })
+                if len(pending_snapshots) >= batch_size:
+                    _write_snapshots(pending_snapshots, db)
+                    report["snapshots_written"] += len(pending_snapshots)
+                    pending_snapshots = []
+
+            if report["users"] % 10000 == 0:
+                logger.info(f"Reconciled {report['users']} users, {report['events']} events, {report['mismatch_count']} mismatches")
+
+    if pending_snapshots:
+        _write_snapshots(pending_snapshots, db)
+        report["snapshots_written"] += len(pending_snapshots)
+
+    return report
+
+# Run from the repository root: python -m libs.core.ledger.reconciliation
+if __name__ == '__main__':
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+
+    parser = argparse.ArgumentParser(description="Reconcile agent user credit against the event ledger")
+    parser.add_argument("--no-snapshots", action="store_true", help="Do not advance the balance snapshots")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--settle-seconds", type=int, default=300)
+    args = parser.parse_args()
+
+    session = create_nexi_db_session()
+    try:
+        report = reconcile_balances(
+            session,
+            write_snapshots=not args.no_snapshots,
+            batch_size=args.batch_size,
+            settle_seconds=args.settle_seconds
+        )
+    finally:
+        session.close()
+
+    for mismatch in report["mismatches"]:
+        print(f"{mismatch['user_id']}: credit {mismatch['credit']}, ledger {mismatch['ledger_balance']}, difference {mismatch['difference']}")
+    print(f"{report['users']} users, {report['events']} events replayed, {report['mismatch_count']} mismatches, {report['snapshots_written']} snapshots written")
+    sys.exit(1 if report["mismatch_count"] else 0)
@@ -0,0 +1,42 @@
+import time
+from contextlib import contextmanager
+
+class StartupReport:
+    """
+    Wall-clock time of each boot phase, measured from the moment this module
+    is imported. main.py imports it first, so the total covers the whole boot
+    apart from interpreter start-up.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = []
+        # Set once by finish(), None while the instance is still booting
+        self.total = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def finish(self):
+        """Record the boot as done, later calls keep the first total"""
+        if self.total is None:
+            self.total = time.perf_counter() - self.started_at
+
+    def as_dict(self):
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+            "total_ms": round(self.total * 1000, 1) if self.total is not None else None,
+        }
+
+    def print_report(self):
+        self.finish()
+        report = self.as_dict()
+        breakdown = ", ".join(f"{name} {ms} ms" for name, ms in report["phases_ms"].items())
+        print(f"[startup] ready in {report['total_ms']} ms ({breakdown})")
+
+startup_report = StartupReport()
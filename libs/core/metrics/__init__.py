@@ -0,0 +1,15 @@
+from .registry import Counter, Gauge, Histogram, MetricsRegistry, registry
+from .db_metrics import (
+    RequestDBStats,
+    InstrumentedQueuePool,
+    InstrumentedAsyncAdaptedQueuePool,
+    instrument_engine,
+    begin_request_db_stats,
+    end_request_db_stats,
+)
+
+__all__ = [
+    "Counter", "Gauge", "Histogram", "MetricsRegistry", "registry",
+    "RequestDBStats", "InstrumentedQueuePool", "InstrumentedAsyncAdaptedQueuePool",
+    "instrument_engine", "begin_request_db_stats", "end_request_db_stats",
+]
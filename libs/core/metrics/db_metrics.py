@@ -0,0 +1,116 @@
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from .registry import registry
+
+# Seconds, from a free pooled connection (well under a millisecond) up to pool_timeout
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Statements kept per request for the slow request log, the count and timings cover all of them
+MAX_CAPTURED_STATEMENTS = 50
+
+# Instrumented engines by pool name, read when the pool gauges are rendered
+_engines = {}
+
+checkout_seconds = registry.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection", CHECKOUT_BUCKETS, ("pool",))
+checkout_timeouts = registry.counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout", ("pool",))
+connections_created = registry.counter(
+    "db_pool_connections_created_total", "New database connections opened by the pool", ("pool",))
+query_seconds = registry.histogram(
+    "db_query_seconds", "Duration of each statement", QUERY_BUCKETS, ("pool",))
+query_errors = registry.counter(
+    "db_query_errors_total", "Statements that raised", ("pool",))
+
+def _pool_gauge(read):
+    return lambda: {(name,): read(engine.pool) for name, engine in list(_engines.items())}
+
+registry.gauge("db_pool_size", "Configured number of pooled connections",
+               _pool_gauge(lambda pool: pool.size()), ("pool",))
+registry.gauge("db_pool_checked_out", "Connections currently in use",
+               _pool_gauge(lambda pool: pool.checkedout()), ("pool",))
+registry.gauge("db_pool_checked_in", "Idle connections held by the pool",
+               _pool_gauge(lambda pool: pool.checkedin()), ("pool",))
+# overflow() counts up from -pool_size, only the part above pool_size is overflow in use
+registry.gauge("db_pool_overflow", "Connections open beyond pool_size",
+               _pool_gauge(lambda pool: max(0, pool.overflow())), ("pool",))
+
+class RequestDBStats:
+    """Database work done on behalf of one request"""
+
+    __slots__ = ("queries", "seconds", "checkout_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.checkout_seconds = 0.0
+        # (sql, seconds) of the first MAX_CAPTURED_STATEMENTS statements, without parameters
+        self.statements = []
+
+# Set by the request middleware, sync endpoints see it too as the threadpool copies the context
+_request_db_stats = ContextVar("request_db_stats", default=None)
+
+def begin_request_db_stats():
+    """Start counting database work for the current request, returns (stats, token)"""
+    stats = RequestDBStats()
+    return stats, _request_db_stats.set(stats)
+
+def end_request_db_stats(token):
+    _request_db_stats.reset(token)
+
+class _TimedCheckout:
+    """Times every checkout, including the wait for a free connection when the pool is exhausted"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            checkout_timeouts.inc((self.logging_name,))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            checkout_seconds.observe(elapsed, (self.logging_name,))
+            stats = _request_db_stats.get()
+            if stats is not None:
+                stats.checkout_seconds += elapsed
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"]
+    query_seconds.observe(elapsed, (conn.engine.pool.logging_name,))
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+        if len(stats.statements) < MAX_CAPTURED_STATEMENTS:
+            stats.statements.append((statement, elapsed))
+
+def _handle_error(exception_context):
+    query_errors.inc((exception_context.engine.pool.logging_name,))
+
+def instrument_engine(engine):
+    """
+    Record statement timings and pool gauges for an engine. Pass the sync engine
+    (async_engine.sync_engine for an async one), created with one of the
+    instrumented pool classes and a pool_logging_name, which labels its metrics.
+    """
+    _engines[engine.pool.logging_name] = engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: connections_created.inc((engine.pool.logging_name,)))
+    return engine
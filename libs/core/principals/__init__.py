@@ -0,0 +1,4 @@
+from .principal_cache import PrincipalCache, AdminPrincipal, principal_cache
+from .password_hasher import PasswordHasher, PasswordHasherBusy, password_hasher
+
+__all__ = ["PrincipalCache", "AdminPrincipal", "principal_cache", "PasswordHasher", "PasswordHasherBusy", "password_hasher"]
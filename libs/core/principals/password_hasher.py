@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from passlib.hash import bcrypt
+
+from ..configs import config
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash or verify calls are already running or queued"""
+    pass
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small thread pool so it never blocks the event loop.
+    bcrypt releases the GIL while hashing, so the loop keeps serving requests.
+
+    At most max_pending calls run or wait for a worker. Further calls fail fast
+    with PasswordHasherBusy instead of queueing up behind a login burst.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or config.system.password_hash_workers
+        self.max_pending = max_pending or config.system.password_hash_max_pending
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hasher")
+
+    async def _run(self, fn, *args):
+        # Only touched from the event loop thread, a plain counter is enough
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many concurrent password checks")
+
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            # A malformed stored hash, or the awaiting request being cancelled
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password):
+        return await self._run(bcrypt.hash, password)
+
+    async def verify(self, password, password_hash):
+        return await self._run(bcrypt.verify, password, password_hash)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from ..configs import config
+
+class AdminPrincipal(NamedTuple):
+    """Read-only snapshot of an authenticated admin user"""
+    id: str
+    username: str
+    email: str
+    is_active: bool
+
+class PrincipalCache:
+    """
+    Authenticated admin users by username (the token's sub), so authenticated
+    requests skip the admin_user query. An entry lives for at most ttl seconds
+    and never past the exp of the token that filled it.
+    """
+
+    def __init__(self, ttl=None, max_entries=1024):
+        self.ttl = config.system.principal_cache_ttl if ttl is None else ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, username) -> Optional[AdminPrincipal]:
+        entry = self._entries.get(username)
+        if entry is not None and entry[0] > time.time():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, admin, expires_at=None) -> AdminPrincipal:
+        """
+        Cache an AdminUser and return its snapshot.
+
+        Args:
+            admin (AdminUser): The admin user loaded for the request
+            expires_at (float): exp of the token, as a unix timestamp
+        """
+        principal = AdminPrincipal(id=admin.id, username=admin.username, email=admin.email, is_active=admin.is_active)
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.time()
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+                # Still full of live entries, drop the oldest
+                while len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[admin.username] = (deadline, principal)
+        return principal
+
+    def invalidate(self, username=None):
+        """Forget one admin, or every admin when username is None"""
+        with self._lock:
+            if username is None:
+                self._entries = {}
+            else:
+                self._entries.pop(username, None)
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations,
+            "cached_principals": len(self._entries),
+            "ttl": self.ttl,
+        }
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,3 @@
+from .totals import get_total, get_total_async, estimate_count, read_counter, compact_row_count, run_row_count_compaction, EXACT, ESTIMATE, NONE, TOTAL_MODES, TotalMode
+
+__all__ = ["get_total", "get_total_async", "estimate_count", "read_counter", "compact_row_count", "run_row_count_compaction", "EXACT", "ESTIMATE", "NONE", "TOTAL_MODES", "TotalMode"]
@@ -0,0 +1,86 @@
+import json
+from typing import Literal
+from sqlalchemy import select, func, text
+
+EXACT = "exact"
+ESTIMATE = "estimate"
+NONE = "none"
+
+TOTAL_MODES = (EXACT, ESTIMATE, NONE)
+TotalMode = Literal["exact", "estimate", "none"]
+
+def read_counter(scope, db, key=""):
+    """Read a maintained row_count counter, see the row_count migration"""
+    return db.execute(
+        text("SELECT coalesce(sum(delta), 0) FROM row_count WHERE scope = :scope AND key = :key"),
+        {"scope": scope, "key": key}
+    ).scalar_one()
+
+def estimate_count(statement, db):
+    """Estimate the number of rows a select returns from the planner's row estimate"""
+    dialect = db.get_bind().dialect
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.params
+    if dialect.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def get_total(statement, db, mode=EXACT, counter=None):
+    """
+    Total number of rows matched by a select, for list responses.
+
+    Args:
+        statement (Select): The filtered select, without ordering or paging
+        db (Session): Database session
+        mode (str): exact, estimate or none
+        counter (tuple): (scope, key) of the row_count counter that covers the
+            statement, exact mode then reads the counter instead of counting
+
+    Returns:
+        int | None: The total, or None in none mode
+    """
+    if mode == NONE:
+        return None
+    if mode == ESTIMATE:
+        return estimate_count(statement, db)
+    if counter is not None:
+        scope, key = counter
+        return read_counter(scope, db, key=key)
+    return db.execute(select(func.count()).select_from(statement.subquery())).scalar_one()
+
+async def get_total_async(statement, db, mode=EXACT, counter=None):
+    """Async variant of get_total for an AsyncSession"""
+    return await db.run_sync(lambda session: get_total(statement, session, mode=mode, counter=counter))
+
+def compact_row_count(db):
+    """Fold the row_count deltas into one row per counter"""
+    db.execute(text("SELECT compact_row_count()"))
+    db.commit()
+
+def run_row_count_compaction():
+    """
+    Compaction job, run from a scheduled job every few minutes. Each write adds delta
+    rows that read_counter sums, so exact totals slow down until they are folded.
+    A failure is only logged, the counters stay correct, just slower to read.
+    """
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+    from libs.core.logs import logger
+
+    session = create_nexi_db_session()
+    try:
+        compact_row_count(session)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"row_count compaction failed: {str(e)}")
+    finally:
+        session.close()
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../')))
+
+    run_row_count_compaction()
@@ -0,0 +1,54 @@
+"""
+Shared fixtures. Tests that need Postgres run against a throwaway database created
+on the server configured by the DB_* variables (see benchmarks/throwaway_db.py),
+and are skipped when that server cannot be reached.
+"""
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+import dotenv
+import psycopg2
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'apps', 'agent-credit-system'))
+
+dotenv.load_dotenv()
+# run_migrations reads DB_HOST itself, default it like libs.core.configs does
+os.environ.setdefault("DB_HOST", "localhost")
+
+@pytest.fixture(scope="session")
+def database():
+    """A migrated throwaway database for the whole run, dropped at the end"""
+    from benchmarks.throwaway_db import throwaway_database
+
+    try:
+        context = throwaway_database()
+        name = context.__enter__()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not reachable: {e}")
+    yield name
+    context.__exit__(None, None, None)
+
+@pytest.fixture
+def db(database):
+    from libs.core.database.get_nexi_db import create_nexi_db_session
+
+    session = create_nexi_db_session()
+    yield session
+    session.rollback()
+    session.close()
+
+@pytest.fixture
+def make_user(db):
+    """Create agent users with a unique mobile, and the given credit"""
+    from libs.core.entities.agent_user import AgentUser
+
+    def make(credit="0.00"):
+        tag = uuid.uuid4().hex[:8]
+        return AgentUser.create_user(mobile=f"+852{uuid.uuid4().int % 10**8:08d}", email=None,
+                                     name=f"Agent {tag}", db=db, credit=Decimal(credit))
+    return make
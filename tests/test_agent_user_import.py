@@ -0,0 +1,75 @@
+import io
+import uuid
+
+import pytest
+
+from libs.core.entities.agent_user import AgentUser
+from libs.core.imports.agent_user_import import import_agent_users, _read_header
+
+def _csv(*lines):
+    return io.BytesIO("\n".join(lines).encode() + b"\n")
+
+def _mobile():
+    return f"+852{uuid.uuid4().int % 10**8:08d}"
+
+def test_header_in_any_order_with_byte_order_mark():
+    assert _read_header(_csv("\ufeffName, MOBILE ,credit")) == ["name", "mobile", "credit"]
+
+@pytest.mark.parametrize("header, message", [
+    ("mobile,name,balance", "Unknown columns: balance"),
+    ("mobile,email", "Missing columns: name"),
+    ("mobile,name,name", "Duplicated columns"),
+])
+def test_invalid_header_is_rejected(header, message):
+    with pytest.raises(ValueError, match=message):
+        _read_header(_csv(header))
+
+@pytest.mark.integration
+def test_invalid_rows_are_reported_and_skipped(db, make_user):
+    registered = make_user()
+    first, second = _mobile(), _mobile()
+    rows = [
+        "mobile,name,email,credit",
+        f"{first},Valid One,,12.50",
+        f" {second} , Valid Two ,two@example.com,",
+        ",No Mobile,,",
+        f"{_mobile()},,,",
+        f"{_mobile()},Bad Email,not-an-email,",
+        f"{_mobile()},Bad Credit,,-5",
+        f"{_mobile()},Too Precise,,1.005",
+        f"{first},Duplicate Mobile,,",
+        f"{_mobile()},Duplicate Email,two@example.com,",
+        f"{registered.mobile},Registered,,",
+    ]
+
+    report = import_agent_users(_csv(*rows), db)
+
+    assert (report["rows"], report["imported"], report["failed"]) == (10, 2, 8)
+    assert [(error["row"], error["error"]) for error in report["errors"]] == [
+        (4, "Mobile is required"),
+        (5, "Name is required"),
+        (6, "Invalid email"),
+        (7, "Credit must be a non-negative amount with at most 2 decimals"),
+        (8, "Credit must be a non-negative amount with at most 2 decimals"),
+        (9, "Mobile duplicated in the file, first on row 2"),
+        (10, "Email duplicated in the file, first on row 3"),
+        (11, "Mobile number already registered"),
+    ]
+    assert str(AgentUser.find_by_mobile(first, db).credit) == "12.50"
+    # Trimmed, and blank credit defaults to zero
+    user = AgentUser.find_by_mobile(second, db)
+    assert (user.name, user.email, str(user.credit)) == ("Valid Two", "two@example.com", "0.00")
+
+@pytest.mark.integration
+def test_dry_run_inserts_nothing(db):
+    mobile = _mobile()
+
+    report = import_agent_users(_csv("mobile,name", f"{mobile},Dry Run"), db, dry_run=True)
+
+    assert (report["rows"], report["imported"], report["failed"]) == (1, 0, 0)
+    assert AgentUser.find_by_mobile(mobile, db) is None
+
+@pytest.mark.integration
+def test_unreadable_csv_is_rejected(db):
+    with pytest.raises(ValueError, match="Could not read the CSV"):
+        import_agent_users(_csv("mobile,name", f"{_mobile()},Too,Many,Fields"), db)
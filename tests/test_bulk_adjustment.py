@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from libs.core.entities.agent_event import AgentEvent
+from libs.core.ledger import bulk_adjust_credit
+
+pytestmark = pytest.mark.integration
+
+def _balances(user_id, db):
+    """previous_balance and new_balance of the user's events after the opening one, oldest first"""
+    events = db.execute(
+        select(AgentEvent)
+        .where(AgentEvent.target_id == user_id, AgentEvent.event_data["type"].astext.is_distinct_from("opening"))
+        .order_by(AgentEvent.timestamp, AgentEvent.id)
+    ).scalars()
+    return [(event.event_data["previous_balance"], event.event_data["new_balance"]) for event in events]
+
+def test_duplicate_users_apply_in_order_against_the_running_balance(db, make_user):
+    user, other = make_user("10.00"), make_user("1.00")
+    adjustments = [
+        {"user_id": user.id, "amount": "5"},
+        {"mobile": user.mobile, "amount": "-12"},
+        {"user_id": other.id, "amount": "2.50"},
+        {"user_id": user.id, "amount": "-4"},
+    ]
+
+    report = bulk_adjust_credit(adjustments, db, allow_overdraft=False)
+
+    # 10 + 5 - 12 = 3, so the last debit of 4 would overdraw
+    assert (report["applied"], report["failed"], report["users"]) == (3, 1, 2)
+    assert report["errors"] == [{
+        "index": 3, "user_id": user.id, "mobile": None,
+        "error": "User doesn't have enough credit, current credit: 3.00",
+    }]
+    assert (report["credited"], report["debited"], report["net"]) == (Decimal("7.50"), Decimal("12"), Decimal("-4.50"))
+    db.refresh(user)
+    assert user.credit == Decimal("3.00")
+    assert _balances(user.id, db) == [("10.00", "15.00"), ("15.00", "3.00")]
+
+def test_duplicate_users_across_chunks(db, make_user):
+    user = make_user("0.00")
+
+    report = bulk_adjust_credit([{"user_id": user.id, "amount": "1.25"}] * 5, db, chunk_size=2)
+
+    assert (report["applied"], report["chunks"], report["users"]) == (5, 3, 1)
+    db.refresh(user)
+    assert user.credit == Decimal("6.25")
+
+def test_dry_run_carries_balances_and_writes_nothing(db, make_user):
+    user = make_user("5.00")
+    adjustments = [{"user_id": user.id, "amount": "-3"}, {"user_id": user.id, "amount": "-3"}]
+
+    report = bulk_adjust_credit(adjustments, db, dry_run=True, allow_overdraft=False, chunk_size=1)
+
+    assert (report["applied"], report["failed"]) == (1, 1)
+    assert report["errors"][0]["error"] == "User doesn't have enough credit, current credit: 2.00"
+    db.refresh(user)
+    assert user.credit == Decimal("5.00")
+    assert _balances(user.id, db) == []
+
+def test_invalid_adjustments_are_reported(db, make_user):
+    user = make_user()
+    adjustments = [
+        {"amount": "1"},
+        {"user_id": user.id, "amount": "0"},
+        {"user_id": user.id, "amount": "1.001"},
+        {"mobile": "+0000000000", "amount": "1"},
+    ]
+
+    report = bulk_adjust_credit(adjustments, db)
+
+    assert [error["error"] for error in report["errors"]] == [
+        "Either user_id or mobile is required",
+        "Amount must be a non-zero amount with at most 2 decimals",
+        "Amount must be a non-zero amount with at most 2 decimals",
+        "User not found",
+    ]
+    assert report["applied"] == 0
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+from libs.core.entities.agent_event import AgentEvent
+from libs.core.entities.agent_user import AgentUser
+from libs.core.ledger import apply_credit_change, InsufficientCreditError, UserNotFoundError
+
+pytestmark = pytest.mark.integration
+
+def _balance(user_id, db):
+    return db.execute(select(AgentUser.credit).where(AgentUser.id == user_id)).scalar_one()
+
+def _event_count(user_id, db):
+    # Not counting the opening event make_user records for the starting credit
+    return db.execute(
+        select(func.count()).select_from(AgentEvent)
+        .where(AgentEvent.target_id == user_id, AgentEvent.event_data["type"].astext.is_distinct_from("opening"))
+    ).scalar_one()
+
+def test_charge_updates_balance_and_records_event(db, make_user):
+    user = make_user("10.00")
+
+    result = apply_credit_change(Decimal("-4"), db, user_id=user.id, allow_overdraft=False)
+
+    assert result["previous_balance"] == Decimal("10.00")
+    assert result["new_balance"] == Decimal("6.00")
+    assert result["event"]["event_data"]["new_balance"] == "6.00"
+    assert _balance(user.id, db) == Decimal("6.00")
+    assert _event_count(user.id, db) == 1
+
+def test_overdraft_is_refused_without_writing(db, make_user):
+    user = make_user("3.00")
+
+    with pytest.raises(InsufficientCreditError, match="current credit: 3.00"):
+        apply_credit_change(Decimal("-5"), db, user_id=user.id, allow_overdraft=False)
+
+    assert _balance(user.id, db) == Decimal("3.00")
+    assert _event_count(user.id, db) == 0
+
+def test_overdraft_is_allowed_by_default(db, make_user):
+    user = make_user("3.00")
+
+    result = apply_credit_change(Decimal("-5"), db, user_id=user.id)
+
+    assert result["new_balance"] == Decimal("-2.00")
+
+def test_unknown_user(db):
+    with pytest.raises(UserNotFoundError):
+        apply_credit_change(Decimal("5"), db, mobile="+0000000000")
+
+def test_refusal_leaves_the_callers_transaction_open(db, make_user):
+    user = make_user("10.00")
+
+    apply_credit_change(Decimal("5"), db, user_id=user.id, commit=False)
+    with pytest.raises(InsufficientCreditError, match="current credit: 15.00"):
+        apply_credit_change(Decimal("-100"), db, user_id=user.id, allow_overdraft=False, commit=False)
+    db.commit()
+
+    assert _balance(user.id, db) == Decimal("15.00")
+    assert _event_count(user.id, db) == 1
@@ -0,0 +1,33 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from libs.core.entities.agent_event import AgentEvent
+
+def _event(timestamp, event_id):
+    return SimpleNamespace(timestamp=timestamp, id=event_id)
+
+def test_cursor_round_trip():
+    timestamp = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    cursor = AgentEvent.encode_cursor(_event(timestamp, "01JNQ0Z8W4K3Y5R7T9V1X3Z5B7"))
+
+    assert AgentEvent.decode_cursor(cursor) == (timestamp, "01JNQ0Z8W4K3Y5R7T9V1X3Z5B7")
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = AgentEvent.encode_cursor(_event(datetime(2026, 3, 1), "a?b/c+d"))
+
+    assert "=" not in cursor
+    assert not set(cursor) & set("+/?&")
+    assert AgentEvent.decode_cursor(cursor)[1] == "a?b/c+d"
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm8tc2VwYXJhdG9y", "bm90LWEtZGF0ZXxpZA", "//79"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        AgentEvent.decode_cursor(cursor)
+
+def test_next_cursor_only_for_a_full_page():
+    events = [_event(datetime(2026, 3, 1, hour), f"id{hour}") for hour in (3, 2, 1)]
+
+    assert AgentEvent.next_cursor(events, limit=4) is None
+    assert AgentEvent.decode_cursor(AgentEvent.next_cursor(events, limit=3)) == (datetime(2026, 3, 1, 1), "id1")
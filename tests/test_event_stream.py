@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.services.event_stream import EventBroadcaster, EventSubscription, stream_events
+import app.services.event_stream as event_stream
+
+def _event(event_id, target_id="user-1", event_type="agent_credit"):
+    return {"id": event_id, "target_id": target_id, "event_type": event_type}
+
+@pytest.mark.parametrize("target_id, event_type, matched", [
+    (None, None, ["1", "2", "3"]),
+    ("user-1", None, ["1", "3"]),
+    (None, "agent_credit", ["1", "2"]),
+    ("user-1", "agent_credit", ["1"]),
+])
+def test_subscription_filters(target_id, event_type, matched):
+    subscription = EventSubscription(target_id=target_id, event_type=event_type)
+    events = [_event("1"), _event("2", target_id="user-2"), _event("3", event_type="other")]
+
+    assert [event["id"] for event in events if subscription.matches(event)] == matched
+
+def test_overflow_resets_and_drops_the_queue():
+    subscription = EventSubscription(queue_size=2)
+    subscription.push("1", "{}")
+    subscription.push("2", "{}")
+
+    subscription.push("3", "{}")
+
+    assert subscription.reset_reason == "overflow"
+    assert subscription.queue.get_nowait() is None
+    assert subscription.queue.empty()
+
+def test_reset_drops_queued_events_and_keeps_the_first_reason():
+    subscription = EventSubscription()
+    subscription.push("1", "{}")
+    subscription.reset("reconnect")
+    subscription.reset("overflow")
+    subscription.push("2", "{}")
+
+    assert subscription.reset_reason == "reconnect"
+    # The stream ends at the None, what is pushed after it is never sent
+    assert subscription.queue.get_nowait() is None
+
+def test_broadcaster_fans_out_to_matching_subscriptions():
+    broadcaster = EventBroadcaster()
+    mine, other = EventSubscription(target_id="user-1"), EventSubscription(target_id="user-2")
+    broadcaster._subscribers.update({mine, other})
+
+    broadcaster._publish(_event("1"), '{"id": "1"}')
+
+    assert mine.queue.get_nowait() == ("1", '{"id": "1"}')
+    assert other.queue.empty()
+
+def test_lost_connection_resets_every_stream():
+    broadcaster = EventBroadcaster()
+    connection = object()
+    broadcaster._connection = connection
+    subscriptions = [EventSubscription(), EventSubscription(target_id="user-2")]
+    broadcaster._subscribers.update(subscriptions)
+
+    broadcaster._drop(object())
+    assert all(subscription.reset_reason is None for subscription in subscriptions)
+
+    broadcaster._drop(connection)
+    assert broadcaster._connection is None
+    assert [subscription.reset_reason for subscription in subscriptions] == ["reconnect", "reconnect"]
+
+def test_stream_sends_matching_events_until_reset(monkeypatch):
+    broadcaster = EventBroadcaster()
+
+    async def listening():
+        pass
+
+    monkeypatch.setattr(broadcaster, "_ensure_listening", listening)
+    monkeypatch.setattr(event_stream, "broadcaster", broadcaster)
+
+    async def run():
+        stream = stream_events(target_id="user-1", keepalive_seconds=0.05)
+        messages = [await anext(stream), await anext(stream)]
+        (subscription,) = broadcaster._subscribers
+        broadcaster._publish(_event("2", target_id="user-2"), "skipped")
+        broadcaster._publish(_event("1"), '{"id": "1"}')
+        messages.append(await anext(stream))
+        broadcaster._publish(_event("3"), "dropped by the reset")
+        subscription.reset("overflow")
+        messages += [message async for message in stream]
+        return messages
+
+    messages = asyncio.run(run())
+
+    assert messages == [
+        b"retry: 3000\n\n",
+        b": keepalive\n\n",
+        b'id: 1\nevent: agent_event\ndata: {"id": "1"}\n\n',
+        b'event: reset\ndata: {"reason":"overflow"}\n\n',
+    ]
+    assert broadcaster.subscriber_count == 0
@@ -0,0 +1,56 @@
+import io
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from libs.core.entities.agent_event import AgentEvent
+from libs.core.entities.agent_user import AgentUser
+from libs.core.imports.agent_user_import import import_agent_users
+from libs.core.ledger import apply_credit_change, reconcile_balances
+
+pytestmark = pytest.mark.integration
+
+def _mismatch(user_id, db):
+    report = reconcile_balances(db, write_snapshots=False)
+    return next((mismatch for mismatch in report["mismatches"] if mismatch["user_id"] == user_id), None)
+
+def _openings(user_id, db):
+    return db.execute(
+        select(AgentEvent.event_data)
+        .where(AgentEvent.target_id == user_id, AgentEvent.event_data["type"].astext == "opening")
+    ).scalars().all()
+
+def test_starting_credit_is_an_opening_event(db, make_user):
+    user = make_user("25.00")
+
+    assert _openings(user.id, db) == [
+        {"type": "opening", "amount": "25.00", "previous_balance": "0.00", "new_balance": "25.00"}
+    ]
+    assert _mismatch(user.id, db) is None
+
+def test_no_opening_event_without_starting_credit(db, make_user):
+    user = make_user()
+
+    assert _openings(user.id, db) == []
+    assert _mismatch(user.id, db) is None
+
+def test_imported_starting_credit_is_an_opening_event(db):
+    mobile = f"+852{uuid.uuid4().int % 10**8:08d}"
+    import_agent_users(io.BytesIO(f"mobile,name,credit\n{mobile},Imported,12.50\n".encode()), db)
+    user = AgentUser.find_by_mobile(mobile, db)
+
+    assert [opening["amount"] for opening in _openings(user.id, db)] == ["12.50"]
+    assert _mismatch(user.id, db) is None
+
+def test_drift_before_the_first_event_is_reported(db, make_user):
+    user = make_user("10.00")
+    # Credit changed outside the ledger, then a ledger write on top of it
+    db.execute(update(AgentUser).where(AgentUser.id == user.id).values(credit=Decimal("30.00")))
+    db.commit()
+    apply_credit_change(Decimal("5"), db, user_id=user.id)
+
+    mismatch = _mismatch(user.id, db)
+
+    assert (mismatch["credit"], mismatch["ledger_balance"]) == (Decimal("35.00"), Decimal("15.00"))
@@ -0,0 +1,72 @@
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from libs.core.entities.agent_event import AgentEvent
+from libs.core.ledger import apply_credit_change, build_credit_event_data
+import app.services.refund_service as refund_service
+
+pytestmark = pytest.mark.integration
+
+def _charge(user, db, amount="-7.00"):
+    appointment_id = f"appt-{uuid.uuid4().hex[:8]}"
+    result = apply_credit_change(
+        Decimal(amount), db, user_id=user.id,
+        event_data=build_credit_event_data(Decimal(amount), appointment_id=appointment_id)
+    )
+    return appointment_id, result["event"]["id"]
+
+def test_refund_restores_the_charge(db, make_user):
+    user = make_user("10.00")
+    appointment_id, charge_id = _charge(user, db)
+
+    refund_service.refund_appointment(appointment_id, user.id, db)
+
+    db.refresh(user)
+    assert user.credit == Decimal("10.00")
+    refund = db.execute(select(AgentEvent).where(AgentEvent.refund_event_id == charge_id)).scalar_one()
+    assert refund.event_data["amount"] == "7.00"
+
+def test_charge_is_refunded_once(db, make_user):
+    user = make_user("10.00")
+    appointment_id, charge_id = _charge(user, db)
+    refund_service.refund_appointment(appointment_id, user.id, db)
+
+    with pytest.raises(ValueError, match="Appointment not found"):
+        refund_service.refund_appointment(appointment_id, user.id, db)
+
+    db.refresh(user)
+    assert user.credit == Decimal("10.00")
+    refunds = db.execute(select(func.count()).select_from(AgentEvent).where(AgentEvent.refund_event_id == charge_id)).scalar_one()
+    assert refunds == 1
+
+def test_second_refund_of_a_charge_is_rejected_by_the_database(db, make_user):
+    # Bypasses the service lookup, as a concurrent refund that read the charge first would
+    user = make_user("10.00")
+    appointment_id, charge_id = _charge(user, db)
+    refund = build_credit_event_data(Decimal("7.00"), entry_type="refund", refund_event_id=charge_id, appointment_id=appointment_id)
+    apply_credit_change(Decimal("7.00"), db, user_id=user.id, event_data=refund)
+
+    with pytest.raises(IntegrityError):
+        apply_credit_change(Decimal("7.00"), db, user_id=user.id, event_data=refund)
+    db.rollback()
+
+    db.refresh(user)
+    assert user.credit == Decimal("10.00")
+
+def test_concurrent_refund_is_reported_as_already_refunded(db, make_user, monkeypatch):
+    user = make_user("10.00")
+    appointment_id, charge_id = _charge(user, db)
+    charge = AgentEvent.find_by_appointment_id(appointment_id, db)
+    refund_service.refund_appointment(appointment_id, user.id, db)
+    # A refund that read the charge before the first one committed
+    monkeypatch.setattr(AgentEvent, "find_by_appointment_id", staticmethod(lambda appointment_id, db: charge))
+
+    with pytest.raises(ValueError, match="Appointment already refunded"):
+        refund_service.refund_appointment(appointment_id, user.id, db)
+
+    db.refresh(user)
+    assert user.credit == Decimal("10.00")